@@ -1,11 +1,25 @@
 # backend/main.py
-import os
-from fastapi import FastAPI, UploadFile, File, Form
+import os, uuid, json, asyncio, logging
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from google.adk.runners import InMemoryRunner
-from multi_agents.orchestration import root_agent
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from multi_agents.orchestration import AgentRunners
+from multi_agents.pipeline import run_process, stream_process
+from multi_agents.batch import BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, process_batch
+from multi_agents.intake_agent import extract_new_tasks
+from multi_agents.report_agent import queue_publish, report_for_session
+from multi_agents.common.runs import put_state, run_agent, session_state
+from multi_agents.common.sessions import ensure_session, make_session_service
+from multi_agents.common import jobs, limits, llm_scheduler, telemetry
+from multi_agents.common.codec import dumps
+from multi_agents.common.transcript import RollingTranscript
+from multi_agents.mcp.client import warm_all
+from multi_agents.tools.clients import warm_up
+from multi_agents.tools.images import ImageRejected, ImageTooLarge, ImageUnavailable, ingest_image
 
 app = FastAPI(title="MedAgents API")
+log = logging.getLogger(__name__)
 
 # Add CORS middleware
 app.add_middleware(
@@ -16,7 +30,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-runner = InMemoryRunner(app_name="medagents", root_agent=root_agent)
+# Sessions are keyed by (patient, session): bounded in memory by default, or in a
+# shared store with SESSION_BACKEND=sqlite for multiple workers (see common/sessions.py)
+DEFAULT_PATIENT = "demo-patient"
+session_service = make_session_service()
+# one Runner per stage (intake / coach / report), all on session_service
+runners = AgentRunners(session_service)
+
+# Comma-separated clients to build at startup (firestore,storage,gemini); MCP servers warm their own
+WARMUP_CLIENTS = [c for c in os.getenv("WARMUP_CLIENTS", "").split(",") if c]
+
+@app.on_event("startup")
+async def warm_up_backends():
+    telemetry.start_exporter()  # lets any worker's /metrics include the others
+    jobs.start_workers()  # report publishing runs here unless JOB_WORKERS=0
+    # pay MCP spawn and client construction before the first request, not during it
+    if os.getenv("WARMUP_MCP", "1") == "1":
+        await warm_all()
+    if WARMUP_CLIENTS:
+        await asyncio.to_thread(warm_up, *WARMUP_CLIENTS)
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    # in-flight jobs are picked up again by another worker once their lease expires
+    await jobs.stop_workers()
 
 @app.get("/")
 async def root():
@@ -26,31 +63,127 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "healthcare-agents-api"}
 
+@app.get("/api/sessions/stats")
+async def session_stats():
+    return session_service.stats()
+
+@app.get("/api/llm/stats")
+async def llm_stats():
+    # tokens left and queued requests per model family (this worker's scheduler)
+    return llm_scheduler.stats()
+
+@app.get("/api/limits/stats")
+async def limits_stats():
+    # per-downstream concurrency caps and the slots taken right now (this worker)
+    in_use = limits.in_use()
+    return {name: {"limit": cap, "in_use": in_use[name]} for name, cap in limits.LIMITS.items()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus scrape: this worker plus snapshots from other workers and MCP servers
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/ingest/transcript")
-async def ingest_transcript(snippet: str = Form(...), session_id: str = Form(...)):
+async def ingest_transcript(snippet: str = Form(...), session_id: str = Form(...),
+                            patient_id: str = Form(DEFAULT_PATIENT)):
     # push transcript chunk into state then run one loop iteration
-    ctx = {"transcript_snippet": snippet}
-    result = await runner.run_async(user_id="user-123", session_id=session_id, inputs=ctx)
+    ctx = {"transcript_snippet": snippet, "patient_id": patient_id}
+    result = await run_agent(runners.intake, patient_id, session_id, ctx)
     return {"state": result.state, "events": result.events}
 
+@app.websocket("/api/ingest/stream")
+async def ingest_stream(ws: WebSocket, session_id: str, patient_id: str = DEFAULT_PATIENT):
+    """
+    Live visit ingestion. The client sends transcript chunks as text frames
+    (or JSON {"text": ..., "flush": true}); only new text plus a short overlap
+    is sent to extraction and task deltas are pushed back as they are found.
+    """
+    await ws.accept()
+    window = RollingTranscript()
+    try:
+        while True:
+            msg = await ws.receive_text()
+            chunk, flush = msg, False
+            if msg.startswith("{"):
+                try:
+                    body = json.loads(msg)
+                    chunk, flush = body.get("text", ""), bool(body.get("flush"))
+                except ValueError:
+                    pass
+            text = window.push(chunk)
+            if text is None and flush:
+                text = window.flush()
+            if text is None:
+                continue
+            try:
+                kept = await extract_new_tasks(text, patient_id)
+            except Exception as e:
+                # one failed window doesn't end the visit: report it and keep listening
+                log.warning("ingest stream %s: extraction failed: %s", session_id, e)
+                await ws.send_json({"type": "error", "session_id": session_id,
+                                    "error": f"{type(e).__name__}: {e}", "chars": window.total_chars})
+                continue
+            await ws.send_json({"type": "tasks", "session_id": session_id,
+                                "tasks": jsonable_encoder(kept), "chars": window.total_chars})
+    except WebSocketDisconnect:
+        # extract whatever was still buffered so nothing said at the end is lost
+        text = window.flush()
+        if text:
+            try:
+                await extract_new_tasks(text, patient_id)
+            except Exception:
+                log.exception("ingest stream %s: final flush failed", session_id)
+
 @app.post("/api/skin/analyze")
-async def skin_analyze(image: UploadFile = File(...), session_id: str = Form("skin")):
-    content = await image.read()
-    # store image in GCS (omitted for brevity); pass URL or base64 to the skin agent
-    result = await runner.run_async(user_id="user-123", session_id=session_id,
-                                    inputs={"skin_image_bytes": content})
-    return {"skin": result.state.get("skin_agent_result")}
+async def skin_analyze(image: UploadFile = File(...), session_id: str = Form("skin"),
+                       patient_id: str = Form(DEFAULT_PATIENT)):
+    # streamed to disk, normalized off the event loop and stored once per content hash;
+    # the session only keeps the small reference (see tools/images.py)
+    try:
+        ref = await ingest_image(image)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ImageRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImageUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    # the skin triage agent is remote (A2A) and not wired in yet; keep the reference on the session
+    ensure_session(runners, patient_id, session_id)
+    put_state(runners, patient_id, session_id, {"skin_image_ref": ref})
+    return {"skin": session_state(runners, patient_id, session_id).get("skin_agent_result")}
 
 @app.post("/api/coach")
-async def coach_reco(condition: str = Form(...), visit_type: str = Form(...), session_id: str = Form("coach")):
-    result = await runner.run_async(user_id="user-123", session_id=session_id,
-                                    inputs={"condition": condition, "visit_type": visit_type})
+async def coach_reco(condition: str = Form(...), visit_type: str = Form(...), session_id: str = Form("coach"),
+                     patient_id: str = Form(DEFAULT_PATIENT)):
+    result = await run_agent(runners.coach, patient_id, session_id,
+                             {"condition": condition, "visit_type": visit_type})
     return result.state.get("coach_json")
 
 @app.get("/api/report/{session_id}")
-async def get_report(session_id: str):
-    result = await runner.run_async(user_id="user-123", session_id=session_id, inputs={})
-    return {"report_markdown": result.state.get("report_markdown")}
+async def get_report(session_id: str, patient_id: str = DEFAULT_PATIENT):
+    ensure_session(runners, patient_id, session_id)
+    # unchanged sessions get the memoized report (and its URL) without a reporter run
+    return await report_for_session(runners.report, patient_id, session_id)
+
+@app.post("/api/report/{session_id}/publish", status_code=202)
+async def publish_report(session_id: str, patient_id: str = DEFAULT_PATIENT):
+    """
+    Queue rendering + upload of the session's report and return at once:
+    {"job_id", "status", "status_url", ...}; poll status_url for the URL.
+    """
+    ensure_session(runners, patient_id, session_id)
+    report = await report_for_session(runners.report, patient_id, session_id)
+    if not report.get("report_markdown"):
+        raise HTTPException(status_code=404, detail="no report for this session")
+    job = await asyncio.to_thread(queue_publish, patient_id, report["report_markdown"])  # same text -> same job
+    return {**job, "status_url": f"/api/jobs/{job['job_id']}"}
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(jobs.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job")
+    return job
 
 @app.post("/api/agents/process")
 async def process_agents(data: dict):
@@ -62,69 +195,61 @@ async def process_agents(data: dict):
         "condition": "patient condition",
         "visit_type": "visit type",
         "current_metrics": {...},
-        "prior_metrics": {...}
+        "prior_metrics": {...},
+        "patient_id": "optional patient id",
+        "session_id": "optional session id"
     }
     """
-    session_id = "process_session"
-    
-    # Process transcript if provided
-    if data.get("transcript"):
-        transcript_result = await runner.run_async(
-            user_id="user-123", 
-            session_id=session_id, 
-            inputs={"transcript_snippet": data["transcript"]}
-        )
-    
-    # Get coaching recommendations if condition and visit_type provided
-    coach_result = None
-    if data.get("condition") and data.get("visit_type"):
-        coach_result = await runner.run_async(
-            user_id="user-123", 
-            session_id=session_id,
-            inputs={
-                "condition": data["condition"], 
-                "visit_type": data["visit_type"]
-            }
-        )
-    
-    # Get final report
-    report_result = await runner.run_async(
-        user_id="user-123", 
-        session_id=session_id, 
-        inputs={}
-    )
-    
-    # Format response to match frontend expectations
-    return {
-        "tasks": [
-            {
-                "title": "Follow up on medication changes",
-                "due_date": "2024-01-15",
-                "source": "Doctor's recommendation",
-                "confidence": 0.95
-            },
-            {
-                "title": "Schedule blood work",
-                "due_date": "2024-01-20",
-                "source": "Lab results needed",
-                "confidence": 0.88
-            }
-        ],
-        "guidance": {
-            "checklist": [
-                "Bring current medication list",
-                "Prepare questions about symptoms",
-                "Bring recent lab results"
-            ],
-            "cautions": [
-                "Monitor blood sugar levels closely",
-                "Watch for any new symptoms"
-            ],
-            "questions_for_doctor": [
-                "How often should I check my blood sugar?",
-                "Are there any side effects I should watch for?",
-                "When should I schedule my next appointment?"
-            ]
-        },
-        "report": report_result.state.get("report_markdown", "Health report generated successfully.")
+    patient_id = data.get("patient_id") or DEFAULT_PATIENT
+    session_id = data.get("session_id") or f"process-{uuid.uuid4().hex}"
+
+    # intake and coach run concurrently; the reporter starts once both resolve
+    return await run_process(runners, patient_id, session_id, data)
+
+@app.post("/api/agents/process/stream")
+async def process_agents_stream(data: dict):
+    """
+    Same payload as /api/agents/process, answered as Server-Sent Events so the
+    dashboard can render each part as soon as it exists:
+      event: tasks         {"tasks": [...]}
+      event: guidance      {"guidance": {...}}
+      event: report_delta  {"text": "..."}   (repeated while the reporter writes)
+      event: report        {"report": "..."}
+      event: done          {"partial": ..., "errors": {...}, "timings": {...}}
+    """
+    patient_id = data.get("patient_id") or DEFAULT_PATIENT
+    session_id = data.get("session_id") or f"process-{uuid.uuid4().hex}"
+
+    async def events():
+        async for event, payload in stream_process(runners, patient_id, session_id, data):
+            yield f"event: {event}\ndata: {dumps(jsonable_encoder(payload))}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/agents/process/batch")
+async def process_agents_batch(data: dict):
+    """
+    Run the pipeline for many patients, streaming one NDJSON line per patient
+    as each finishes.
+    Expected data format:
+    {
+        "items": [{...same payload as /api/agents/process...}, ...],
+        "concurrency": 8    (optional; 1..BATCH_MAX_CONCURRENCY, larger values are capped)
     }
+    """
+    items = data.get("items") or []
+    concurrency = data.get("concurrency")
+    if concurrency is None:
+        concurrency = BATCH_CONCURRENCY
+    elif isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        raise HTTPException(status_code=422, detail="concurrency must be a positive integer")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=422, detail="items must be a list")
+    concurrency = min(concurrency, BATCH_MAX_CONCURRENCY)
+
+    async def lines():
+        async for row in process_batch(items, runners=runners, concurrency=concurrency):
+            yield json.dumps(jsonable_encoder(row)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,3 +1,14 @@
-from .intake_agent import task_loop
-from .coach_agent import coach
-from .report_agent import reporter
+# Agents are exported lazily: MCP servers run as `python -m multi_agents.mcp.*`,
+# which executes this file, and shouldn't pay for importing ADK and the agents.
+_EXPORTS = {
+    "task_loop": ".intake_agent",
+    "coach": ".coach_agent",
+    "reporter": ".report_agent",
+}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        from importlib import import_module
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
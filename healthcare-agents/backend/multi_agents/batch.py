@@ -0,0 +1,112 @@
+# multi_agents/batch.py
+# Many-patient entry point around the stage runners: runs the process pipeline for a
+# list of payloads with bounded concurrency and yields results as they finish.
+import asyncio, os, uuid
+from collections import deque
+from itertools import islice
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Tuple
+from .common.limits import limit
+from .common.llm_scheduler import BATCH, llm_priority
+from .pipeline import run_process
+from .report_agent import afetch_prior_metrics_many
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+BATCH_PREFETCH = int(os.getenv("BATCH_PREFETCH", "64"))  # payloads whose prior metrics are read together
+DEFAULT_PATIENT = "demo-patient"
+
+
+def _default_runners():
+    from .orchestration import AgentRunners
+    from .common.sessions import make_session_service
+    return AgentRunners(make_session_service())
+
+
+async def _with_prior_metrics(chunk: List[Tuple[int, Any]]) -> List[Tuple[int, Any]]:
+    """Fill in prior_metrics for a chunk of (index, payload) with one get_prior_metrics_many call."""
+    ids = {d.get("patient_id") or DEFAULT_PATIENT for _, d in chunk
+           if isinstance(d, dict) and d.get("prior_metrics") is None}
+    if not ids:
+        return chunk
+    try:
+        async with limit("firestore"):
+            prior = await afetch_prior_metrics_many(sorted(ids))
+    except Exception:
+        return chunk  # each pipeline run fetches its own instead
+    return [(i, {**d, "prior_metrics": prior.get(d.get("patient_id") or DEFAULT_PATIENT, {})})
+            if isinstance(d, dict) and d.get("prior_metrics") is None else (i, d)
+            for i, d in chunk]
+
+
+async def process_batch(items: Iterable[Dict[str, Any]], runners=None,
+                        concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the /api/agents/process pipeline for every payload and yield
+    {"index", "patient_id", "session_id", "ok", "result"|"error"} in completion order.
+    At most `concurrency` patients are in flight; downstream calls are further
+    capped per stage by common/limits. Payloads are taken BATCH_PREFETCH at a
+    time and their prior metrics read in one round-trip. Results are handed
+    over through a small queue, so a slow consumer pauses the workers instead
+    of piling up output. A malformed item only fails its own row.
+    """
+    runners = runners or _default_runners()
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    todo = iter(enumerate(items))
+    ready: Deque[Tuple[int, Any]] = deque()
+    feed = asyncio.Lock()
+    out: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    done = object()
+
+    async def next_item() -> Optional[Tuple[int, Any]]:
+        async with feed:
+            if not ready:
+                ready.extend(await _with_prior_metrics(list(islice(todo, max(concurrency, BATCH_PREFETCH)))))
+            return ready.popleft() if ready else None
+
+    async def worker():
+        cancelled = False
+        try:
+            while (item := await next_item()) is not None:
+                index, data = item
+                row = {"index": index, "patient_id": None, "session_id": None}
+                try:
+                    if not isinstance(data, dict):
+                        raise TypeError(f"item must be an object, not {type(data).__name__}")
+                    row["patient_id"] = patient_id = data.get("patient_id") or DEFAULT_PATIENT
+                    row["session_id"] = session_id = data.get("session_id") or f"batch-{uuid.uuid4().hex}"
+                    # model calls from batch work queue behind interactive requests
+                    with llm_priority(BATCH):
+                        result = await run_process(runners, patient_id, session_id, data)
+                    row.update(ok=True, result=result)
+                except Exception as e:
+                    row.update(ok=False, error=f"{type(e).__name__}: {e}")
+                await out.put(row)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # the consumer counts workers out; only skipped when it went away and cancelled us
+            if not cancelled:
+                await out.put(done)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        finished = 0
+        while finished < len(workers):
+            row = await out.get()
+            if row is done:
+                finished += 1
+            else:
+                yield row
+    finally:
+        # consumer went away (e.g. client disconnected): stop the remaining work
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def run_batch(items: Iterable[Dict[str, Any]], runners=None,
+                    concurrency: int = BATCH_CONCURRENCY, ordered: bool = True) -> list:
+    """Collect process_batch results (in input order by default)."""
+    rows = [row async for row in process_batch(items, runners=runners, concurrency=concurrency)]
+    return sorted(rows, key=lambda r: r["index"]) if ordered else rows
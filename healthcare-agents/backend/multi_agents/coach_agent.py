@@ -42,30 +42,51 @@
 
 
 
-import json
-from google.adk.agents import LlmAgent
+from typing import AsyncGenerator
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
 from .mcp.client import MCPToolClient
-from .common.schemas import CoachOutput   
-GEMINI_TEXT = "gemini-2.0-flash"
+from .common.llm_scheduler import current_priority
+from .common.singleflight import single_flight
+from .common.telemetry import agent_callbacks
+from .tools.coach_cache import cache_key, get_cached, put_cached
+
 _mcp_coach = MCPToolClient(["python", "-m", "multi_agents.mcp.coach_mcp"])
 
-# Helper: run MCP coach tool
-def _coach(condition: str, visit_type: str) -> dict:
-    return _mcp_coach.call("coach_for_visit", condition=condition, visit_type=visit_type)
-
-# Create LLM agent
-coach = LlmAgent(
-    name="previsit_coach",
-    model=GEMINI_TEXT,
-    instruction="Return strict JSON {checklist:[], cautions:[], questions_for_doctor:[]}",
-    output_key="coach_json",
-)
-
-# Note: Output validation removed - LlmAgent API has changed
-# Validation can be handled in the helper functions instead
-
-# Optional helper for orchestrator (like a tool)
-def coach_json(condition: str, visit_type: str) -> dict:
-    data = _coach(condition, visit_type)
-    CoachOutput.parse_obj(data)  # validate once more
-    return data
+async def acoach_json(condition: str, visit_type: str) -> dict:
+    """
+    Pre-visit guidance for (condition, visit_type). A pair answered before
+    (after synonym normalization) comes from the coach cache; otherwise one
+    coach_for_visit call is shared by all identical concurrent requests.
+    coach_mcp validates against CoachOutput, so results are used as-is.
+    """
+    cached = get_cached(condition, visit_type)
+    if cached is not None:
+        return cached
+
+    async def fetch() -> dict:
+        # the MCP server's scheduler queues the call at the caller's priority
+        data = await _mcp_coach.acall("coach_for_visit", condition=condition, visit_type=visit_type,
+                                      priority=current_priority())
+        put_cached(condition, visit_type, data)
+        return data
+
+    return await single_flight("coach_for_visit", fetch, key=cache_key(condition, visit_type))
+
+
+class PrevisitCoach(BaseAgent):
+    """
+    previsit_coach: reads condition and visit_type from the session state and
+    writes the guidance to coach_json. It goes through acoach_json (cache, then
+    one shared coach_for_visit call) instead of prompting Gemini itself.
+    """
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        data = await acoach_json(state.get("condition") or "", state.get("visit_type") or "")
+        yield Event(invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch,
+                    actions=EventActions(state_delta={"coach_json": data}))
+
+
+coach = PrevisitCoach(name="previsit_coach", **agent_callbacks())
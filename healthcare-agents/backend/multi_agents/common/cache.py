@@ -0,0 +1,77 @@
+import json, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class TTLCache:
+    """
+    Size-bounded LRU with per-entry TTL and an optional SQLite tier that
+    survives restarts and is shared by every process pointing at `path`.
+    Values must be JSON-serializable when the disk tier is enabled.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, path: Optional[str] = None,
+                 name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {name} (k TEXT PRIMARY KEY, v TEXT, expires REAL)")
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._mem.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                del self._mem[key]
+                self._stats["expired"] += 1
+            if self._db is not None:
+                row = self._db.execute(f"SELECT v, expires FROM {self.name} WHERE k=?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._put_mem(key, value, row[1])
+                    self._stats["disk_hits"] += 1
+                    return value
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._put_mem(key, value, expires)
+            if self._db is not None:
+                self._db.execute(f"INSERT OR REPLACE INTO {self.name} VALUES (?, ?, ?)",
+                                 (key, json.dumps(value), expires))
+
+    def _put_mem(self, key: str, value: Any, expires: float):
+        self._mem[key] = (value, expires)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._mem.pop(key, None)
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.name} WHERE k=?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.name}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "size": len(self._mem), "maxsize": self.maxsize}
@@ -0,0 +1,88 @@
+import asyncio, time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+from .telemetry import STAGE_SECONDS, span
+
+
+@dataclass
+class Stage:
+    """
+    One node of a pipeline graph. `fn` receives the results of its deps
+    (keyed by stage name) and returns this stage's result. On error or
+    timeout the stage resolves to `fallback` instead of failing the run.
+    """
+    name: str
+    fn: Callable[[Dict[str, Any]], Awaitable[Any]]
+    deps: Sequence[str] = ()
+    timeout: Optional[float] = None
+    fallback: Any = None
+
+
+@dataclass
+class DAGResult:
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.errors)
+
+
+def _check(stages: List[Stage]):
+    names = {s.name for s in stages}
+    if len(names) != len(stages):
+        raise ValueError("duplicate stage names")
+    for s in stages:
+        missing = set(s.deps) - names
+        if missing:
+            raise ValueError(f"stage {s.name!r} depends on unknown stage(s) {sorted(missing)}")
+    # Kahn's algorithm to reject cycles up front
+    indeg = {s.name: len(s.deps) for s in stages}
+    ready = [n for n, d in indeg.items() if d == 0]
+    seen = 0
+    while ready:
+        n = ready.pop()
+        seen += 1
+        for s in stages:
+            if n in s.deps:
+                indeg[s.name] -= 1
+                if indeg[s.name] == 0:
+                    ready.append(s.name)
+    if seen != len(stages):
+        raise ValueError("pipeline graph has a cycle")
+
+
+async def run_dag(stages: List[Stage],
+                  on_result: Optional[Callable[[str, Any, Optional[str]], None]] = None) -> DAGResult:
+    """
+    Run every stage as soon as its deps are done; independent stages run
+    concurrently. `on_result(name, value, error)` is called as each stage
+    resolves, for callers that stream partial results.
+    """
+    _check(stages)
+    out = DAGResult()
+    futs: Dict[str, asyncio.Future] = {s.name: asyncio.get_running_loop().create_future() for s in stages}
+
+    async def _run(stage: Stage):
+        inputs = {d: await futs[d] for d in stage.deps}
+        t0 = time.perf_counter()
+        with span(f"stage.{stage.name}"):
+            try:
+                value = await asyncio.wait_for(stage.fn(inputs), stage.timeout)
+            except asyncio.TimeoutError:
+                out.errors[stage.name] = f"timed out after {stage.timeout}s"
+                value = stage.fallback
+            except Exception as e:
+                out.errors[stage.name] = f"{type(e).__name__}: {e}"
+                value = stage.fallback
+        out.timings[stage.name] = time.perf_counter() - t0
+        STAGE_SECONDS.observe(out.timings[stage.name], stage=stage.name,
+                              outcome="error" if stage.name in out.errors else "ok")
+        out.results[stage.name] = value
+        if on_result is not None:
+            on_result(stage.name, value, out.errors.get(stage.name))
+        futs[stage.name].set_result(value)
+
+    await asyncio.gather(*(_run(s) for s in stages))
+    return out
@@ -0,0 +1,471 @@
+import abc, asyncio, hashlib, importlib, json, logging, os, random, sqlite3, threading, time, uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Background jobs (report publishing: render, upload, metadata write) run off
+# the request path. The API enqueues and answers with a job id; a pool of
+# async workers claims jobs with a lease, runs the handler for their kind and
+# retries failures with jittered backoff. Jobs whose worker died are picked
+# up again once the lease runs out.
+# sqlite by default: job status must be readable from every API worker on the host;
+# memory is for tests and single-process runs only (/api/jobs/{id} 404s on the other workers)
+BACKEND = os.getenv("JOB_BACKEND", "sqlite")  # sqlite | memory | pubsub | package.module:QueueClass
+DB_PATH = os.getenv("JOB_DB_PATH", "./jobs.db")
+WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # per API process; 0 = run `python -m multi_agents.common.jobs`
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "1"))
+BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "60"))
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+RETENTION = float(os.getenv("JOB_RETENTION", str(24 * 3600)))  # finished jobs are kept this long
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+log = logging.getLogger(__name__)
+
+
+def job_id_for(kind: str, key: Optional[str]) -> str:
+    # an idempotency key maps to a fixed id, so re-enqueueing the same work is a no-op
+    if key is None:
+        return uuid.uuid4().hex
+    return hashlib.sha256(f"{kind}\0{key}".encode()).hexdigest()[:32]
+
+
+def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Status view of a job (no payload)."""
+    return {k: job.get(k) for k in ("job_id", "kind", "status", "attempts", "result", "error",
+                                    "created", "updated")}
+
+
+class JobQueue(abc.ABC):
+    """
+    Queue interface. claim() hands a due job to exactly one worker for
+    `lease` seconds; complete()/fail() settle it, unless the lease was lost
+    (it expired and another worker claimed the job again). Jobs are dicts
+    with job_id, kind, payload, status, attempts, result, error, created, updated.
+    """
+
+    @abc.abstractmethod
+    def enqueue(self, kind: str, payload: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+        """Add a job (or return the live one with the same key); returns its status."""
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job, or None if it is unknown (or pruned)."""
+
+    @abc.abstractmethod
+    def claim(self, lease: float = LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """Lease the next due job (payload included) to the caller, or None."""
+
+    @abc.abstractmethod
+    def complete(self, job: Dict[str, Any], result: Dict[str, Any]) -> bool:
+        """The claimed job succeeded with `result`; False (and no change) if the lease was lost."""
+
+    @abc.abstractmethod
+    def fail(self, job: Dict[str, Any], error: str, retry_in: Optional[float]) -> bool:
+        """Failed attempt: run again in `retry_in` seconds, or give up if None; False if the lease was lost."""
+
+    @abc.abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Job count per status (may be empty where the backend can't count cheaply)."""
+
+
+class MemoryJobQueue(JobQueue):
+    """One process only: for tests, local development and single-worker deployments."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, kind, payload, key=None):
+        now = time.time()
+        job_id = job_id_for(kind, key)
+        with self._lock:
+            self._prune(now)
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] == FAILED:
+                job = self._jobs[job_id] = {
+                    "job_id": job_id, "kind": kind, "payload": payload, "status": QUEUED, "attempts": 0,
+                    "result": None, "error": None, "created": now, "updated": now,
+                    "run_after": now, "leased_until": 0.0}
+            return _public(job)
+
+    def _prune(self, now: float):
+        for job_id in [j for j, job in self._jobs.items()
+                       if job["status"] in (DONE, FAILED) and job["updated"] < now - RETENTION]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return _public(job) if job else None
+
+    def claim(self, lease=LEASE_SECONDS):
+        now = time.time()
+        with self._lock:
+            for job in self._jobs.values():
+                due = (job["status"] == QUEUED and job["run_after"] <= now) or \
+                      (job["status"] == RUNNING and job["leased_until"] < now)
+                if due:
+                    job.update(status=RUNNING, attempts=job["attempts"] + 1, leased_until=now + lease, updated=now)
+                    return dict(job)
+        return None
+
+    def _leased(self, job) -> Optional[Dict[str, Any]]:
+        # a later claim bumped attempts: the job isn't this caller's any more
+        stored = self._jobs.get(job["job_id"])
+        if stored is None or stored["status"] != RUNNING or stored["attempts"] != job["attempts"]:
+            return None
+        return stored
+
+    def complete(self, job, result):
+        with self._lock:
+            stored = self._leased(job)
+            if stored is not None:
+                stored.update(status=DONE, result=result, error=None, updated=time.time())
+            return stored is not None
+
+    def fail(self, job, error, retry_in):
+        now = time.time()
+        with self._lock:
+            stored = self._leased(job)
+            if stored is None:
+                return False
+            if retry_in is None:
+                stored.update(status=FAILED, error=error, updated=now)
+            else:
+                stored.update(status=QUEUED, error=error, run_after=now + retry_in, updated=now)
+            return True
+
+    def stats(self):
+        with self._lock:
+            out = {s: 0 for s in (QUEUED, RUNNING, DONE, FAILED)}
+            for job in self._jobs.values():
+                out[job["status"]] += 1
+            return out
+
+
+class SQLiteJobQueue(JobQueue):
+    """Shared by every worker and process on one host (WAL; claims are single UPDATEs)."""
+
+    def __init__(self, path: str = DB_PATH, busy_timeout: float = 5.0):
+        self.path, self.busy_timeout = path, busy_timeout
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, kind TEXT, payload TEXT, status TEXT, attempts INTEGER,"
+            " result TEXT, error TEXT, created REAL, updated REAL, run_after REAL, leased_until REAL)")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_after)")
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread (and per process: connections don't survive fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=self.busy_timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    _COLUMNS = "job_id, kind, payload, status, attempts, result, error, created, updated"
+
+    def _row(self, row) -> Dict[str, Any]:
+        job = dict(zip(self._COLUMNS.split(", "), row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, kind, payload, key=None):
+        now = time.time()
+        job_id = job_id_for(kind, key)
+        db = self._db()
+        db.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?", (DONE, FAILED, now - RETENTION))
+        db.execute("INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, ?, 0, NULL, NULL, ?, ?, ?, 0)",
+                   (job_id, kind, json.dumps(payload), QUEUED, now, now, now))
+        # a dead job with the same key gets another go
+        db.execute("UPDATE jobs SET status=?, attempts=0, error=NULL, payload=?, run_after=?, updated=?"
+                   " WHERE job_id=? AND status=?", (QUEUED, json.dumps(payload), now, now, job_id, FAILED))
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._db().execute(f"SELECT {self._COLUMNS} FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return _public(self._row(row)) if row else None
+
+    def claim(self, lease=LEASE_SECONDS):
+        now = time.time()
+        row = self._db().execute(
+            "UPDATE jobs SET status=?, attempts=attempts+1, leased_until=?, updated=?"
+            " WHERE job_id = (SELECT job_id FROM jobs"
+            "   WHERE (status=? AND run_after<=?) OR (status=? AND leased_until<?)"
+            "   ORDER BY run_after LIMIT 1)"
+            f" RETURNING {self._COLUMNS}",
+            (RUNNING, now + lease, now, QUEUED, now, RUNNING, now)).fetchone()
+        return self._row(row) if row else None
+
+    # only the holder of the current lease may settle a job: a later claim bumped attempts
+    _LEASED = " WHERE job_id=? AND status=? AND attempts=?"
+
+    def complete(self, job, result):
+        cur = self._db().execute("UPDATE jobs SET status=?, result=?, error=NULL, updated=?" + self._LEASED,
+                                 (DONE, json.dumps(result), time.time(), job["job_id"], RUNNING, job["attempts"]))
+        return cur.rowcount == 1
+
+    def fail(self, job, error, retry_in):
+        now = time.time()
+        lease = (job["job_id"], RUNNING, job["attempts"])
+        if retry_in is None:
+            cur = self._db().execute("UPDATE jobs SET status=?, error=?, updated=?" + self._LEASED,
+                                     (FAILED, error, now) + lease)
+        else:
+            cur = self._db().execute("UPDATE jobs SET status=?, error=?, run_after=?, updated=?" + self._LEASED,
+                                     (QUEUED, error, now + retry_in, now) + lease)
+        return cur.rowcount == 1
+
+    def stats(self):
+        out = {s: 0 for s in (QUEUED, RUNNING, DONE, FAILED)}
+        out.update(self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return out
+
+
+class PubSubJobQueue(JobQueue):
+    """
+    Cloud Pub/Sub transport (JOB_PUBSUB_TOPIC / JOB_PUBSUB_SUBSCRIPTION) with
+    job status in Firestore (`jobs/{job_id}`), so API replicas and worker
+    deployments share both. Retries are redeliveries: a failed attempt's
+    message is nacked with an ack deadline of the backoff delay. A claim
+    remembers the update_time of its status write; settling is conditional
+    on it, so a worker whose message was redelivered to another one can't
+    overwrite that worker's status.
+    """
+
+    def __init__(self, topic: Optional[str] = None, subscription: Optional[str] = None):
+        from google.cloud import pubsub_v1
+        from ..tools.clients import firestore_client
+        self.topic = topic or os.environ["JOB_PUBSUB_TOPIC"]
+        self.subscription = subscription or os.environ["JOB_PUBSUB_SUBSCRIPTION"]
+        self._publisher = pubsub_v1.PublisherClient()
+        self._subscriber = pubsub_v1.SubscriberClient()
+        self._db = firestore_client()
+        self._acks: Dict[str, Tuple[str, Any]] = {}  # job_id -> (ack_id, update_time of our claim)
+
+    def _doc(self, job_id: str):
+        return self._db.collection("jobs").document(job_id)
+
+    def enqueue(self, kind, payload, key=None):
+        now = time.time()
+        job_id = job_id_for(kind, key)
+        job = {"job_id": job_id, "kind": kind, "status": QUEUED, "attempts": 0, "result": None,
+               "error": None, "created": now, "updated": now}
+        ref = self._doc(job_id)
+        try:
+            ref.create(job)  # atomic: of two concurrent enqueues only one publishes
+        except Exception as e:
+            if getattr(e, "code", None) != 409:  # AlreadyExists
+                raise
+            snap = ref.get()
+            if snap.exists and snap.to_dict().get("status") != FAILED:
+                return _public(snap.to_dict())
+            # a dead job with the same key gets another go, unless someone revived it first
+            try:
+                ref.update(job, option=self._db.write_option(last_update_time=snap.update_time))
+            except Exception:
+                snap = ref.get()
+                if snap.exists and snap.to_dict().get("status") != FAILED:
+                    return _public(snap.to_dict())
+                raise
+        body = json.dumps({"job_id": job_id, "kind": kind, "payload": payload}).encode()
+        self._publisher.publish(self.topic, body).result()
+        return job
+
+    def get(self, job_id):
+        snap = self._doc(job_id).get()
+        return _public(snap.to_dict()) if snap.exists else None
+
+    def claim(self, lease=LEASE_SECONDS):
+        resp = self._subscriber.pull(request={"subscription": self.subscription, "max_messages": 1},
+                                     timeout=POLL_INTERVAL * 4)
+        if not resp.received_messages:
+            return None
+        msg = resp.received_messages[0]
+        body = json.loads(msg.message.data)
+        self._subscriber.modify_ack_deadline(request={
+            "subscription": self.subscription, "ack_ids": [msg.ack_id],
+            "ack_deadline_seconds": int(min(600, max(10, lease)))})
+        snap = self._doc(body["job_id"]).get()
+        job = snap.to_dict() if snap.exists else {"job_id": body["job_id"], "kind": body["kind"], "attempts": 0}
+        job.update(payload=body["payload"], status=RUNNING, attempts=job.get("attempts", 0) + 1,
+                   updated=time.time())
+        res = self._doc(job["job_id"]).set({k: v for k, v in job.items() if k != "payload"}, merge=True)
+        self._acks[job["job_id"]] = (msg.ack_id, res.update_time)
+        return job
+
+    def complete(self, job, result):
+        return self._settle(job, {"status": DONE, "result": result, "error": None}, ack=True)
+
+    def fail(self, job, error, retry_in):
+        status = FAILED if retry_in is None else QUEUED
+        return self._settle(job, {"status": status, "error": error}, ack=retry_in is None, delay=retry_in or 0)
+
+    def _settle(self, job, fields: Dict[str, Any], ack: bool, delay: float = 0) -> bool:
+        lease = self._acks.pop(job["job_id"], None)
+        if lease is None:
+            return False
+        ack_id, claimed_at = lease
+        try:
+            self._doc(job["job_id"]).update({**fields, "updated": time.time()},
+                                            option=self._db.write_option(last_update_time=claimed_at))
+        except Exception as e:
+            if getattr(e, "code", None) != 400:  # FailedPrecondition: claimed again since
+                raise
+            return False
+        if ack:
+            self._subscriber.acknowledge(request={"subscription": self.subscription, "ack_ids": [ack_id]})
+        else:
+            # Pub/Sub takes 10..600s; a 0 deadline would redeliver at once, skipping the backoff
+            self._subscriber.modify_ack_deadline(request={
+                "subscription": self.subscription, "ack_ids": [ack_id],
+                "ack_deadline_seconds": int(min(600, max(10, delay)))})
+        return True
+
+    def stats(self):
+        return {}  # lives in Pub/Sub (num_undelivered_messages) and the jobs collection
+
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+HANDLERS: Dict[str, Handler] = {}
+
+
+def handler(kind: str):
+    """Register the coroutine that runs jobs of `kind`: `@handler("publish_report")`."""
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def backoff(attempt: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * (0.5 + random.random())
+
+
+class JobWorkers:
+    """`concurrency` async workers draining `queue` with the registered handlers."""
+
+    def __init__(self, queue: JobQueue, concurrency: int = WORKERS, max_attempts: int = MAX_ATTEMPTS):
+        self.queue, self.concurrency, self.max_attempts = queue, concurrency, max_attempts
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._event_loop = asyncio.get_running_loop()
+        self._tasks = [asyncio.ensure_future(self._loop()) for _ in range(max(0, self.concurrency))]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """A job was just enqueued here: skip the poll wait. Callable from any thread."""
+        if self._wakeup is not None and not self._event_loop.is_closed():
+            # enqueue() often runs in a worker thread (asyncio.to_thread); Event.set isn't thread-safe
+            self._event_loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _loop(self):
+        while True:
+            job = await asyncio.to_thread(self.queue.claim, LEASE_SECONDS)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self.run_one(job)
+
+    async def run_one(self, job: Dict[str, Any]):
+        fn = HANDLERS.get(job["kind"])
+        try:
+            if fn is None:
+                raise LookupError(f"no handler for job kind {job['kind']!r}")
+            result = await fn(job["payload"])
+        except asyncio.CancelledError:
+            raise  # shutdown: the lease expires and another worker retries it
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            retry_in = backoff(job["attempts"]) if job["attempts"] < self.max_attempts and fn else None
+            log.warning("job %s (%s) attempt %d failed: %s", job["job_id"], job["kind"], job["attempts"], error)
+            settled = await asyncio.to_thread(self.queue.fail, job, error, retry_in)
+        else:
+            settled = await asyncio.to_thread(self.queue.complete, job, result or {})
+        if not settled:
+            log.warning("job %s (%s) attempt %d: lease lost, outcome dropped (the job was claimed again)",
+                        job["job_id"], job["kind"], job["attempts"])
+
+
+def make_queue() -> JobQueue:
+    if BACKEND == "memory":
+        return MemoryJobQueue()
+    if BACKEND == "sqlite":
+        return SQLiteJobQueue()
+    if BACKEND == "pubsub":
+        return PubSubJobQueue()
+    module, _, name = BACKEND.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+_queue: Optional[JobQueue] = None
+_workers: Optional[JobWorkers] = None
+
+
+def job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = make_queue()
+    return _queue
+
+
+def enqueue(kind: str, payload: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+    """Queue a job; returns {"job_id", "status", ...} without waiting for it."""
+    job = job_queue().enqueue(kind, payload, key)
+    if _workers is not None:
+        _workers.notify()
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return job_queue().get(job_id)
+
+
+def start_workers(concurrency: int = WORKERS) -> Optional[JobWorkers]:
+    """Start this process's worker pool (call from the running loop, e.g. app startup)."""
+    global _workers
+    if _workers is None and concurrency > 0:
+        _workers = JobWorkers(job_queue(), concurrency)
+        _workers.start()
+    return _workers
+
+
+async def stop_workers():
+    global _workers
+    if _workers is not None:
+        await _workers.stop()
+        _workers = None
+
+
+if __name__ == "__main__":
+    # standalone worker deployment (JOB_BACKEND=sqlite or pubsub, JOB_WORKERS=0 on the API)
+    # imported through the package so handlers register on the module the workers read
+    from multi_agents.common import jobs
+    from multi_agents import report_agent  # noqa: F401  registers the publish_report handler
+
+    async def _main():
+        jobs.start_workers(max(1, jobs.WORKERS))
+        await asyncio.Event().wait()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    asyncio.run(_main())
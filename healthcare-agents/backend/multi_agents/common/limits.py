@@ -0,0 +1,38 @@
+import asyncio, os
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+
+# Per-downstream concurrency caps, shared by every request on an event loop,
+# so a big batch can't exceed Gemini/MCP/Firestore quotas on its own.
+LIMITS: Dict[str, int] = {
+    "gemini": int(os.getenv("LIMIT_GEMINI", "16")),
+    "mcp": int(os.getenv("LIMIT_MCP", "32")),
+    "firestore": int(os.getenv("LIMIT_FIRESTORE", "64")),
+    "images": int(os.getenv("LIMIT_IMAGES", str(os.cpu_count() or 2))),
+}
+
+_sems: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+
+
+def _sem(name: str) -> asyncio.Semaphore:
+    # asyncio semaphores belong to one loop; keep one per (stage, loop)
+    key = (name, id(asyncio.get_running_loop()))
+    sem = _sems.get(key)
+    if sem is None:
+        sem = _sems[key] = asyncio.Semaphore(LIMITS[name])
+    return sem
+
+
+@asynccontextmanager
+async def limit(name: str):
+    """`async with limit("gemini"):` caps concurrent calls to that downstream."""
+    async with _sem(name):
+        yield
+
+
+def in_use() -> Dict[str, int]:
+    """Slots currently taken per stage, summed over loops."""
+    out = {name: 0 for name in LIMITS}
+    for (name, _), sem in _sems.items():
+        out[name] += LIMITS[name] - sem._value
+    return out
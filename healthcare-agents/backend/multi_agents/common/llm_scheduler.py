@@ -0,0 +1,337 @@
+import asyncio, contextvars, os, random, sqlite3, threading, time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+from .limits import limit
+from .telemetry import LLM_HEDGES, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_RETRIES
+
+# Gate in front of every Gemini call (ADK agents via common/scheduled_gemini.py,
+# the intake/coach MCP servers directly). Each model family has a token bucket;
+# callers waiting for a token queue by priority, so dashboard requests go ahead
+# of batch jobs. With LLM_RATE_DB set the buckets live in that SQLite file, so
+# uvicorn workers and their MCP subprocesses on one host draw from the same
+# quota instead of each getting the full rate. Retryable errors (429/5xx/timeouts) are
+# retried with jittered backoff and slow interactive calls can be hedged.
+# Requests actually in flight are capped by limits.LIMITS["gemini"].
+INTERACTIVE, BATCH = "interactive", "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+def _parse_rates(spec: str, split: int = 1) -> Dict[str, Tuple[float, float]]:
+    # "flash=10:20,pro=2:4" -> {family: (requests per second, burst)}, each divided `split` ways
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        rate, _, burst = value.partition(":")
+        rates[name.strip()] = (float(rate) / split, max(1.0, float(burst or rate) / split))
+    return rates
+
+
+LLM_RATE_DB = os.getenv("LLM_RATE_DB", "")  # shared by the processes on a host; "" = per process
+# independent buckets splitting the quota: hosts (replicas) with LLM_RATE_DB, processes without it
+LLM_RATE_SPLIT = max(1, int(os.getenv("LLM_RATE_SPLIT", "1")))
+LLM_RATES = _parse_rates(os.getenv("LLM_RATE_LIMITS", "flash=10:20,pro=2:4"), LLM_RATE_SPLIT)
+LLM_MAX_RETRIES = int(os.getenv("LLM_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER_MS", "0")) / 1000.0  # 0 = no hedging
+LLM_BATCH_MAX_WAIT = float(os.getenv("LLM_BATCH_MAX_WAIT", "30"))  # older batch waiters go next anyway
+LLM_RATE_DB_BACKOFF = 0.01  # max wait before retrying a shared bucket another process has locked
+RETRY_CODES = {408, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Model calls made inside the block (and tasks it starts) queue at `priority`."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"unknown priority {priority!r}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def family(model: str) -> Optional[str]:
+    """Rate-limit family of a model name ("gemini-2.0-flash" -> "flash"); None = unthrottled."""
+    for name in LLM_RATES:
+        if name in model:
+            return name
+    return None
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst` saved up. Thread-safe, never blocks."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate, self.burst, self.clock = rate, max(1.0, burst), clock
+        self.tokens, self._stamp = self.burst, clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def try_take(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def delay(self) -> float:
+        """Seconds until a token is available."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else 1.0
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """
+    A TokenBucket whose level is a row in a SQLite file, so every process
+    opening the same file shares it. Each take is one short write transaction;
+    stamps are wall-clock time because monotonic clocks aren't comparable
+    across processes. Takes run on the event loop, so they never wait for the
+    file lock: if another process holds it, try_take() returns False and
+    delay() asks for a short jittered retry.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        super().__init__(rate, burst, clock)
+        self.name, self.path = name, path or LLM_RATE_DB
+        self._local = threading.local()
+        self._busy = False
+        # one-off setup may wait for the lock; WAL mode sticks to the file
+        setup = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+        try:
+            setup.execute("PRAGMA journal_mode=WAL")
+            setup.execute("CREATE TABLE IF NOT EXISTS llm_buckets ("
+                          " name TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL)")
+        finally:
+            setup.close()
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread and per process (connections don't survive fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=0)
+            conn.execute("PRAGMA synchronous=OFF")  # losing a refill stamp on power loss is harmless
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _level(self, db: sqlite3.Connection) -> float:
+        row = db.execute("SELECT tokens, stamp FROM llm_buckets WHERE name=?", (self.name,)).fetchone()
+        now = self.clock()
+        tokens, stamp = row if row else (self.burst, now)
+        self.tokens = min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+        return now
+
+    def try_take(self) -> bool:
+        db = self._db()
+        with self._lock:
+            try:
+                db.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:  # locked by another process
+                self._busy = True
+                return False
+            self._busy = False
+            try:
+                now = self._level(db)
+                taken = self.tokens >= 1
+                if taken:
+                    self.tokens -= 1
+                db.execute("INSERT OR REPLACE INTO llm_buckets VALUES (?, ?, ?)", (self.name, self.tokens, now))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return taken
+
+    def delay(self) -> float:
+        with self._lock:
+            if not self._busy:
+                try:
+                    self._level(self._db())
+                    return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else 1.0
+                except sqlite3.OperationalError:
+                    pass
+            return random.uniform(LLM_RATE_DB_BACKOFF / 10, LLM_RATE_DB_BACKOFF)
+
+
+def make_bucket(name: str) -> TokenBucket:
+    rate, burst = LLM_RATES[name]
+    return SQLiteTokenBucket(name, rate, burst) if LLM_RATE_DB else TokenBucket(rate, burst)
+
+
+class _Gate:
+    """Priority queues in front of one bucket, on one event loop."""
+
+    def __init__(self, name: str, bucket: TokenBucket):
+        self.name, self.bucket = name, bucket
+        self.queues: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {p: deque() for p in PRIORITIES}
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def try_acquire(self) -> bool:
+        # nobody may jump the queue, not even a hedge
+        return not self.waiting() and self.bucket.try_take()
+
+    async def acquire(self, priority: str):
+        t0 = time.monotonic()
+        if not self.try_acquire():
+            entry = (t0, asyncio.get_running_loop().create_future())
+            self.queues[priority].append(entry)
+            LLM_QUEUE_DEPTH.inc(family=self.name, priority=priority)
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.ensure_future(self._dispatch())
+            try:
+                await entry[1]
+            except asyncio.CancelledError:
+                if entry in self.queues[priority]:
+                    self.queues[priority].remove(entry)
+                    LLM_QUEUE_DEPTH.dec(family=self.name, priority=priority)
+                raise
+        LLM_QUEUE_WAIT_SECONDS.observe(time.monotonic() - t0, family=self.name, priority=priority)
+
+    def _pop(self) -> Optional[asyncio.Future]:
+        interactive, batch = self.queues[INTERACTIVE], self.queues[BATCH]
+        # strict priority, except that a batch request is never starved for longer than LLM_BATCH_MAX_WAIT
+        starved = batch and time.monotonic() - batch[0][0] > LLM_BATCH_MAX_WAIT
+        priority = BATCH if starved or not interactive else INTERACTIVE
+        queue = self.queues[priority]
+        if not queue:
+            return None
+        LLM_QUEUE_DEPTH.dec(family=self.name, priority=priority)
+        return queue.popleft()[1]
+
+    async def _dispatch(self):
+        while self.waiting():
+            if not self.bucket.try_take():
+                await asyncio.sleep(self.bucket.delay())
+                continue
+            fut = self._pop()
+            if fut is not None and not fut.done():
+                fut.set_result(None)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_gates: Dict[Tuple[str, int], _Gate] = {}
+_lock = threading.Lock()
+
+
+def _gate(name: str) -> _Gate:
+    # the bucket is shared by the whole process (and LLM_RATE_DB); futures belong to one loop, so gates are per loop
+    key = (name, id(asyncio.get_running_loop()))
+    gate = _gates.get(key)
+    if gate is None:
+        with _lock:
+            bucket = _buckets.get(name)
+            if bucket is None:
+                bucket = _buckets[name] = make_bucket(name)
+            gate = _gates.setdefault(key, _Gate(name, bucket))
+    return gate
+
+
+async def acquire(model: str, priority: Optional[str] = None):
+    """Wait for a rate-limit token for `model` (no retries); for calls schedule() can't wrap."""
+    name = family(model)
+    if name is not None:
+        await _gate(name).acquire(priority or current_priority())
+
+
+def retryable(e: BaseException) -> bool:
+    """Quota, overload and transient transport errors; anything else is the caller's problem."""
+    if isinstance(e, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(e, "code", None)
+    return isinstance(code, int) and code in RETRY_CODES
+
+
+def _reason(e: BaseException) -> str:
+    code = getattr(e, "code", None)
+    return str(code) if isinstance(code, int) else type(e).__name__
+
+
+def backoff(attempt: int) -> float:
+    # "full jitter": spreads retries from many callers instead of retrying in lockstep
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+async def _hedged(name: Optional[str], call: Callable[[], Awaitable[T]], after: float) -> T:
+    first = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({first}, timeout=after)
+    # a hedge only goes out if there's spare quota right now
+    if done or (name is not None and not _gate(name).try_acquire()):
+        return await first
+    second = asyncio.ensure_future(call())
+    attempts = {first: "primary", second: "hedge"}
+    pending, error = set(attempts), None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    LLM_HEDGES.inc(family=name or "", winner=attempts[t])
+                    return t.result()
+                error = t.exception()
+        raise error
+    finally:
+        for t in pending:
+            t.cancel()
+
+
+async def schedule(model: str, call: Callable[[], Awaitable[T]], priority: Optional[str] = None,
+                   retries: int = LLM_MAX_RETRIES, hedge_after: Optional[float] = None) -> T:
+    """
+    Run `call()` (one model request) through the scheduler: wait for a token
+    in priority order, retry retryable errors with jittered backoff (taking a
+    new token each time), and for interactive calls send a second request if
+    the first hasn't answered after LLM_HEDGE_AFTER_MS. Batch calls are never
+    hedged unless `hedge_after` is passed.
+    """
+    priority = priority or current_priority()
+    if hedge_after is None:
+        hedge_after = LLM_HEDGE_AFTER if priority == INTERACTIVE else 0.0
+    name = family(model)
+
+    async def capped() -> T:
+        async with limit("gemini"):
+            return await call()
+
+    for attempt in range(retries + 1):
+        await acquire(model, priority)
+        try:
+            if hedge_after > 0:
+                return await _hedged(name, capped, hedge_after)
+            return await capped()
+        except Exception as e:
+            if attempt >= retries or not retryable(e):
+                raise
+            LLM_RETRIES.inc(family=name or "", reason=_reason(e))
+            await asyncio.sleep(backoff(attempt))
+
+
+def stats() -> Dict[str, Any]:
+    """Tokens left per family and queue depth per (family, priority), for /health-style endpoints."""
+    out: Dict[str, Any] = {}
+    for name, bucket in list(_buckets.items()):
+        bucket.delay()  # refill
+        out[name] = {"tokens": round(bucket.tokens, 2), "rate": bucket.rate, "burst": bucket.burst,
+                     "waiting": {p: 0 for p in PRIORITIES}}
+    for (name, _), gate in list(_gates.items()):
+        for p, q in gate.queues.items():
+            out[name]["waiting"][p] += len(q)
+    return out
@@ -0,0 +1,98 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+from .llm_scheduler import retryable
+from .telemetry import MICROBATCH_SIZE
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# run_batch(items) -> one result per item, in order; an exception in a slot fails only that caller.
+# If the whole batch call fails with an error `split` accepts (by default anything
+# but quota/overload/timeouts), its items are retried one per call so one bad item
+# (or a payload too big for one request) doesn't fail everyone; other errors go to
+# every caller as they are, instead of multiplying the calls into a struggling upstream.
+RunBatch = Callable[[List[Any]], Awaitable[List[Any]]]
+
+
+class _Window:
+    def __init__(self):
+        self.items: List[Tuple[Any, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Coalesces concurrent submit() calls into one `run_batch` call. A batch goes
+    out when it has `max_size` items or `max_wait` seconds after its first
+    item arrived, whichever comes first, so a lone request waits at most
+    `max_wait`. max_size <= 1 turns batching off.
+    """
+
+    def __init__(self, name: str, run_batch: RunBatch, max_size: int, max_wait: float,
+                 split: Optional[Callable[[Exception], bool]] = None):
+        self.name, self.run_batch = name, run_batch
+        self.split = split or (lambda e: not retryable(e))
+        self.max_size, self.max_wait = max_size, max_wait
+        self._windows: Dict[int, _Window] = {}
+        self._running: set = set()
+        self.stats = {"items": 0, "batches": 0, "fallbacks": 0}
+
+    async def submit(self, item: T) -> R:
+        self.stats["items"] += 1
+        if self.max_size <= 1:
+            self.stats["batches"] += 1
+            MICROBATCH_SIZE.observe(1, batcher=self.name)
+            return (await self._call([item]))[0]
+        loop = asyncio.get_running_loop()
+        # futures belong to one loop; keep one open window per loop
+        window = self._windows.setdefault(id(loop), _Window())
+        fut = loop.create_future()
+        window.items.append((item, fut))
+        if len(window.items) >= self.max_size:
+            self._flush(id(loop))
+        elif window.timer is None:
+            window.timer = loop.call_later(self.max_wait, self._flush, id(loop))
+        # a cancelled caller only gives up its own slot; the batch still runs
+        return await asyncio.shield(fut)
+
+    def _flush(self, key: int):
+        window = self._windows.pop(key, None)
+        if window is None or not window.items:
+            return
+        if window.timer is not None:
+            window.timer.cancel()
+        self.stats["batches"] += 1
+        MICROBATCH_SIZE.observe(len(window.items), batcher=self.name)
+        task = asyncio.ensure_future(self._run(window.items))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _call(self, items: List[T]) -> List[Any]:
+        results = await self.run_batch(items)
+        if len(results) != len(items):
+            raise ValueError(f"{self.name}: {len(results)} results for {len(items)} items")
+        return results
+
+    async def _one(self, item: T) -> Any:
+        try:
+            return (await self._call([item]))[0]
+        except Exception as e:
+            return e
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        try:
+            results = await self._call(items)
+        except Exception as e:
+            if len(items) == 1 or not self.split(e):
+                results = [e] * len(items)
+            else:
+                self.stats["fallbacks"] += 1
+                results = await asyncio.gather(*(self._one(item) for item in items))
+        for (_, fut), res in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(res, BaseException):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
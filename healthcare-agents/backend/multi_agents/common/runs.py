@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, Optional
+from google.adk.agents.run_config import RunConfig
+from google.adk.events import Event, EventActions
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+from .codec import dumps
+from .sessions import ensure_session
+
+# Driving one ADK Runner for one turn. A stage's inputs are written into the
+# session state first (so instruction templates such as {transcript_snippet}
+# resolve and output_keys land next to them) and also sent as the user turn,
+# as JSON. `state` is written to the session only: values an agent doesn't need
+# to read (or already gets through its instruction) stay out of the prompt. Each pipeline stage has its own Runner (orchestration.AgentRunners),
+# so a turn only runs that stage's agent.
+
+
+def user_message(inputs: Dict[str, Any]) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=dumps(inputs or {}))])
+
+
+def put_state(runner, user_id: str, session_id: str, delta: Dict[str, Any]) -> None:
+    """Merge `delta` into the session state through a state-only event."""
+    svc = runner.session_service
+    session = svc.get_session(app_name=runner.app_name, user_id=user_id, session_id=session_id,
+                              config=GetSessionConfig(num_recent_events=1))
+    svc.append_event(session, Event(author="user", actions=EventActions(state_delta=dict(delta))))
+
+
+def session_state(runner, user_id: str, session_id: str) -> Dict[str, Any]:
+    session = runner.session_service.get_session(app_name=runner.app_name, user_id=user_id,
+                                                 session_id=session_id,
+                                                 config=GetSessionConfig(num_recent_events=1))
+    return dict(session.state) if session else {}
+
+
+async def run_agent(runner, user_id: str, session_id: str, inputs: Dict[str, Any],
+                    run_config: Optional[RunConfig] = None,
+                    on_event: Optional[Callable[[Event], Awaitable[None]]] = None,
+                    state: Optional[Dict[str, Any]] = None) -> SimpleNamespace:
+    """
+    Run `runner`'s agent for one turn on (user_id, session_id) with `inputs`
+    and return SimpleNamespace(state=<session state afterwards>, events=[...]).
+    `state` is merged into the session state without being sent to the model.
+    on_event sees every event as it is produced, partial ones included; only
+    complete events are returned.
+    """
+    ensure_session(runner, user_id, session_id)
+    if inputs or state:
+        put_state(runner, user_id, session_id, {**(state or {}), **(inputs or {})})
+    events = []
+    async for event in runner.run_async(user_id=user_id, session_id=session_id,
+                                        new_message=user_message(inputs),
+                                        run_config=run_config or RunConfig()):
+        if on_event is not None:
+            await on_event(event)
+        if not event.partial:
+            events.append(event)
+    return SimpleNamespace(state=session_state(runner, user_id, session_id), events=events)
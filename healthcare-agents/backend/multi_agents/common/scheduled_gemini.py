@@ -0,0 +1,42 @@
+from typing import AsyncGenerator
+from google.adk.models import Gemini, LlmRequest, LlmResponse
+from .limits import limit
+from .llm_scheduler import acquire, schedule
+
+
+class ScheduledGemini(Gemini):
+    """
+    ADK Gemini model whose requests go through common/llm_scheduler: rate
+    limited per model family, queued by priority, retried and (interactive,
+    non-streaming) hedged. Pass it as an LlmAgent's `model`. With
+    FAKE_BACKENDS=1 requests are answered by tools/fakes.FakeLlm instead of
+    Vertex AI, behind the same scheduling.
+    """
+
+    def _transport(self):
+        from ..tools.clients import FAKE_BACKENDS
+        if FAKE_BACKENDS:
+            from ..tools.fakes import FakeLlm
+            return FakeLlm(self.model).generate_content_async
+        return super().generate_content_async
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        call = self._transport()
+        if stream:
+            # a stream can't be replayed once chunks went out: rate-limited, not retried
+            await acquire(self.model)
+            async with limit("gemini"):
+                async for response in call(llm_request, stream=True):
+                    yield response
+            return
+
+        async def once():
+            return [r async for r in call(llm_request, stream=False)]
+
+        for response in await schedule(self.model, once):
+            yield response
+
+
+def scheduled_model(model: str) -> ScheduledGemini:
+    return ScheduledGemini(model=model)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, validator
+from typing import Any, Dict, Iterable, List, Optional, Union
 from datetime import date
 
 class Task(BaseModel):
@@ -7,6 +7,7 @@ class Task(BaseModel):
     due_date: Optional[date] = None
     source: str = "doctor"
     confidence: float = Field(ge=0.0, le=1.0, default=0.8)
+    needs_review: bool = False  # near-duplicate of an earlier task (tools/dedupe.py)
 
     @validator("title")
     def title_not_empty(cls, v):
@@ -18,3 +19,41 @@ class CoachOutput(BaseModel):
     checklist: List[str] = []
     cautions: List[str] = []
     questions_for_doctor: List[str] = []
+
+
+# Bulk (de)serialization. Task arrays are validated once, in one pass, where
+# they enter the process (model output); from there they travel as Task
+# objects or as JSON-ready rows that are never validated again.
+TaskList = TypeAdapter(List[Task])
+
+
+def _drop_invalid(items: List[Any], err: ValidationError) -> List[Any]:
+    bad = {e["loc"][0] for e in err.errors() if e["loc"] and isinstance(e["loc"][0], int)}
+    return [d for i, d in enumerate(items) if i not in bad]
+
+
+def parse_tasks(items: Iterable[Any]) -> List[Task]:
+    """Validate a task array in one pass; malformed items are dropped, not fatal."""
+    items = list(items)
+    try:
+        return TaskList.validate_python(items)
+    except ValidationError as e:
+        kept = _drop_invalid(items, e)
+    try:
+        return TaskList.validate_python(kept)
+    except ValidationError:
+        return []
+
+
+def dump_tasks(tasks: List[Task]) -> List[Dict[str, Any]]:
+    """JSON-ready rows (dates as ISO strings) for session state and Firestore."""
+    return TaskList.dump_python(tasks, mode="json")
+
+
+def dump_tasks_json(tasks: List[Task]) -> str:
+    return TaskList.dump_json(tasks).decode()
+
+
+def parse_coach_json(data: Union[str, bytes]) -> Dict[str, Any]:
+    """Validate raw coach JSON straight into a plain dict; raises ValidationError."""
+    return CoachOutput.model_validate_json(data).model_dump()
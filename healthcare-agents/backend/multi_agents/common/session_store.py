@@ -0,0 +1,289 @@
+import abc, asyncio, importlib, os, random, sqlite3, threading, time, uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig, ListEventsResponse, ListSessionsResponse
+)
+
+# Shared session service for multi-worker / multi-replica deployments. Every
+# read goes to the store and every write is a compare-and-swap on a per-session
+# version, so any worker can serve any request (no sticky routing).
+DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions.db")
+MAX_EVENTS = int(os.getenv("SESSION_MAX_EVENTS", "200"))  # older events are trimmed; state is kept
+CAS_RETRIES = int(os.getenv("SESSION_CAS_RETRIES", "8"))
+TTL_SECONDS = float(os.getenv("SESSION_TTL", "3600"))
+EXPIRE_EVERY = float(os.getenv("SESSION_EXPIRE_EVERY", "60"))  # seconds between purges, piggybacked on writes
+
+Key = Tuple[str, str, str]  # (app_name, patient/user id, session id)
+
+
+class SessionConflict(RuntimeError):
+    """A compare-and-swap lost to a concurrent writer (too many times)."""
+
+
+class SessionStore(abc.ABC):
+    """
+    Storage interface behind SharedSessionService. A networked store (Redis,
+    Firestore, Postgres, ...) only needs these operations, with cas() atomic:
+    Redis WATCH/MULTI, a Firestore transaction or an UPDATE ... WHERE version=?.
+    Bodies are opaque JSON strings; versions start at 1 and grow by one per write.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: Key) -> Optional[Tuple[str, int]]:
+        """(body, version) or None."""
+
+    @abc.abstractmethod
+    def create(self, key: Key, body: str) -> bool:
+        """Insert at version 1 unless the key exists; False if it did."""
+
+    @abc.abstractmethod
+    def cas(self, key: Key, body: str, expected_version: int) -> bool:
+        """Replace the body iff the stored version is still expected_version."""
+
+    @abc.abstractmethod
+    def delete(self, key: Key) -> None:
+        """Remove the session if it exists."""
+
+    @abc.abstractmethod
+    def list(self, app_name: str, user_id: str) -> List[Tuple[str, float]]:
+        """(session_id, updated) for one user."""
+
+    @abc.abstractmethod
+    def expire(self, cutoff: float) -> int:
+        """Drop sessions last written before cutoff; returns how many."""
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        """Stored sessions, expired ones included until the next purge."""
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Local shared store: one SQLite file in WAL mode, safe across threads,
+    uvicorn workers and processes on the same host.
+    """
+
+    def __init__(self, path: str = DB_PATH, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " app_name TEXT, user_id TEXT, session_id TEXT, body TEXT, version INTEGER, updated REAL,"
+            " PRIMARY KEY (app_name, user_id, session_id))")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread (and per process: connections don't survive fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=self.busy_timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: Key) -> Optional[Tuple[str, int]]:
+        row = self._db().execute(
+            "SELECT body, version FROM sessions WHERE app_name=? AND user_id=? AND session_id=?",
+            key).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def create(self, key: Key, body: str) -> bool:
+        cur = self._db().execute("INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?, 1, ?)",
+                                 (*key, body, time.time()))
+        return cur.rowcount == 1
+
+    def cas(self, key: Key, body: str, expected_version: int) -> bool:
+        cur = self._db().execute(
+            "UPDATE sessions SET body=?, version=version+1, updated=?"
+            " WHERE app_name=? AND user_id=? AND session_id=? AND version=?",
+            (body, time.time(), *key, expected_version))
+        return cur.rowcount == 1
+
+    def delete(self, key: Key) -> None:
+        self._db().execute("DELETE FROM sessions WHERE app_name=? AND user_id=? AND session_id=?", key)
+
+    def list(self, app_name: str, user_id: str) -> List[Tuple[str, float]]:
+        return self._db().execute("SELECT session_id, updated FROM sessions WHERE app_name=? AND user_id=?",
+                                  (app_name, user_id)).fetchall()
+
+    def expire(self, cutoff: float) -> int:
+        return self._db().execute("DELETE FROM sessions WHERE updated < ?", (cutoff,)).rowcount
+
+    def count(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SharedSessionService(BaseSessionService):
+    """
+    ADK session service over a SessionStore. Appended events are rebased onto
+    the latest stored copy and written with compare-and-swap, so concurrent
+    workers merge their state deltas instead of overwriting each other;
+    update_state() offers an explicit expected_version check.
+    """
+
+    def __init__(self, store: Optional[SessionStore] = None, max_events: int = MAX_EVENTS,
+                 ttl: float = TTL_SECONDS, retries: int = CAS_RETRIES):
+        self.store = store or SQLiteSessionStore()
+        self.max_events = max_events
+        self.ttl = ttl
+        self.retries = retries
+        self._stats = {"reads": 0, "writes": 0, "conflicts": 0, "expired": 0}
+        self._lock = threading.Lock()
+        self._next_expire = 0.0
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _load(self, key: Key) -> Optional[Tuple[Session, int]]:
+        self._count("reads")
+        row = self.store.get(key)
+        if row is None:
+            return None
+        session = Session.model_validate_json(row[0])
+        if self.ttl and session.last_update_time < time.time() - self.ttl:
+            return None
+        return session, row[1]
+
+    def _expire_due(self):
+        # expired rows are purged by whichever write comes along once per EXPIRE_EVERY
+        now = time.time()
+        if not self.ttl or now < self._next_expire:
+            return
+        with self._lock:
+            if now < self._next_expire:
+                return
+            self._next_expire = now + EXPIRE_EVERY
+        n = self.store.expire(now - self.ttl)
+        self._count("expired", n)
+
+    @staticmethod
+    def _backoff(attempt: int):
+        # ADK calls the session service synchronously, usually from the event loop: there a
+        # conflict is retried at once (the winner has already committed), elsewhere after a sleep
+        try:
+            asyncio.get_running_loop()
+            return
+        except RuntimeError:
+            time.sleep(min(0.05, 0.002 * 2 ** attempt) * (0.5 + random.random()))
+
+    def _modify(self, key: Key, change: Callable[[Session], None],
+                expected_version: Optional[int] = None) -> Tuple[Session, int]:
+        # optimistic read-modify-write, re-read and retried when another writer wins
+        for attempt in range(self.retries + 1):
+            loaded = self._load(key)
+            if loaded is None:
+                raise KeyError(f"session {key[2]!r} not found")
+            session, version = loaded
+            if expected_version is not None and version != expected_version:
+                self._count("conflicts")
+                raise SessionConflict(f"session {key[2]!r} is at version {version}, expected {expected_version}")
+            change(session)
+            if self.max_events and len(session.events) > self.max_events:
+                session.events = session.events[-self.max_events:]
+            if self.store.cas(key, session.model_dump_json(), version):
+                self._count("writes")
+                self._expire_due()
+                return session, version + 1
+            self._count("conflicts")
+            self._backoff(attempt)
+        raise SessionConflict(f"session {key[2]!r}: gave up after {self.retries + 1} attempts")
+
+    # --- BaseSessionService ---
+
+    def create_session(self, *, app_name: str, user_id: str,
+                       state: Optional[Dict[str, Any]] = None,
+                       session_id: Optional[str] = None) -> Session:
+        session_id = session_id or uuid.uuid4().hex
+        session = Session(id=session_id, app_name=app_name, user_id=user_id,
+                          state=state or {}, last_update_time=time.time())
+        key = (app_name, user_id, session_id)
+        if not self.store.create(key, session.model_dump_json()):
+            # another worker created it first; theirs wins
+            existing = self._load(key)
+            if existing is not None:
+                return existing[0]
+            self.store.delete(key)  # expired leftover
+            self.store.create(key, session.model_dump_json())
+        self._count("writes")
+        self._expire_due()
+        return session
+
+    def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                    config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        loaded = self._load((app_name, user_id, session_id))
+        if loaded is None:
+            return None
+        session = loaded[0]
+        if config:
+            if config.num_recent_events:
+                session.events = session.events[-config.num_recent_events:]
+            if config.after_timestamp:
+                session.events = [e for e in session.events if e.timestamp > config.after_timestamp]
+        return session
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        cutoff = time.time() - self.ttl if self.ttl else 0
+        return ListSessionsResponse(sessions=[
+            Session(id=sid, app_name=app_name, user_id=user_id, last_update_time=updated)
+            for sid, updated in self.store.list(app_name, user_id) if updated >= cutoff])
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self.store.delete((app_name, user_id, session_id))
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        session = self.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        return ListEventsResponse(events=session.events if session else [])
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        event = super().append_event(session=session, event=event)
+        if event.partial:
+            return event  # streaming fragments aren't persisted
+        key = (session.app_name, session.user_id, session.id)
+
+        def apply(stored: Session):
+            BaseSessionService.append_event(self, session=stored, event=event)
+            stored.last_update_time = event.timestamp
+
+        try:
+            stored, _ = self._modify(key, apply)
+        except KeyError:
+            return event
+        # hand the caller the merged state, including other workers' writes
+        session.state.update(stored.state)
+        session.last_update_time = stored.last_update_time
+        return event
+
+    # --- extras ---
+
+    def get_session_version(self, *, app_name: str, user_id: str, session_id: str) -> Optional[Tuple[Session, int]]:
+        """(session, version) for a later update_state(expected_version=...)."""
+        return self._load((app_name, user_id, session_id))
+
+    def update_state(self, *, app_name: str, user_id: str, session_id: str, delta: Dict[str, Any],
+                     expected_version: Optional[int] = None) -> int:
+        """
+        Merge `delta` into the session state. With expected_version the write
+        only succeeds if nobody wrote since that version (SessionConflict
+        otherwise); returns the new version.
+        """
+        def apply(stored: Session):
+            stored.state.update(delta)
+            stored.last_update_time = time.time()
+
+        return self._modify((app_name, user_id, session_id), apply, expected_version)[1]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "backend": type(self.store).__name__, "sessions": self.store.count()}
+
+
+def load_store(spec: str) -> SessionStore:
+    """'package.module:ClassName' -> instance, for plugging in a networked store."""
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
@@ -0,0 +1,262 @@
+import copy, os, sqlite3, threading, time, uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig, ListEventsResponse, ListSessionsResponse
+)
+
+MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+TTL_SECONDS = float(os.getenv("SESSION_TTL", "3600"))
+SPILL_PATH = os.getenv("SESSION_SPILL_PATH")  # unset -> evicted sessions are dropped
+EXPIRE_EVERY = float(os.getenv("SESSION_EXPIRE_EVERY", "60"))  # seconds between background sweeps
+# memory (one process) | sqlite (shared across workers) | package.module:StoreClass
+BACKEND = os.getenv("SESSION_BACKEND", "memory")
+
+Key = Tuple[str, str, str]  # (app_name, patient/user id, session id)
+
+
+class _SpillStore:
+    """SQLite tier that holds sessions evicted from memory until their TTL runs out."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spilled ("
+            " app_name TEXT, user_id TEXT, session_id TEXT, body TEXT, touched REAL,"
+            " PRIMARY KEY (app_name, user_id, session_id))")
+        self._lock = threading.Lock()
+
+    def put(self, key: Key, session: Session, touched: float):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO spilled VALUES (?, ?, ?, ?, ?)",
+                               (*key, session.model_dump_json(), touched))
+
+    def pop(self, key: Key) -> Optional[Tuple[Session, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, touched FROM spilled WHERE app_name=? AND user_id=? AND session_id=?",
+                key).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "DELETE FROM spilled WHERE app_name=? AND user_id=? AND session_id=?", key)
+        return Session.model_validate_json(row[0]), row[1]
+
+    def delete(self, key: Key):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM spilled WHERE app_name=? AND user_id=? AND session_id=?", key)
+
+    def session_ids(self, app_name: str, user_id: str):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id FROM spilled WHERE app_name=? AND user_id=?",
+                (app_name, user_id)).fetchall()
+        return [r[0] for r in rows]
+
+    def expire(self, cutoff: float) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM spilled WHERE touched < ?", (cutoff,)).rowcount
+
+
+class BoundedSessionService(BaseSessionService):
+    """
+    Session service keyed by (app, patient, session) with a memory cap.
+    Least-recently-used sessions are evicted once the byte or count cap is hit,
+    and any session untouched for `ttl` seconds expires. Evicted sessions are
+    spilled to SQLite when `spill_path` is set and restored on next access;
+    a daemon thread sweeps expired ones every `expire_every` seconds.
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES, max_sessions: int = MAX_SESSIONS,
+                 ttl: float = TTL_SECONDS, spill_path: Optional[str] = SPILL_PATH,
+                 expire_every: float = EXPIRE_EVERY):
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._spill = _SpillStore(spill_path) if spill_path else None
+        # key -> (session, approx bytes, last touched)
+        self._lru: "OrderedDict[Key, list]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evicted_lru": 0, "evicted_ttl": 0,
+                       "spilled": 0, "restored": 0}
+        self._stop = threading.Event()
+        if self._spill is not None and self.ttl and expire_every > 0:
+            threading.Thread(target=self._sweeper, args=(expire_every,), name="session-sweeper",
+                             daemon=True).start()
+
+    @staticmethod
+    def _sizeof(session: Session) -> int:
+        return len(session.model_dump_json())
+
+    # --- internal LRU bookkeeping (caller holds self._lock) ---
+
+    def _put(self, key: Key, session: Session, touched: Optional[float] = None):
+        old = self._lru.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        size = self._sizeof(session)
+        self._lru[key] = [session, size, touched or time.time()]
+        self._bytes += size
+        self._evict()
+
+    def _drop(self, key: Key, reason: str):
+        session, size, touched = self._lru.pop(key)
+        self._bytes -= size
+        self._stats[reason] += 1
+        if reason == "evicted_lru" and self._spill is not None:
+            self._spill.put(key, session, touched)
+            self._stats["spilled"] += 1
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        # oldest entries sit at the front; expire by TTL first, then by size/count
+        while self._lru:
+            key, (_, _, touched) = next(iter(self._lru.items()))
+            if touched < cutoff:
+                self._drop(key, "evicted_ttl")
+            elif len(self._lru) > 1 and (self._bytes > self.max_bytes or len(self._lru) > self.max_sessions):
+                self._drop(key, "evicted_lru")
+            else:
+                break
+
+    def _lookup(self, key: Key) -> Optional[Session]:
+        entry = self._lru.get(key)
+        if entry is not None:
+            if entry[2] < time.time() - self.ttl:
+                self._drop(key, "evicted_ttl")
+                entry = None
+            else:
+                entry[2] = time.time()
+                self._lru.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+        if self._spill is not None:
+            restored = self._spill.pop(key)
+            if restored is not None and restored[1] >= time.time() - self.ttl:
+                self._stats["restored"] += 1
+                self._put(key, restored[0])
+                return restored[0]
+        self._stats["misses"] += 1
+        return None
+
+    # --- BaseSessionService ---
+
+    def create_session(self, *, app_name: str, user_id: str,
+                       state: Optional[Dict[str, Any]] = None,
+                       session_id: Optional[str] = None) -> Session:
+        session_id = session_id or uuid.uuid4().hex
+        session = Session(id=session_id, app_name=app_name, user_id=user_id,
+                          state=state or {}, last_update_time=time.time())
+        with self._lock:
+            self._put((app_name, user_id, session_id), session)
+        return copy.deepcopy(session)
+
+    def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                    config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        with self._lock:
+            session = self._lookup((app_name, user_id, session_id))
+            if session is None:
+                return None
+            events = session.events
+            if config:
+                if config.num_recent_events:
+                    events = events[-config.num_recent_events:]
+                if config.after_timestamp:
+                    events = [e for e in events if e.timestamp > config.after_timestamp]
+            # copy only what the caller asked for
+            return copy.deepcopy(session.model_copy(update={"events": list(events)}))
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        with self._lock:
+            self._evict()
+            found = [s for (a, u, _), (s, _, _) in self._lru.items() if a == app_name and u == user_id]
+        sessions = [Session(id=s.id, app_name=s.app_name, user_id=s.user_id,
+                            last_update_time=s.last_update_time) for s in found]
+        if self._spill is not None:
+            for sid in self._spill.session_ids(app_name, user_id):
+                sessions.append(Session(id=sid, app_name=app_name, user_id=user_id))
+        return ListSessionsResponse(sessions=sessions)
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            entry = self._lru.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+        if self._spill is not None:
+            self._spill.delete(key)
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        session = self.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        return ListEventsResponse(events=session.events if session else [])
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        event = super().append_event(session=session, event=event)
+        key = (session.app_name, session.user_id, session.id)
+        with self._lock:
+            stored = self._lookup(key)
+            if stored is None:
+                return event
+            super().append_event(session=stored, event=event)
+            stored.last_update_time = event.timestamp
+            # grow the size estimate by the event instead of re-serializing the session
+            delta = len(event.model_dump_json())
+            self._lru[key][1] += delta
+            self._bytes += delta
+            self._evict()
+        return event
+
+    # --- expiry ---
+
+    def sweep(self) -> int:
+        """Expire idle sessions in memory and in the spill tier; returns how many went."""
+        with self._lock:
+            before = self._stats["evicted_ttl"]
+            self._evict()
+            if self._spill is not None and self.ttl:
+                self._stats["evicted_ttl"] += self._spill.expire(time.time() - self.ttl)
+            return self._stats["evicted_ttl"] - before
+
+    def _sweeper(self, every: float):
+        # spilled sessions are only read back on access, so nothing else would ever expire them
+        while not self._stop.wait(every):
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                pass  # locked or gone for a moment; next sweep
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Eviction/hit counters plus current footprint."""
+        with self._lock:
+            return {**self._stats, "sessions": len(self._lru), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "max_sessions": self.max_sessions}
+
+
+def make_session_service(backend: str = BACKEND) -> BaseSessionService:
+    """
+    Session service for SESSION_BACKEND. "memory" keeps sessions in this
+    process only; "sqlite" (SESSION_DB_PATH) or a custom SessionStore class
+    shares them, so the API can run with several workers or replicas.
+    """
+    if backend == "memory":
+        return BoundedSessionService()
+    from .session_store import SharedSessionService, SQLiteSessionStore, load_store
+    store = SQLiteSessionStore() if backend == "sqlite" else load_store(backend)
+    return SharedSessionService(store)
+
+
+def ensure_session(runner, user_id: str, session_id: str) -> None:
+    """Create the (patient, session) session on first use."""
+    svc = runner.session_service
+    cfg = GetSessionConfig(num_recent_events=1)
+    if svc.get_session(app_name=runner.app_name, user_id=user_id, session_id=session_id, config=cfg) is None:
+        svc.create_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
@@ -0,0 +1,41 @@
+import asyncio, hashlib, json
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+def canonical_key(name: str, *args, **kwargs) -> str:
+    """Stable hash of a call: tool/agent name plus its arguments (dict order ignored)."""
+    body = json.dumps([name, args, kwargs], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: while a call for `key` is running,
+    later callers await the same result instead of starting another one.
+    The shared call keeps running if the caller that started it is cancelled.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.stats = {"calls": 0, "shared": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+        k = (id(asyncio.get_running_loop()), key)
+        fut = self._inflight.get(k)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[k] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(k, None))
+        else:
+            self.stats["shared"] += 1
+        return await asyncio.shield(fut)
+
+
+# process-wide group used by the agent call sites
+flights = SingleFlight()
+
+
+async def single_flight(name: str, fn: Callable[[], Awaitable[Any]], *args, **kwargs) -> Any:
+    """`await single_flight("coach_for_visit", lambda: ..., condition=c, visit_type=v)`"""
+    return await flights.do(canonical_key(name, *args, **kwargs), fn)
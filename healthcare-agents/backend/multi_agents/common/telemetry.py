@@ -0,0 +1,362 @@
+import atexit, bisect, json, os, tempfile, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+# Latency histograms and counters, rendered in the Prometheus text format at
+# /metrics. Every process (the API and each MCP server subprocess) records
+# into its own registry and drops periodic snapshots into METRICS_DIR; a
+# scrape merges the live registry with the other processes' snapshots.
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "medagents-metrics")
+SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "10"))
+SNAPSHOT_MAX_AGE = float(os.getenv("METRICS_SNAPSHOT_MAX_AGE", "600"))  # drop snapshots of dead processes
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "0") == "1"
+
+# seconds; wide enough for a cold MCP spawn and a slow reporter run
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(k), self._copy(v)] for k, v in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    @staticmethod
+    def _copy(v):
+        return v
+
+    @staticmethod
+    def _merge(a, b):
+        return a + b
+
+    def _lines(self, key, v):
+        yield self.name, key, v
+
+
+class Gauge(Counter):
+    """A value that goes up and down (queue depth); processes' values are summed."""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @staticmethod
+    def _copy(v):
+        return [list(v[0]), v[1], v[2]]
+
+    @staticmethod
+    def _merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def _lines(self, key, v):
+        running = 0
+        for bound, n in zip(self.buckets + (float("inf"),), v[0]):
+            running += n
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            yield self.name + "_bucket", key + (("le", le),), running
+        yield self.name + "_sum", key, v[1]
+        yield self.name + "_count", key, v[2]
+
+
+REGISTRY: Dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name: str, help: str, labels: Sequence[str], **kw):
+    with _registry_lock:
+        m = REGISTRY.get(name)
+        if m is None:
+            m = REGISTRY[name] = cls(name, help, labels, **kw)
+        return m
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return _register(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = BUCKETS) -> Histogram:
+    return _register(Histogram, name, help, labels, buckets=buckets)
+
+
+# What /metrics exposes. `outcome` is "ok" or "error".
+STAGE_SECONDS = histogram("medagents_stage_seconds", "Pipeline stage latency (/api/agents/process).",
+                          ["stage", "outcome"])
+AGENT_SECONDS = histogram("medagents_agent_run_seconds", "ADK agent run latency (task_loop iterations, "
+                          "coach_parallel, reporter, ...).", ["agent"])
+MCP_SPAWN_SECONDS = histogram("medagents_mcp_spawn_seconds", "MCP server spawn + initialize handshake.",
+                              ["server", "outcome"])
+MCP_WAIT_SECONDS = histogram("medagents_mcp_wait_seconds", "Time waiting for a pooled MCP session "
+                             "(includes spawn when the pool is cold).", ["server"])
+MCP_CALL_SECONDS = histogram("medagents_mcp_call_seconds", "MCP tool time on a warm session.",
+                             ["server", "tool", "outcome"])
+MCP_RESTARTS = counter("medagents_mcp_restarts_total", "MCP sessions discarded after a crash or hang.", ["server"])
+LLM_SECONDS = histogram("medagents_llm_seconds", "Gemini call latency.", ["model", "caller", "outcome"])
+LLM_TOKENS = counter("medagents_llm_tokens_total", "Gemini tokens by direction.", ["model", "caller", "kind"])
+LLM_QUEUE_DEPTH = gauge("medagents_llm_queue_depth", "Gemini requests waiting in the scheduler.",
+                        ["family", "priority"])
+LLM_QUEUE_WAIT_SECONDS = histogram("medagents_llm_queue_wait_seconds", "Time a Gemini request waited "
+                                   "for a rate-limit token.", ["family", "priority"])
+LLM_RETRIES = counter("medagents_llm_retries_total", "Gemini calls retried after a retryable error.",
+                      ["family", "reason"])
+LLM_HEDGES = counter("medagents_llm_hedges_total", "Hedged Gemini requests, by which attempt won.",
+                     ["family", "winner"])
+MICROBATCH_SIZE = histogram("medagents_microbatch_size", "Items per micro-batched downstream call.",
+                            ["batcher"], buckets=(1, 2, 4, 8, 16, 32, 64))
+STORAGE_SECONDS = histogram("medagents_storage_seconds", "Firestore / GCS operation latency.",
+                            ["backend", "op", "outcome"])
+
+
+# ---- spans ------------------------------------------------------------------
+
+_tracer = None
+
+
+def _get_tracer():
+    # opentelemetry is only imported when spans are turned on; exporters are
+    # whatever TracerProvider the deployment installs (e.g. Cloud Trace).
+    global _tracer
+    if _tracer is None:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("medagents")
+    return _tracer
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[None]:
+    """OpenTelemetry span when OTEL_ENABLED=1, otherwise nothing."""
+    if not OTEL_ENABLED:
+        yield
+        return
+    try:
+        tracer = _get_tracer()
+    except ImportError:
+        yield
+        return
+    with tracer.start_as_current_span(name, attributes={k: str(v) for k, v in attrs.items()}):
+        yield
+
+
+@contextmanager
+def timed(hist: Histogram, span_name: Optional[str] = None, **labels) -> Iterator[None]:
+    """Observe the block's wall time into `hist`; also traced as a span if `span_name` is given."""
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        if span_name is None:
+            yield
+        else:
+            with span(span_name, **labels):
+                yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        if "outcome" in hist.labels:
+            labels["outcome"] = outcome
+        hist.observe(time.perf_counter() - t0, **labels)
+
+
+def record_tokens(model: str, caller: str, usage) -> None:
+    """Count prompt/completion tokens from a Gemini usage_metadata object (if any)."""
+    if usage is None:
+        return
+    for kind, attr in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+        n = getattr(usage, attr, None)
+        if n:
+            LLM_TOKENS.inc(n, model=model, caller=caller, kind=kind)
+
+
+# ---- ADK callbacks ------------------------------------------------------------
+
+_starts: Dict[Tuple[str, str, str], float] = {}
+_MAX_OPEN = 10000  # runs that never reach their after-callback must not pile up
+
+
+def _start(kind: str, ctx):
+    if len(_starts) > _MAX_OPEN:
+        _starts.clear()
+    _starts[(kind, ctx.invocation_id, ctx.agent_name)] = time.perf_counter()
+
+
+def _elapsed(kind: str, ctx) -> Optional[float]:
+    t0 = _starts.pop((kind, ctx.invocation_id, ctx.agent_name), None)
+    return None if t0 is None else time.perf_counter() - t0
+
+
+def _before_agent(callback_context):
+    _start("agent", callback_context)
+    return None
+
+
+def _after_agent(callback_context):
+    dt = _elapsed("agent", callback_context)
+    if dt is not None:
+        AGENT_SECONDS.observe(dt, agent=callback_context.agent_name)
+    return None
+
+
+def _model_callbacks(model: str):
+    def before_model(callback_context, llm_request):
+        _start("model", callback_context)
+        return None
+
+    def after_model(callback_context, llm_response):
+        dt = _elapsed("model", callback_context)
+        failed = getattr(llm_response, "error_code", None) is not None
+        if dt is not None:
+            LLM_SECONDS.observe(dt, model=model, caller=callback_context.agent_name,
+                                outcome="error" if failed else "ok")
+        record_tokens(model, callback_context.agent_name, getattr(llm_response, "usage_metadata", None))
+        return None
+
+    return before_model, after_model
+
+
+def agent_callbacks(model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Constructor kwargs that time an ADK agent run; pass `model` for an
+    LlmAgent to also time its Gemini calls, e.g.
+    `LlmAgent(name=..., model=M, **agent_callbacks(M))`.
+    """
+    kw = {"before_agent_callback": _before_agent, "after_agent_callback": _after_agent}
+    if model is not None:
+        kw["before_model_callback"], kw["after_model_callback"] = _model_callbacks(model)
+    return kw
+
+
+# ---- cross-process snapshots ------------------------------------------------------
+
+def _snapshot() -> dict:
+    return {m.name: m.snapshot() for m in list(REGISTRY.values())}
+
+
+def dump_snapshot() -> None:
+    """Write this process's registry to METRICS_DIR/<pid>.json (atomically)."""
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+_exporter: Optional[threading.Thread] = None
+
+
+def start_exporter(interval: float = SNAPSHOT_INTERVAL) -> None:
+    """Snapshot this process's metrics every `interval` seconds and at exit."""
+    global _exporter
+    if _exporter is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            dump_snapshot()
+
+    _exporter = threading.Thread(target=loop, name="metrics-exporter", daemon=True)
+    _exporter.start()
+    atexit.register(dump_snapshot)
+
+
+def _other_snapshots() -> Iterator[dict]:
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        return
+    now, own = time.time(), f"{os.getpid()}.json"
+    for fn in names:
+        if not fn.endswith(".json") or fn == own:
+            continue
+        path = os.path.join(METRICS_DIR, fn)
+        try:
+            if now - os.path.getmtime(path) > SNAPSHOT_MAX_AGE:
+                os.remove(path)
+                continue
+            with open(path) as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def _fmt_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    body = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def render(include_other_processes: bool = True) -> str:
+    """The merged registry in the Prometheus text exposition format."""
+    merged: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+    snaps = [_snapshot()] + (list(_other_snapshots()) if include_other_processes else [])
+    for snap in snaps:
+        for name, rows in snap.items():
+            m = REGISTRY.get(name)
+            if m is None:
+                continue
+            acc = merged.setdefault(name, {})
+            for key, v in rows:
+                key = tuple(key)
+                if key in acc:
+                    acc[key] = m._merge(acc[key], v)
+                elif m.kind != "histogram" or len(v[0]) == len(m.buckets) + 1:
+                    acc[key] = v
+    out = []
+    for name, m in REGISTRY.items():
+        out.append(f"# HELP {name} {m.help}")
+        out.append(f"# TYPE {name} {m.kind}")
+        for key, v in sorted(merged.get(name, {}).items()):
+            pairs = tuple(zip(m.labels, key))
+            for sample, lbls, value in m._lines(pairs, v):
+                out.append(f"{sample}{_fmt_labels(lbls)} {float(value)!r}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,102 @@
+import os, re
+from typing import Optional
+
+STREAM_OVERLAP = int(os.getenv("STREAM_OVERLAP_CHARS", "200"))
+STREAM_MIN_CHARS = int(os.getenv("STREAM_MIN_CHARS", "120"))
+
+_SENTENCE_END = re.compile(r"[.!?]\s*$")
+
+
+class RollingTranscript:
+    """
+    Rolling window over a live transcript. Only text that hasn't been
+    extracted yet (plus a short overlap for context) is handed out, so the
+    cost of each extraction is bounded by the chunk, not the whole visit.
+    """
+
+    def __init__(self, overlap: int = STREAM_OVERLAP, min_chars: int = STREAM_MIN_CHARS):
+        self.overlap = overlap
+        self.min_chars = min_chars
+        self.tail = ""      # already-extracted text kept as context
+        self.pending = ""   # new text not yet extracted
+        self.total_chars = 0
+
+    def push(self, chunk: str) -> Optional[str]:
+        """Add a chunk; returns a window to extract once enough new text has arrived."""
+        if not chunk:
+            return None
+        self.pending += chunk
+        self.total_chars += len(chunk)
+        if len(self.pending) < self.min_chars and not _SENTENCE_END.search(self.pending):
+            return None
+        return self.flush()
+
+    def flush(self) -> Optional[str]:
+        """Hand out whatever is pending regardless of size (end of stream)."""
+        if not self.pending.strip():
+            return None
+        window = " ".join(p for p in (self.tail, self.pending.strip()) if p)
+        self.tail = _tail_on_word(window, self.overlap)
+        self.pending = ""
+        return window
+
+
+def _tail_on_word(text: str, n: int) -> str:
+    # last ~n chars, starting on a word boundary
+    if n <= 0:
+        return ""
+    if len(text) <= n:
+        return text
+    cut = text[-n:]
+    space = cut.find(" ")
+    return cut[space + 1:] if 0 <= space < len(cut) - 1 else cut
+
+
+CHUNK_MAX_CHARS = int(os.getenv("EXTRACT_CHUNK_CHARS", "2000"))
+CHUNK_OVERLAP = int(os.getenv("EXTRACT_CHUNK_OVERLAP", "200"))
+
+_SPEAKER_TURN = re.compile(r"(?m)^(?=[ \t]*[A-Z][\w .'-]{0,30}:)")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def _segments(text: str, max_chars: int):
+    # speaker turns -> sentences -> (only if still too long) whitespace-bounded pieces
+    for turn in _SPEAKER_TURN.split(text):
+        for sent in _SENTENCE_SPLIT.split(turn.strip()):
+            sent = sent.strip()
+            while len(sent) > max_chars:
+                cut = sent.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                yield sent[:cut]
+                sent = sent[cut:].strip()
+            if sent:
+                yield sent
+
+
+def split_transcript(text: str, max_chars: int = CHUNK_MAX_CHARS,
+                     overlap: int = CHUNK_OVERLAP) -> list:
+    """
+    Split a long transcript into chunks of at most ~max_chars on speaker and
+    sentence boundaries. Each chunk starts with up to `overlap` chars of the
+    previous chunk's trailing sentences so tasks spanning a boundary survive.
+    """
+    text = (text or "").strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+    chunks, current, size = [], [], 0
+    for seg in _segments(text, max_chars):
+        if current and size + len(seg) + 1 > max_chars:
+            chunks.append(" ".join(current))
+            # carry trailing segments forward as overlap
+            carry, carried = [], 0
+            for prev in reversed(current):
+                if carried + len(prev) + 1 > overlap:
+                    break
+                carry.insert(0, prev)
+                carried += len(prev) + 1
+            current, size = carry, carried
+        current.append(seg)
+        size += len(seg) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
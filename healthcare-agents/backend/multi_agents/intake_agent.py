@@ -27,73 +27,118 @@
 # )
 
 
-import json, asyncio
-from typing import List, Tuple
-from google.adk.agents import LlmAgent, LoopAgent
+import asyncio, hashlib, os
+from typing import AsyncGenerator, List, Tuple
+from google.adk.agents import BaseAgent, LoopAgent
 from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
 from .mcp.client import MCPToolClient
-from .common.schemas import Task
+from .common.codec import dumps
+from .common.llm_scheduler import BATCH, INTERACTIVE, current_priority
+from .common.microbatch import MicroBatcher
+from .common.schemas import Task, dump_tasks, dump_tasks_json, parse_tasks
+from .common.singleflight import single_flight
+from .common.telemetry import agent_callbacks
+from .common.transcript import split_transcript
+from .tools.dedupe import TaskDedupeIndex, index_for, record_tasks
 
 
-GEMINI_TEXT = "gemini-2.0-flash"
 _mcp_intake = MCPToolClient(["python", "-m", "multi_agents.mcp.intake_mcp"])
 
-task_extractor = LlmAgent(
-    name="task_extractor",
-    model=GEMINI_TEXT,
-    instruction=(
-      "Extract concrete patient tasks from {transcript_snippet}. "
-      "Return strict JSON array with objects: "
-      "{title, due_date?, source, confidence}. No prose."
-    ),
-    output_key="task_delta"
-)
+# Snippets from concurrent sessions are extracted together: one model request
+# per window of INTAKE_BATCH_WAIT_MS or INTAKE_BATCH_SIZE snippets (1 = off)
+INTAKE_BATCH_SIZE = int(os.getenv("INTAKE_BATCH_SIZE", "16"))
+INTAKE_BATCH_WAIT_MS = float(os.getenv("INTAKE_BATCH_WAIT_MS", "20"))
 
-def _dedupe_and_filter(arr: List[dict], seen: set) -> Tuple[List[Task], set]:
-    kept = []
-    for d in arr:
-        try:
-            t = Task.parse_obj(d)
-            key = (t.title.lower(), t.due_date.isoformat() if t.due_date else "")
-            if key not in seen and t.confidence >= 0.7:
-                kept.append(t); seen.add(key)
-        except Exception:
-            continue
-    return kept, seen
+def _dedupe_and_filter(arr: List[dict], index: TaskDedupeIndex) -> List[Task]:
+    # one bulk validation pass; repeats of the patient's history are dropped and
+    # near-duplicates are kept but flagged needs_review (the index isn't changed here)
+    return index.classify(t for t in parse_tasks(arr) if t.confidence >= 0.7)
 
 async def _persist(patient_id: str, tasks: List[Task]):
-    payload = json.dumps([t.dict() for t in tasks])
-    return _mcp_intake.call("persist_tasks", patient_id=patient_id, tasks_json=payload)
-
-def stop_condition(ctx: InvocationContext) -> bool:
-    # stop if: 2 empties, or >=5 iters, or no new tasks
-    if ctx.state.get("iter", 0) >= 5: return True
-    if ctx.state.get("empty_count", 0) >= 2: return True
-    last = ctx.state.get("task_delta") or []
-    return len(last) == 0
-
-async def loop_step(ctx: InvocationContext):
-    # 1) ask MCP to extract (or use LLM directly). We’ll demo MCP path:
-    transcript = ctx.inputs.get("transcript_snippet", "")
-    extracted = _mcp_intake.call("extract_tasks_from_transcript", transcript=transcript)
-
-    # 2) dedupe + filter
-    seen = set(ctx.state.get("seen_hashes", []))
-    kept, seen = _dedupe_and_filter(extracted, seen)
-
+    # already validated: rows go over as-is and the server doesn't re-parse them into Tasks
+    payload = dump_tasks_json(tasks)
+    return await _mcp_intake.acall("persist_tasks", patient_id=patient_id, tasks_json=payload)
+
+async def _extract_batch(items: List[Tuple[str, str]]) -> List[List[dict]]:
+    # the batch queues at the most urgent priority among its callers
+    priority = INTERACTIVE if any(p == INTERACTIVE for _, p in items) else BATCH
+    if len(items) == 1:
+        return [await _mcp_intake.acall("extract_tasks_from_transcript", transcript=items[0][0],
+                                        priority=priority)]
+    return await _mcp_intake.acall("extract_tasks_batch", transcripts_json=dumps([t for t, _ in items]),
+                                   priority=priority)
+
+_extract_batcher = MicroBatcher("extract_tasks", _extract_batch, INTAKE_BATCH_SIZE, INTAKE_BATCH_WAIT_MS / 1000)
+
+async def _extract(transcript: str) -> List[dict]:
+    # identical snippets share a call; different ones share a batch
+    return await single_flight(
+        "extract_tasks_from_transcript",
+        lambda: _extract_batcher.submit((transcript, current_priority())),
+        transcript=transcript)
+
+async def extract_chunked(transcript: str) -> List[dict]:
+    """Map: extract each chunk of a long transcript concurrently; short ones go in one call."""
+    chunks = split_transcript(transcript)
+    if len(chunks) <= 1:
+        return await _extract(transcript)
+    results = await asyncio.gather(*(_extract(c) for c in chunks), return_exceptions=True)
+    merged = [d for r in results if isinstance(r, list) for d in r]
+    if not merged and all(isinstance(r, Exception) for r in results):
+        raise results[0]
+    # reduce: most confident copy of a task (seen in overlapping chunks) wins the dedupe
+    merged.sort(key=lambda d: -(d.get("confidence") or 0) if isinstance(d, dict) else 0)
+    return merged
+
+async def extract_new_tasks(transcript: str, patient_id: str) -> List[Task]:
+    """Extract tasks from a transcript window, keep unseen confident ones and persist them."""
+    extracted = await extract_chunked(transcript)
+    kept = _dedupe_and_filter(extracted, index_for(patient_id))
     if kept:
-        await _persist(ctx.inputs.get("patient_id", "demo-patient"), kept)
-        ctx.state["task_delta"] = [t.dict() for t in kept]
-        ctx.state["seen_hashes"] = list(seen)
-        ctx.state["empty_count"] = 0
-    else:
-        ctx.state["task_delta"] = []
-        ctx.state["empty_count"] = ctx.state.get("empty_count", 0) + 1
-    ctx.state["iter"] = ctx.state.get("iter", 0) + 1
-
-
+        await _persist(patient_id, kept)
+        # only stored tasks count as seen: after a failed persist they are new next time
+        record_tasks(patient_id, kept)
+    return kept
+
+def stop_condition(state: dict) -> bool:
+    # the loop re-reads transcript_snippet each iteration: stop once it has been
+    # extracted (the next snippet arrives with the next turn)
+    return state.get("extracted_snippet") == _digest(state.get("transcript_snippet") or "")
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+async def loop_step(state: dict, patient_id: str) -> dict:
+    """One task_loop iteration over the session state; returns the state delta."""
+    transcript = state.get("transcript_snippet") or ""
+    # chunked, micro-batched extraction through intake_mcp, deduped and persisted
+    kept = await extract_new_tasks(transcript, state.get("patient_id") or patient_id) if transcript else []
+    return {"task_delta": dump_tasks(kept), "extracted_snippet": _digest(transcript)}
+
+
+class TaskLoopStep(BaseAgent):
+    """
+    task_loop's body: runs loop_step() on the session state and emits its
+    delta as an event. Once stop_condition holds (the snippet was extracted,
+    also on a retried turn) it yields nothing and makes no call. It never
+    escalates: LoopAgent returning mid-generator leaves this agent's span
+    open, and ADK then logs "Failed to detach context".
+    """
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        if stop_condition(state):
+            return
+        delta = await loop_step(state, ctx.session.user_id)
+        yield Event(invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch,
+                    actions=EventActions(state_delta=delta))
+
+
+# the remaining iterations after the extracting one are state checks only
 task_loop = LoopAgent(
     name="task_loop",
-    sub_agents=[task_extractor],
+    sub_agents=[TaskLoopStep(name="task_loop_step", **agent_callbacks())],
     max_iterations=5,
+    **agent_callbacks(),
 )
@@ -1,28 +1,330 @@
-import json, asyncio
-import asyncio, json
+import asyncio, os, re, threading, time, weakref
+import anyio
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional
 from mcp.client.session import ClientSession
 from mcp.client.stdio import stdio_client, StdioServerParameters
+from ..common.codec import loads
+from ..common.limits import limit
+from ..common.telemetry import (MCP_CALL_SECONDS, MCP_RESTARTS, MCP_SPAWN_SECONDS, MCP_WAIT_SECONDS,
+                                span, timed)
+
+# Pool tuning (per tool server)
+POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+MAX_INFLIGHT = int(os.getenv("MCP_POOL_MAX_INFLIGHT", "8"))      # concurrent calls multiplexed per session
+IDLE_TIMEOUT = float(os.getenv("MCP_POOL_IDLE_TIMEOUT", "300"))  # seconds before an idle server is reaped
+HEALTH_INTERVAL = float(os.getenv("MCP_POOL_HEALTH_INTERVAL", "30"))
+CALL_TIMEOUT = float(os.getenv("MCP_CALL_TIMEOUT", "60"))
+
+
+def _server_name(params: StdioServerParameters) -> str:
+    # "python -m multi_agents.mcp.intake_mcp" -> "intake_mcp"
+    return (params.args[-1] if params.args else params.command).rsplit(".", 1)[-1]
+
+
+class _PooledSession:
+    """One warm MCP server subprocess plus its initialized ClientSession."""
+
+    def __init__(self, params: StdioServerParameters):
+        self.params = params
+        self.session: Optional[ClientSession] = None
+        self.inflight = 0
+        self.last_used = time.monotonic()
+        self.healthy = False
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._eof = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+
+    async def start(self):
+        # stdio_client/ClientSession must be entered and exited by the same task,
+        # so a dedicated owner task holds them open until close() is called.
+        with timed(MCP_SPAWN_SECONDS, server=_server_name(self.params)):
+            self._task = asyncio.create_task(self._run())
+            await self._ready.wait()
+            if self._error is not None:
+                raise self._error
+
+    async def _run(self):
+        try:
+            async with AsyncExitStack() as stack:
+                read, write = await stack.enter_async_context(stdio_client(self.params))
+                # forward server output through our own stream so a crash is noticed
+                fwd_send, fwd_recv = anyio.create_memory_object_stream(0)
+                pump = asyncio.create_task(self._pump(read, fwd_send))
+                stack.callback(pump.cancel)
+                session = await stack.enter_async_context(ClientSession(fwd_recv, write))
+                await session.initialize()
+                self.session, self.healthy = session, True
+                self._ready.set()
+                waiters = [asyncio.create_task(self._stop.wait()), asyncio.create_task(self._eof.wait())]
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                for t in waiters:
+                    t.cancel()
+        except BaseException as e:
+            self._error = e
+        finally:
+            self.healthy = False
+            self.session = None
+            self._ready.set()
+
+    async def _pump(self, read, send):
+        try:
+            async with send:
+                async for msg in read:
+                    await send.send(msg)
+        finally:
+            self.healthy = False
+            self._eof.set()
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: float):
+        call = asyncio.ensure_future(self.session.call_tool(tool_name, arguments))
+        eof = asyncio.ensure_future(self._eof.wait())
+        done, _ = await asyncio.wait({call, eof}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        eof.cancel()
+        if call in done:
+            return call.result()
+        call.cancel()
+        if eof in done:
+            raise ConnectionError(f"MCP server {self.params.args} exited")
+        raise asyncio.TimeoutError(f"MCP tool {tool_name} timed out after {timeout}s")
+
+    async def close(self):
+        self.healthy = False
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except Exception:
+                self._task.cancel()
+
+    @property
+    def alive(self) -> bool:
+        return self.healthy and self._task is not None and not self._task.done()
+
+
+class MCPSessionPool:
+    """
+    Long-lived pool of warm MCP server sessions for a single tool server.
+    Calls are multiplexed over the least-loaded session; crashed sessions are
+    restarted, idle ones are reaped after idle_timeout.
+    """
+
+    def __init__(self, params: StdioServerParameters, size: int = POOL_SIZE,
+                 max_inflight: int = MAX_INFLIGHT, idle_timeout: float = IDLE_TIMEOUT,
+                 health_interval: float = HEALTH_INTERVAL):
+        self.params = params
+        self.size = max(1, size)
+        self.max_inflight = max(1, max_inflight)
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._workers: List[_PooledSession] = []
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(self.size * self.max_inflight)
+        self._monitor: Optional[asyncio.Task] = None
+        self.restarts = 0
+        self.server = _server_name(params)
+
+    async def _spawn(self) -> _PooledSession:
+        w = _PooledSession(self.params)
+        await w.start()
+        self._workers.append(w)
+        return w
+
+    async def prewarm(self, n: int = 1):
+        """Start up to n sessions ahead of the first call."""
+        async with self._lock:
+            self._workers = [w for w in self._workers if w.alive]
+            while len(self._workers) < min(n, self.size):
+                await self._spawn()
+            if self._monitor is None or self._monitor.done():
+                self._monitor = asyncio.create_task(self._health_loop())
+
+    async def _acquire(self) -> _PooledSession:
+        async with self._lock:
+            if self._monitor is None or self._monitor.done():
+                self._monitor = asyncio.create_task(self._health_loop())
+            self._workers = [w for w in self._workers if w.alive]
+            idle = [w for w in self._workers if w.inflight == 0]
+            if not idle and len(self._workers) < self.size:
+                w = await self._spawn()
+            else:
+                w = min(self._workers, key=lambda x: x.inflight)
+            w.inflight += 1
+            return w
+
+    def _release(self, w: _PooledSession):
+        w.inflight -= 1
+        w.last_used = time.monotonic()
+
+    async def _discard(self, w: _PooledSession):
+        async with self._lock:
+            if w in self._workers:
+                self._workers.remove(w)
+                self.restarts += 1
+                MCP_RESTARTS.inc(server=self.server)
+        await w.close()
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: float = CALL_TIMEOUT):
+        t0 = time.perf_counter()
+        async with self._slots:
+            for attempt in range(2):
+                w = await self._acquire()
+                # wait = slot + session acquisition (a spawn when cold); call = tool time alone
+                MCP_WAIT_SECONDS.observe(time.perf_counter() - t0, server=self.server)
+                try:
+                    with timed(MCP_CALL_SECONDS, server=self.server, tool=tool_name):
+                        return await w.call_tool(tool_name, arguments, timeout)
+                except asyncio.TimeoutError:
+                    # hung server: replace it, but don't re-send a call that may hang again
+                    await self._discard(w)
+                    raise
+                except Exception:
+                    # tool-level errors from a live server are the caller's problem
+                    if w.alive:
+                        raise
+                    # crashed server: restart it and retry once
+                    await self._discard(w)
+                    if attempt == 1:
+                        raise
+                finally:
+                    self._release(w)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for w in list(self._workers):
+                if w.inflight:
+                    continue
+                if not w.alive or now - w.last_used > self.idle_timeout:
+                    await self._discard(w)
+                    continue
+                try:
+                    await asyncio.wait_for(w.session.send_ping(), timeout=5)
+                except Exception:
+                    await self._discard(w)
+            if not self._workers:
+                self._monitor = None
+                return
+
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        workers, self._workers = self._workers, []
+        await asyncio.gather(*(w.close() for w in workers), return_exceptions=True)
+
+
+# Pools live on one background event loop so warm sessions survive across calls
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _pool_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="mcp-pool", daemon=True).start()
+        return _loop
+
+
+class MCPToolError(RuntimeError):
+    """
+    The server ran the tool and it raised. `code` is the upstream status when
+    the error text starts with one ("429 Quota exceeded"), so
+    llm_scheduler.retryable() can tell quota/overload from bad input.
+    """
+
+    def __init__(self, text: str):
+        super().__init__(f"MCP tool error: {text}")
+        m = _STATUS.match(text)
+        self.code = int(m.group(1)) if m else None
+
+
+# FastMCP wraps tool exceptions as "Error executing tool <name>: <str(e)>"
+_STATUS = re.compile(r"(?:Error executing tool \S+: )?(\d{3}) ")
+
+
+def _decode(result) -> Any:
+    # CallToolResult -> python value; tools return JSON text
+    if isinstance(result, str):
+        return loads(result)
+    content = getattr(result, "content", None)
+    if content is None:
+        return result
+    text = "".join(getattr(c, "text", "") for c in content)
+    if getattr(result, "isError", False):
+        raise MCPToolError(text)
+    try:
+        return loads(text)
+    except ValueError:
+        return text
+
+
+_all_clients: "weakref.WeakSet[MCPToolClient]" = weakref.WeakSet()
 
 
 class MCPToolClient:
-    def __init__(self, cmd: list[str]):
+    def __init__(self, cmd: list[str], pool_size: int = POOL_SIZE):
         self.cmd = cmd
+        self.params = StdioServerParameters(command=cmd[0], args=cmd[1:], env=dict(os.environ))
+        self.pool_size = pool_size
+        self._pool: Optional[MCPSessionPool] = None
+        _all_clients.add(self)
+
+    def _get_pool(self) -> MCPSessionPool:
+        if self._pool is None:
+            self._pool = MCPSessionPool(self.params, size=self.pool_size)
+        return self._pool
 
-    async def _open(self):
-        # Create stdio client with subprocess command
-        client = await stdio_client(StdioServerParameters(command=self.cmd))
-        return client
+    async def acall(self, tool_name: str, **kwargs):
+        """Await a tool call from any event loop without blocking it."""
+        loop = _pool_loop()
+        # the span is opened on the caller's loop so it nests under the request's trace
+        with span(f"mcp.{tool_name}", server=_server_name(self.params)):
+            async with limit("mcp"):
+                if asyncio.get_running_loop() is loop:
+                    return await self._call(tool_name, **kwargs)
+                fut = asyncio.run_coroutine_threadsafe(self._call(tool_name, **kwargs), loop)
+                return await asyncio.wrap_future(fut)
 
     def call(self, tool_name: str, **kwargs):
-        return asyncio.run(self._call(tool_name, **kwargs))
+        """Blocking shim for sync code and worker threads; use acall() inside async code."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError(
+                f"MCPToolClient.call({tool_name!r}) would block the running event loop; "
+                "use 'await acall(...)' instead")
+        fut = asyncio.run_coroutine_threadsafe(self._call(tool_name, **kwargs), _pool_loop())
+        return fut.result()
 
     async def _call(self, tool_name: str, **kwargs):
-        client = await self._open()
-        try:
-            result = await client.call_tool(tool_name, **kwargs)
-            # convert JSON strings to dicts if needed
-            if isinstance(result, str):
-                return json.loads(result)
-            return result
-        finally:
-            await client.close()
+        result = await self._get_pool().call_tool(tool_name, kwargs)
+        return _decode(result)
+
+    async def awarm(self, n: int = 1):
+        """Spawn n warm server sessions now instead of on the first call."""
+        fut = asyncio.run_coroutine_threadsafe(self._get_pool().prewarm(n), _pool_loop())
+        await asyncio.wrap_future(fut)
+
+    def close(self):
+        if self._pool is not None:
+            asyncio.run_coroutine_threadsafe(self._pool.close(), _pool_loop()).result()
+            self._pool = None
+
+
+async def warm_all(n: int = 1) -> None:
+    """Pre-spawn sessions for every MCPToolClient created so far (app startup hook)."""
+    await asyncio.gather(*(c.awarm(n) for c in list(_all_clients)), return_exceptions=True)
+
+
+def close_all() -> None:
+    """Stop every pooled MCP server subprocess (shutdown hooks, scripts)."""
+    for c in list(_all_clients):
+        c.close()
@@ -1,6 +1,4 @@
 from mcp.server.fastmcp import FastMCP
-from ..common.schemas import CoachOutput
-from mcp.client import MCPToolClient
 
 
 # mcp = FastMCP("coach-agent")
@@ -21,27 +19,29 @@ from mcp.client import MCPToolClient
     
     
     
-import asyncio, json, os
-import vertexai
-from vertexai.generative_models import GenerativeModel
-from mcp.server import Server
-from mcp.server.stdio import stdio_server
+import asyncio
+from ..common.codec import dumps
+from ..tools.coach_cache import get_cached, put_cached, parse_coach_output, cache_stats
+from ..tools.clients import gemini_model, warm_up_in_background
+from ..common.llm_scheduler import INTERACTIVE, schedule
+from ..common.telemetry import LLM_SECONDS, record_tokens, start_exporter, timed
 
-# Init Vertex AI
-PROJECT_ID = os.getenv("GCP_PROJECT", "build-protect-health")
-LOCATION = os.getenv("GCP_REGION", "us-east1")
-vertexai.init(project=PROJECT_ID, location=LOCATION)
+# Gemini model (Vertex AI is initialized lazily on first use)
+GEMINI_TEXT = "gemini-2.0-flash"
 
-# Choose Gemini model
-model = GenerativeModel("gemini-2.0-flash")
-
-server = Server("coach-agent")
+server = FastMCP("coach-agent")
 
 @server.tool()
-async def coach_for_visit(condition: str, visit_type: str) -> str:
+async def coach_for_visit(condition: str, visit_type: str, priority: str = INTERACTIVE) -> str:
     """
     Generate pre-visit recommendations for patients.
+    Answers are cached on the normalized (condition, visit_type) pair.
+    `priority` ("interactive" or "batch") orders the call in the LLM scheduler.
     """
+    cached = get_cached(condition, visit_type)
+    if cached is not None:
+        return dumps(cached)
+
     prompt = f"""
     You are a pre-visit coach for a patient with {condition} coming for {visit_type}.
     Output **strict JSON** with fields:
@@ -49,9 +49,23 @@ async def coach_for_visit(condition: str, visit_type: str) -> str:
       - cautions: list of things to avoid
       - questions_for_doctor: list of suggested questions
     """
-    response = model.generate_content(prompt)
-    return response.text  # LLM should output JSON
+    model = gemini_model(GEMINI_TEXT)
+    with timed(LLM_SECONDS, "gemini.generate_content", model=GEMINI_TEXT, caller="coach_for_visit"):
+        response = await schedule(GEMINI_TEXT, lambda: model.generate_content_async(prompt), priority=priority)
+    record_tokens(GEMINI_TEXT, "coach_for_visit", getattr(response, "usage_metadata", None))
+    data = parse_coach_output(response.text)
+    if data is None:
+        raise ValueError("coach model did not return valid CoachOutput JSON")
+    put_cached(condition, visit_type, data)  # only answers that validate are cached
+    # validated here once; callers use the result as-is
+    return dumps(data)
+
+@server.tool()
+async def coach_cache_stats() -> str:
+    return dumps(cache_stats())
 
 if __name__ == "__main__":
-    asyncio.run(stdio_server(server))
+    warm_up_in_background("gemini")  # handshake first, build the client while idle
+    start_exporter()  # metrics reach the API's /metrics via snapshots
+    asyncio.run(server.run_stdio_async())
 
@@ -1,27 +1,75 @@
-import asyncio, json
+import asyncio
+from typing import List
 from mcp.server.fastmcp import FastMCP
-from mcp.client import MCPToolClient
-from ..common.schemas import Task
-from ..tools.firestore import save_tasks
+from ..common.codec import dumps, loads
+from ..common.llm_scheduler import INTERACTIVE, schedule
+from ..common.schemas import dump_tasks, parse_tasks
+from ..common.telemetry import LLM_SECONDS, record_tokens, start_exporter, timed
+from ..tools.clients import gemini_model, warm_up_in_background
+from ..tools.firestore import asave_task_rows
+
+GEMINI_TEXT = "gemini-2.0-flash"
 
 mcp = FastMCP("intake-agent")
 
+_PROMPT = """
+Extract concrete patient tasks (appointments, labs, meds, paperwork) from each
+numbered transcript snippet below. Output **strict JSON**: an array with one
+object per snippet, {{"id": <snippet number>, "tasks": [{{title, due_date?, source, confidence}}]}}.
+No prose.
+{snippets}
+"""
+
+
+async def _extract_many(transcripts: List[str], priority: str) -> List[list]:
+    # one Gemini request for the whole batch; each snippet's tasks validated on their own
+    snippets = "".join(f"\n[{i}]\n{t.strip()}\n" for i, t in enumerate(transcripts))
+    prompt = _PROMPT.format(snippets=snippets)
+    model = gemini_model(GEMINI_TEXT)
+    with timed(LLM_SECONDS, "gemini.generate_content", model=GEMINI_TEXT, caller="extract_tasks"):
+        response = await schedule(GEMINI_TEXT, lambda: model.generate_content_async(prompt), priority=priority)
+    record_tokens(GEMINI_TEXT, "extract_tasks", getattr(response, "usage_metadata", None))
+    text = response.text.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+    try:
+        items = loads(text)
+    except ValueError:
+        raise ValueError("extraction model did not return valid JSON") from None
+    by_id = {}
+    for item in items if isinstance(items, list) else []:
+        if not (isinstance(item, dict) and isinstance(item.get("tasks"), list)):
+            continue
+        try:
+            by_id[int(item.get("id"))] = item["tasks"]  # models write "1" as often as 1
+        except (TypeError, ValueError):
+            continue
+    # a snippet the model skipped has no tasks; invalid tasks are dropped, not fatal
+    return [dump_tasks(parse_tasks(by_id.get(i, []))) for i in range(len(transcripts))]
+
+
 @mcp.tool()
-def extract_tasks_from_transcript(transcript: str) -> str:
+async def extract_tasks_from_transcript(transcript: str, priority: str = INTERACTIVE) -> str:
+    """Tool contract: returns JSON array of Task."""
+    return dumps((await _extract_many([transcript], priority))[0])
+
+
+@mcp.tool()
+async def extract_tasks_batch(transcripts_json: str, priority: str = INTERACTIVE) -> str:
     """
-    Tool contract: returns JSON array of Task.
-    In real use, call Gemini here. For demo, stub a deterministic result.
+    Many snippets (JSON array of strings, e.g. from concurrent sessions) in
+    one model request; returns a JSON array with one Task array per snippet.
     """
-    # TODO: replace stub with Gemini call
-    tasks = [{"title": "Schedule fasting blood test", "due_date": None, "source":"doctor", "confidence":0.88}]
-    return json.dumps(tasks)
+    return dumps(await _extract_many(loads(transcripts_json), priority))
 
 @mcp.tool()
-def persist_tasks(patient_id: str, tasks_json: str) -> str:
-    arr = json.loads(tasks_json)
-    parsed = [Task.parse_obj(t) for t in arr]
-    res = save_tasks(patient_id, parsed)
-    return json.dumps(res)
+async def persist_tasks(patient_id: str, tasks_json: str) -> str:
+    """
+    tasks_json is dump_tasks_json() output of tasks the caller already validated.
+    Answers once the tasks are committed; a write that failed for good is an error.
+    """
+    res = await asave_task_rows(patient_id, loads(tasks_json))
+    return dumps(res)
 
 if __name__ == "__main__":
-    asyncio.run(mcp.run_stdio())
+    warm_up_in_background("firestore", "gemini")  # handshake first, build clients while idle
+    start_exporter()  # metrics reach the API's /metrics via snapshots
+    asyncio.run(mcp.run_stdio_async())
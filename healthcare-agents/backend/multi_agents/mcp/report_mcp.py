@@ -1,19 +1,31 @@
 import asyncio, json
 from mcp.server.fastmcp import FastMCP
-from ..tools.firestore import get_prior_metrics, save_report
-from ..tools.pdf_render import render_pdf_from_markdown
+from ..common.telemetry import start_exporter
+from ..tools.clients import warm_up_in_background
+from ..tools.firestore import asave_report, get_prior_metrics, get_prior_metrics_many
+from ..tools.pdf_render import publish_rendered
 
 mcp = FastMCP("report-agent")
 
+# Tools are async: the server runs on one event loop, so the blocking Firestore
+# and Storage calls go to threads and one slow call doesn't stall the others
+
+@mcp.tool()
+async def prior_metrics(patient_id: str) -> str:
+    return json.dumps(await asyncio.to_thread(get_prior_metrics, patient_id))
+
 @mcp.tool()
-def prior_metrics(patient_id: str) -> str:
-    return json.dumps(get_prior_metrics(patient_id))
+async def prior_metrics_many(patient_ids_json: str) -> str:
+    return json.dumps(await asyncio.to_thread(get_prior_metrics_many, json.loads(patient_ids_json)))
 
 @mcp.tool()
-def publish_report(patient_id: str, markdown_text: str) -> str:
-    url = render_pdf_from_markdown(markdown_text, f"reports/{patient_id}.html")
-    rid = save_report(patient_id, markdown_text, url)
-    return json.dumps({"report_id": rid, "url": url})
+async def publish_report(patient_id: str, markdown_text: str) -> str:
+    # content-addressed: a report already in the bucket is referenced, not re-uploaded
+    out = await asyncio.to_thread(publish_rendered, patient_id, markdown_text)
+    rid = await asave_report(patient_id, markdown_text, out["url"])
+    return json.dumps({"report_id": rid, "url": out["url"], "sha256": out["sha256"], "dedup": out["dedup"]})
 
 if __name__ == "__main__":
-    asyncio.run(mcp.run_stdio())
+    warm_up_in_background("firestore", "storage")  # handshake first, build clients while idle
+    start_exporter()  # metrics reach the API's /metrics via snapshots
+    asyncio.run(mcp.run_stdio_async())
@@ -1,12 +1,12 @@
 # agents/orchestrator.py
 from google.adk.agents import SequentialAgent, ParallelAgent
+from google.adk.runners import Runner
 from .intake_agent import task_loop
 from .coach_agent import coach
 from .report_agent import reporter
+from .common.telemetry import agent_callbacks
 # from google.adk.agents.remote_a2a_agent import RemoteA2aAgent  # Commented out until a2a module is available
-import vertexai
 import os
-from vertexai.generative_models import GenerativeModel
 
 # Optional: Skin triage as remote A2A (commented out until a2a dependency is resolved)
 # skin_agent = RemoteA2aAgent(
@@ -18,11 +18,34 @@ from vertexai.generative_models import GenerativeModel
 # Run coach in parallel (removed skin_agent for now)
 parallel = ParallelAgent(
     name="coach_parallel",
-    sub_agents=[coach]
+    sub_agents=[coach],
+    **agent_callbacks(),
 )
 
 # Full workflow: Task intake loop -> Parallel agents -> Reporter
 root_agent = SequentialAgent(
     name="orchestrator",
-    sub_agents=[task_loop, parallel, reporter]
+    sub_agents=[task_loop, parallel, reporter],
+    **agent_callbacks(),
 )
+
+
+APP_NAME = "medagents"
+
+
+class AgentRunners:
+    """
+    One Runner per pipeline stage over a shared session service: `intake`
+    runs task_loop, `coach` previsit_coach and `report` the reporter, so a
+    stage's turn never runs the rest of root_agent. The coach stage runs its
+    agent directly: ParallelAgent steps each sub-agent in a fresh task, which
+    for a single sub-agent only costs a task hop per event and breaks the
+    OTel span context ("Failed to detach context"). Drive them with
+    common/runs.run_agent().
+    """
+
+    def __init__(self, session_service):
+        self.app_name, self.session_service = APP_NAME, session_service
+        self.intake = Runner(app_name=APP_NAME, agent=task_loop, session_service=session_service)
+        self.coach = Runner(app_name=APP_NAME, agent=coach, session_service=session_service)
+        self.report = Runner(app_name=APP_NAME, agent=reporter, session_service=session_service)
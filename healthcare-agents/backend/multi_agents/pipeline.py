@@ -0,0 +1,164 @@
+# multi_agents/pipeline.py
+# Dependency graph behind /api/agents/process:
+#
+#   intake (task_loop) --\
+#                         +--> report (reporter)
+#   coach (previsit)  ---/
+#
+# intake and coach don't depend on each other, so they run concurrently and
+# the reporter starts as soon as both have resolved (or fallen back).
+import asyncio, json, os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from .common.dag import DAGResult, Stage, run_dag
+from .common.limits import limit
+from .common.runs import run_agent
+from .report_agent import (afetch_prior_metrics, cached_report, remember_report, run_reporter,
+                           stream_reporter)
+from .tools.metrics import metrics_summary
+
+INTAKE_TIMEOUT = float(os.getenv("STAGE_TIMEOUT_INTAKE", "45"))
+COACH_TIMEOUT = float(os.getenv("STAGE_TIMEOUT_COACH", "30"))
+REPORT_TIMEOUT = float(os.getenv("STAGE_TIMEOUT_REPORT", "60"))
+
+
+def process_stages(runners, user_id: str, session_id: str, data: dict,
+                   on_report_text: Optional[Callable[[str], Awaitable[None]]] = None) -> List[Stage]:
+    # Each stage runs only its own agent (runners is an orchestration.AgentRunners).
+    # intake and coach each get their own sub-session so concurrent runs never
+    # write the same state; the reporter receives their outputs as inputs.
+    # With on_report_text the reporter streams its markdown through it.
+    # Model calls are rate limited and capped inside the agents (common/llm_scheduler).
+    extra = {"patient_id": user_id}
+
+    async def intake(_deps) -> Dict[str, Any]:
+        if not data.get("transcript"):
+            return {}
+        result = await run_agent(runners.intake, user_id, f"{session_id}:intake",
+                                 {"transcript_snippet": data["transcript"], **extra})
+        return result.state
+
+    async def coach(_deps) -> Dict[str, Any]:
+        if not (data.get("condition") and data.get("visit_type")):
+            return {}
+        result = await run_agent(runners.coach, user_id, f"{session_id}:coach",
+                                 {"condition": data["condition"], "visit_type": data["visit_type"]})
+        if not result.state.get("coach_json"):
+            raise RuntimeError("coach returned no guidance")
+        return result.state
+
+    async def report(deps) -> Dict[str, Any]:
+        intake_state, coach_state = deps["intake"] or {}, deps["coach"] or {}
+        prior = data.get("prior_metrics")
+        if prior is None:
+            # served from report_mcp's read-through cache for hot patients
+            try:
+                async with limit("firestore"):
+                    prior = await afetch_prior_metrics(user_id)
+            except Exception:
+                prior = {}
+        inputs = {
+            "task_delta": intake_state.get("task_delta", []),
+            "coach_json": coach_state.get("coach_json"),
+            # the reporter's prompt gets the compact trend summary, not the raw payloads
+            "metrics_summary": metrics_summary(prior, data.get("current_metrics")),
+            # raw payloads are kept in the session state (for the fingerprint) but never
+            # sent to the model (report_agent.TURN_FIELDS)
+            "current_metrics": data.get("current_metrics"),
+            "prior_metrics": prior,
+            **extra
+        }
+        fingerprint, hit = cached_report(user_id, inputs)
+        if hit is not None:
+            # nothing the reporter sees has changed since the last report
+            if on_report_text is not None:
+                await on_report_text(hit["report_markdown"])
+            return {**hit, "report_cached": True}
+        if on_report_text is not None:
+            result = await stream_reporter(runners.report, user_id, session_id, inputs, on_report_text)
+        else:
+            # retried/duplicate requests with the same inputs share the in-flight run
+            result = await run_reporter(runners.report, user_id, session_id, inputs)
+        if not result.state.get("report_markdown"):
+            raise RuntimeError("reporter returned no report")
+        job_id = await remember_report(user_id, fingerprint, result.state["report_markdown"])
+        return {**result.state, "publish_job": job_id}
+
+    return [
+        Stage("intake", intake, timeout=INTAKE_TIMEOUT, fallback={}),
+        Stage("coach", coach, timeout=COACH_TIMEOUT, fallback={}),
+        Stage("report", report, deps=("intake", "coach"), timeout=REPORT_TIMEOUT, fallback={}),
+    ]
+
+
+def _as_json(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+# A stage that failed or produced nothing shows up empty; the reason is in "errors".
+# Nothing is made up: placeholder tasks or guidance would read as real clinical output.
+def _tasks(intake) -> list:
+    return _as_json((intake or {}).get("task_delta")) or []
+
+
+def _guidance(coach) -> dict:
+    return _as_json((coach or {}).get("coach_json")) or {}
+
+
+def _report(report) -> Optional[str]:
+    return (report or {}).get("report_markdown") or None
+
+
+def format_process_response(result: DAGResult) -> dict:
+    # Format response to match frontend expectations
+    return {
+        "tasks": _tasks(result.results.get("intake")),
+        "guidance": _guidance(result.results.get("coach")),
+        "report": _report(result.results.get("report")),
+        "report_url": (result.results.get("report") or {}).get("report_url"),
+        "publish_job": (result.results.get("report") or {}).get("publish_job"),
+        "partial": result.partial,
+        "errors": result.errors,
+        "timings": result.timings
+    }
+
+
+async def run_process(runners, user_id: str, session_id: str, data: dict) -> dict:
+    result = await run_dag(process_stages(runners, user_id, session_id, data))
+    return format_process_response(result)
+
+
+async def stream_process(runners, user_id: str, session_id: str,
+                         data: dict) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Same pipeline as run_process, yielding (event, payload) as results land:
+    "tasks" when intake resolves, "guidance" when coach does, "report_delta"
+    chunks while the reporter writes, then "report" and a closing "done"
+    (partial/errors/timings). Payload shapes match run_process's fields.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    shape = {"intake": ("tasks", _tasks), "coach": ("guidance", _guidance), "report": ("report", _report)}
+
+    def on_result(name, value, error):
+        event, fmt = shape[name]
+        queue.put_nowait((event, {event: fmt(value), **({"error": error} if error else {})}))
+
+    async def on_report_text(chunk: str):
+        queue.put_nowait(("report_delta", {"text": chunk}))
+
+    stages = process_stages(runners, user_id, session_id, data, on_report_text=on_report_text)
+    run = asyncio.ensure_future(run_dag(stages, on_result=on_result))
+    run.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (item := await queue.get()) is not None:
+            yield item
+        result = run.result()
+        yield "done", {"partial": result.partial, "errors": result.errors, "timings": result.timings}
+    finally:
+        # client went away mid-stream: stop the remaining stages
+        if not run.done():
+            run.cancel()
@@ -18,24 +18,158 @@
 
 
 
+import asyncio, hashlib, json, os
+from typing import Any, Dict, Optional, Tuple
 from google.adk.agents import LlmAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from .mcp.client import MCPToolClient
+from .common.jobs import enqueue, handler
+from .common.runs import run_agent, session_state
+from .common.singleflight import single_flight
+from .common.scheduled_gemini import scheduled_model
+from .common.telemetry import agent_callbacks
+from .tools.report_cache import FINGERPRINT_FIELDS, get_report, put_report, report_fingerprint
 
 GEMINI_TEXT = "gemini-1.5-pro"
 _mcp_report = MCPToolClient(["python", "-m", "multi_agents.mcp.report_mcp"])
 
 reporter = LlmAgent(
     name="reporter",
-    model=GEMINI_TEXT,
+    model=scheduled_model(GEMINI_TEXT),  # rate-limited, prioritized, retried
     instruction=(
-      "Compare current inputs to prior_metrics. Produce Markdown with sections: "
-      "Summary, Trends, What to discuss next. Avoid diagnosis."
+      "Metric trends were precomputed (latest, change since last visit, slope, "
+      "reference-range flags); use them as given and don't recompute:\n"
+      "{metrics_summary?}\n"
+      "Produce Markdown with sections: Summary, Trends, What to discuss next. "
+      "Avoid diagnosis."
     ),
-    output_key="report_markdown"
+    output_key="report_markdown",
+    **agent_callbacks(GEMINI_TEXT),
 )
 
-def fetch_prior_metrics(patient_id: str) -> dict:
-    return _mcp_report.call("prior_metrics", patient_id=patient_id)
+async def afetch_prior_metrics(patient_id: str) -> dict:
+    return await _mcp_report.acall("prior_metrics", patient_id=patient_id)
 
-def publish_report(patient_id: str, markdown_text: str) -> dict:
-    return _mcp_report.call("publish_report", patient_id=patient_id, markdown_text=markdown_text)
+async def afetch_prior_metrics_many(patient_ids: list) -> dict:
+    # one round-trip for batch report generation
+    return await _mcp_report.acall("prior_metrics_many", patient_ids_json=json.dumps(list(patient_ids)))
+
+async def apublish_report(patient_id: str, markdown_text: str) -> dict:
+    return await _mcp_report.acall("publish_report", patient_id=patient_id, markdown_text=markdown_text)
+
+
+# What the reporter reads from its user turn. The metrics reach it only as the
+# precomputed metrics_summary in its instruction; the raw current/prior metrics
+# (history included) stay in the session state, where the report fingerprint
+# reads them, and never go into the prompt.
+TURN_FIELDS = ("task_delta", "coach_json", "patient_id")
+
+
+def _split(inputs: dict) -> Tuple[dict, dict]:
+    """Reporter inputs -> (user turn, state-only values)."""
+    turn = {k: v for k, v in inputs.items() if k in TURN_FIELDS}
+    return turn, {k: v for k, v in inputs.items() if k not in TURN_FIELDS}
+
+
+async def run_reporter(runner, user_id: str, session_id: str, inputs: dict):
+    """
+    Run the reporter (runner: AgentRunners.report) once per burst of identical
+    (patient, inputs) requests, whichever sessions they come from; every caller
+    gets the state of the session that ran.
+    """
+    turn, state = _split(inputs)
+    return await single_flight(
+        "reporter",
+        lambda: run_agent(runner, user_id, session_id, turn, state=state),
+        user_id=user_id, inputs=inputs)
+
+
+def _event_text(event) -> str:
+    content = getattr(event, "content", None)
+    return "".join(getattr(p, "text", None) or "" for p in (getattr(content, "parts", None) or []))
+
+
+async def stream_reporter(runner, user_id: str, session_id: str, inputs: dict, on_text):
+    """
+    Run the reporter (runner: AgentRunners.report) with SSE streaming and
+    await on_text(chunk) for each partial chunk of report markdown it writes.
+    If the model answered in one piece the final text is delivered as a
+    single chunk. Returns the final state like run_reporter().
+    """
+    streamed = False
+
+    async def on_event(event):
+        nonlocal streamed
+        if event.author != reporter.name:
+            return
+        text = _event_text(event)
+        if event.partial and text:
+            streamed = True
+            await on_text(text)
+        elif text and not streamed:
+            await on_text(text)
+
+    turn, state = _split(inputs)
+    return await run_agent(runner, user_id, session_id, turn, state=state,
+                           run_config=RunConfig(streaming_mode=StreamingMode.SSE), on_event=on_event)
+
+
+# Report memoization (see tools/report_cache.py). The model and prompt are part
+# of the fingerprint, so changing either regenerates every report.
+REPORTER_VERSION = hashlib.sha256(f"{GEMINI_TEXT}\n{reporter.instruction}".encode()).hexdigest()[:12]
+# reports carry PHI: publishing (upload + public URL) only happens on request unless this is set
+AUTO_PUBLISH = os.getenv("REPORT_AUTO_PUBLISH", "0") == "1"
+
+
+def cached_report(user_id: str, inputs: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """(fingerprint, cached entry or None) for these reporter inputs."""
+    fingerprint = report_fingerprint(user_id, inputs, REPORTER_VERSION)
+    return fingerprint, get_report(fingerprint)
+
+
+async def remember_report(user_id: str, fingerprint: str, markdown: str) -> Optional[str]:
+    """
+    Cache a fresh report and, with REPORT_AUTO_PUBLISH=1, queue its
+    publishing; returns the publish job id (if any). The cache and queue
+    writes are blocking I/O, so they run off the event loop.
+    """
+    def remember() -> Optional[str]:
+        put_report(fingerprint, markdown)
+        if AUTO_PUBLISH:
+            return queue_publish(user_id, markdown, fingerprint)["job_id"]
+        return None
+    return await asyncio.to_thread(remember)
+
+
+def queue_publish(user_id: str, markdown: str, fingerprint: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Enqueue render + upload + metadata write (common/jobs.py) and return the
+    job's status right away. The same report text is only published once.
+    """
+    key = f"{user_id}\0{hashlib.sha256(markdown.encode()).hexdigest()}"
+    return enqueue("publish_report", {"patient_id": user_id, "markdown": markdown,
+                                      "fingerprint": fingerprint}, key=key)
+
+
+@handler("publish_report")
+async def _publish_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    res = await apublish_report(payload["patient_id"], payload["markdown"])
+    if payload.get("fingerprint"):
+        # later cache hits for this report carry its URL
+        put_report(payload["fingerprint"], payload["markdown"], res.get("url"), res.get("report_id"))
+    return res
+
+
+async def report_for_session(runner, user_id: str, session_id: str) -> Dict[str, Any]:
+    """GET /api/report: reuse the stored report unless the session's inputs changed."""
+    state = session_state(runner, user_id, session_id)
+    inputs = {k: state.get(k) for k in FINGERPRINT_FIELDS}
+    fingerprint, hit = cached_report(user_id, inputs)
+    if hit is not None:
+        return {"report_markdown": hit["report_markdown"], "report_url": hit.get("report_url"), "cached": True}
+    # several clinicians opening the same report share one reporter run
+    present = {k: v for k, v in inputs.items() if v is not None}
+    result = await run_reporter(runner, user_id, session_id, present)
+    markdown = result.state.get("report_markdown")
+    job_id = await remember_report(user_id, fingerprint, markdown) if markdown else None
+    return {"report_markdown": markdown, "report_url": None, "cached": False, "publish_job": job_id}
@@ -0,0 +1,99 @@
+import os, threading, time
+from typing import Any, Callable, Dict
+
+# Lazy, per-process cloud clients. Nothing heavy is imported or constructed
+# until first use, so app startup and MCP server spawns stay cheap; call
+# warm_up() when the cost should be paid up front instead.
+PROJECT_ID = os.getenv("GCP_PROJECT")
+VERTEX_PROJECT = os.getenv("GCP_PROJECT", "build-protect-health")
+VERTEX_LOCATION = os.getenv("GCP_REGION", "us-east1")
+# Offline mode: hand out the in-memory/filesystem stand-ins from fakes.py
+FAKE_BACKENDS = os.getenv("FAKE_BACKENDS", "0") == "1"
+# Filesystem bucket (STORAGE_DIR/<bucket>/<object>) in place of GCS, without faking anything else
+STORAGE_DIR = os.getenv("STORAGE_DIR")
+
+_clients: Dict[str, Any] = {}
+_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def _lazy(name: str, factory: Callable[[], Any]) -> Any:
+    global _pid
+    client = _clients.get(name)
+    if client is not None and _pid == os.getpid():
+        return client
+    with _lock:
+        if _pid != os.getpid():
+            # forked child: gRPC channels don't survive fork, rebuild everything
+            _clients.clear()
+            _pid = os.getpid()
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = factory()
+        return client
+
+
+def firestore_client():
+    def make():
+        if FAKE_BACKENDS:
+            from .fakes import FakeFirestore
+            return FakeFirestore()
+        from google.cloud import firestore
+        return firestore.Client(project=PROJECT_ID)
+    return _lazy("firestore", make)
+
+
+def storage_client():
+    def make():
+        if FAKE_BACKENDS or STORAGE_DIR:
+            from .fakes import FAKE_BUCKET_DIR, FakeStorageClient
+            return FakeStorageClient(STORAGE_DIR or FAKE_BUCKET_DIR)
+        from google.cloud import storage
+        return storage.Client()
+    return _lazy("storage", make)
+
+
+def _vertex():
+    def make():
+        import vertexai
+        vertexai.init(project=VERTEX_PROJECT, location=VERTEX_LOCATION)
+        return vertexai
+    return _lazy("vertexai", make)
+
+
+def gemini_model(model_name: str = "gemini-2.0-flash"):
+    def make():
+        if FAKE_BACKENDS:
+            from .fakes import FakeGenerativeModel
+            return FakeGenerativeModel(model_name)
+        _vertex()
+        from vertexai.generative_models import GenerativeModel
+        return GenerativeModel(model_name)
+    return _lazy(f"gemini:{model_name}", make)
+
+
+WARMERS: Dict[str, Callable[[], Any]] = {
+    "firestore": firestore_client,
+    "storage": storage_client,
+    "gemini": gemini_model,
+}
+
+
+def warm_up(*names: str) -> Dict[str, float]:
+    """Build the named clients now (all by default); returns seconds spent per client."""
+    timings = {}
+    for name in names or WARMERS:
+        t0 = time.perf_counter()
+        try:
+            WARMERS[name]()
+        except Exception:
+            # missing credentials etc. shouldn't block startup; first real use will raise
+            pass
+        timings[name] = time.perf_counter() - t0
+    return timings
+
+
+def warm_up_in_background(*names: str) -> threading.Thread:
+    t = threading.Thread(target=warm_up, args=names, name="client-warmup", daemon=True)
+    t.start()
+    return t
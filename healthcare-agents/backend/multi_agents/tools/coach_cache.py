@@ -0,0 +1,97 @@
+import os, re
+from typing import Optional
+from ..common.cache import TTLCache
+from ..common.schemas import CoachOutput, parse_coach_json
+
+# Most coach traffic is a few hundred (condition, visit_type) pairs, so answers
+# are cached on a normalized key instead of asking Gemini every time.
+CACHE_SIZE = int(os.getenv("COACH_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("COACH_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_PATH = os.getenv("COACH_CACHE_PATH")  # e.g. ./coach_cache.db to survive restarts
+
+CONDITION_SYNONYMS = {
+    "t2d": "type 2 diabetes",
+    "t2dm": "type 2 diabetes",
+    "dm2": "type 2 diabetes",
+    "type ii diabetes": "type 2 diabetes",
+    "diabetes type 2": "type 2 diabetes",
+    "diabetes mellitus type 2": "type 2 diabetes",
+    "type 2 diabetes mellitus": "type 2 diabetes",
+    "t1d": "type 1 diabetes",
+    "type i diabetes": "type 1 diabetes",
+    "diabetes type 1": "type 1 diabetes",
+    "htn": "hypertension",
+    "high blood pressure": "hypertension",
+    "high cholesterol": "hyperlipidemia",
+    "copd": "chronic obstructive pulmonary disease",
+    "ckd": "chronic kidney disease",
+    "chf": "heart failure",
+    "congestive heart failure": "heart failure",
+}
+
+VISIT_TYPE_SYNONYMS = {
+    "follow up": "follow-up",
+    "followup": "follow-up",
+    "follow up visit": "follow-up",
+    "follow-up visit": "follow-up",
+    "check up": "checkup",
+    "check-up": "checkup",
+    "annual physical": "annual exam",
+    "physical": "annual exam",
+    "annual checkup": "annual exam",
+    "new patient": "initial visit",
+    "first visit": "initial visit",
+    "lab": "lab work",
+    "labs": "lab work",
+    "blood work": "lab work",
+    "bloodwork": "lab work",
+    "telehealth": "virtual visit",
+    "video visit": "virtual visit",
+}
+
+_coach_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL, path=CACHE_PATH, name="coach")
+
+
+def _normalize(text: str, synonyms: dict) -> str:
+    t = re.sub(r"[^\w\s/+-]", " ", (text or "").lower())
+    t = re.sub(r"\s+", " ", t).strip()
+    return synonyms.get(t, t)
+
+
+def cache_key(condition: str, visit_type: str) -> str:
+    return (_normalize(condition, CONDITION_SYNONYMS) + "|" +
+            _normalize(visit_type, VISIT_TYPE_SYNONYMS))
+
+
+def parse_coach_output(text: str) -> Optional[dict]:
+    # LLM output -> validated CoachOutput dict, or None if it isn't usable
+    t = (text or "").strip()
+    if t.startswith("```"):
+        t = t.strip("`")
+        t = t[4:] if t.lower().startswith("json") else t
+    try:
+        return parse_coach_json(t)
+    except Exception:
+        return None
+
+
+def get_cached(condition: str, visit_type: str) -> Optional[dict]:
+    key = cache_key(condition, visit_type)
+    data = _coach_cache.get(key)
+    if data is None:
+        return None
+    try:
+        CoachOutput.parse_obj(data)
+    except Exception:
+        # schema drifted or entry got corrupted; treat as a miss
+        _coach_cache.invalidate(key)
+        return None
+    return data
+
+
+def put_cached(condition: str, visit_type: str, data: dict):
+    _coach_cache.set(cache_key(condition, visit_type), data)
+
+
+def cache_stats() -> dict:
+    return _coach_cache.stats()
@@ -0,0 +1,254 @@
+import hashlib, os, re, sqlite3, threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, List, Tuple, Union
+import numpy as np
+from ..common.schemas import Task
+
+# Per-patient task dedupe. An exact hash of (title, due_date) drops repeats;
+# MinHash signatures over character shingles catch rewordings such as
+# "Schedule blood work" / "Schedule bloodwork labs". Near-duplicates are only
+# flagged (Task.needs_review), never dropped, and are only compared within the
+# same clinical key: the numbers with their units ("500mg", "3month") and the
+# direction verbs (increase/decrease, start/stop) of the title. "Increase
+# insulin dose" vs "Decrease insulin dose" or "metformin 500mg" vs "1000mg"
+# are different tasks however similar the rest of the text is.
+NUM_PERM = int(os.getenv("DEDUPE_NUM_PERM", "64"))
+NEAR_DUP_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.7"))
+INDEX_PATH = os.getenv("DEDUPE_INDEX_PATH")  # SQLite file; unset -> in-memory only (see index_for)
+MAX_INDEXES = int(os.getenv("DEDUPE_MAX_INDEXES", "2048"))
+
+_STOPWORDS = {"a", "an", "the", "your", "my", "please", "to", "for", "of", "and", "get", "go"}
+_SHINGLE = 3
+_rng = np.random.default_rng(0x5EED)
+# odd multipliers for multiply-shift hashing; fixed seed keeps signatures stable across processes
+_A = (_rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+
+_UNITS = {"mg": "mg", "mcg": "mcg", "ug": "mcg", "g": "g", "kg": "kg", "ml": "ml", "l": "l",
+          "unit": "unit", "units": "unit", "u": "unit", "iu": "unit", "mmhg": "mmhg", "mg/dl": "mg/dl",
+          "mmol/l": "mmol/l", "%": "%", "lb": "lb", "lbs": "lb", "pound": "lb", "pounds": "lb",
+          "min": "min", "minute": "min", "minutes": "min", "hour": "hour", "hours": "hour", "hr": "hour",
+          "hrs": "hour", "day": "day", "days": "day", "week": "week", "weeks": "week", "wk": "week",
+          "wks": "week", "month": "month", "months": "month", "mo": "month", "year": "year", "years": "year",
+          "x": "x", "times": "x", "tablet": "tablet", "tablets": "tablet", "puff": "puff", "puffs": "puff"}
+_DIRECTION_VERBS = {
+    "increase": ("increase", "raise", "double", "titrate"),
+    "decrease": ("decrease", "reduce", "lower", "halve", "taper", "cut"),
+    "start": ("start", "begin", "initiate", "add", "resume"),
+    "stop": ("stop", "discontinue", "hold", "held", "quit", "pause", "cease"),
+    "switch": ("switch", "change", "replace"),
+}
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|mg/dl|mmol/l|[a-z]+|%")
+
+
+def _inflections(verb: str) -> set:
+    base = verb[:-1] if verb.endswith("e") else verb
+    # stop -> stopped/stopping, but start -> started
+    double = verb + verb[-1] if re.fullmatch(r"[a-z]*[^aeiou][aeiou][^aeiouwxy]", verb) else base
+    return {verb, verb + "s", base + "ed", base + "ing", double + "ed", double + "ing"}
+
+
+_DIRECTIONS = {form: canon for canon, verbs in _DIRECTION_VERBS.items()
+               for verb in verbs for form in _inflections(verb)}
+
+
+def _task_key(t: Union[Task, dict]) -> str:
+    if isinstance(t, dict):  # dump_tasks() row; due_date is already ISO
+        return t["title"].lower() + "|" + (t.get("due_date") or "")
+    return t.title.lower() + "|" + (t.due_date.isoformat() if t.due_date else "")
+
+
+def task_hash(t: Union[Task, dict]) -> str:
+    """Stable id for a task (or its dump_tasks() row); also used as its Firestore document id."""
+    return hashlib.sha256(_task_key(t).encode()).hexdigest()
+
+
+def clinical_key(title: str) -> str:
+    """
+    The parts of a title that change what the task means: quantities with
+    their units and direction verbs, e.g. "Increase metformin to 1000 mg in
+    2 weeks" -> "increase|1000mg 2week". Near-duplicates must share it.
+    """
+    tokens = _TOKEN.findall(title.lower().replace("follow-up", "follow up"))
+    directions, quantities = set(), []
+    for i, tok in enumerate(tokens):
+        if tok[0].isdigit():
+            num = tok.rstrip("0").rstrip(".") if "." in tok else tok
+            unit = _UNITS.get(tokens[i + 1], "") if i + 1 < len(tokens) else ""
+            quantities.append(num + unit)
+        elif tok in _DIRECTIONS:
+            directions.add(_DIRECTIONS[tok])
+    return "|".join(sorted(directions)) + "|" + " ".join(sorted(quantities))
+
+
+def _normalize_title(title: str) -> str:
+    words = re.findall(r"[a-z0-9]+", title.lower())
+    return "".join(w for w in words if w not in _STOPWORDS)
+
+
+def _shingles(title: str) -> np.ndarray:
+    text = _normalize_title(title)
+    if len(text) < _SHINGLE:
+        text = text.ljust(_SHINGLE, "_")
+    grams = {text[i:i + _SHINGLE] for i in range(len(text) - _SHINGLE + 1)}
+    return np.fromiter((int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "little")
+                        for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(title: str) -> np.ndarray:
+    x = _shingles(title)
+    # (num_perm, n_shingles) universal hashes; uint64 arithmetic wraps by design
+    h = (_A[:, None] * x[None, :] + _B[:, None]) >> np.uint64(32)
+    return h.min(axis=1).astype(np.uint32)
+
+
+def _due_ordinal(t: Task) -> int:
+    return t.due_date.toordinal() if isinstance(t.due_date, date) else -1
+
+
+# (exact key, clinical key, minhash signature, due ordinal): one row of the index
+Entry = Tuple[str, str, np.ndarray, int]
+
+
+def entry(t: Task) -> Entry:
+    return task_hash(t), clinical_key(t.title), minhash(t.title), _due_ordinal(t)
+
+
+class TaskDedupeIndex:
+    """
+    Compact dedupe index for one patient's task history. classify() only
+    reads; tasks enter the index through add() once they have been stored.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, threshold: float = NEAR_DUP_THRESHOLD):
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self._exact: set = set()
+        self._groups: Dict[str, int] = {}  # clinical key -> group id
+        self._sigs = np.empty((0, num_perm), dtype=np.uint32)
+        self._dues = np.empty(0, dtype=np.int32)
+        self._gids = np.empty(0, dtype=np.int32)
+        self._n = 0
+        self._lock = threading.Lock()
+        self.rowid = 0  # last store row merged in (see index_for)
+
+    def __len__(self):
+        return self._n
+
+    def _is_near_dup(self, ckey: str, sig: np.ndarray, due: int) -> bool:
+        gid = self._groups.get(ckey)
+        if gid is None or self._n == 0:
+            return False
+        sigs, dues, gids = self._sigs[:self._n], self._dues[:self._n], self._gids[:self._n]
+        # same clinical key, and same due date or either side undated
+        comparable = (gids == gid) & ((dues == due) | (dues < 0) | (due < 0))
+        if not comparable.any():
+            return False
+        sim = (sigs[comparable] == sig).mean(axis=1)
+        return bool(sim.max() >= self.threshold)
+
+    def _append(self, e: Entry):
+        key, ckey, sig, due = e
+        if key in self._exact:
+            return
+        if self._n == len(self._sigs):
+            cap = max(16, 2 * len(self._sigs))
+            sigs = np.empty((cap, self.num_perm), dtype=np.uint32)
+            dues, gids = np.empty(cap, dtype=np.int32), np.empty(cap, dtype=np.int32)
+            sigs[:self._n], dues[:self._n], gids[:self._n] = (
+                self._sigs[:self._n], self._dues[:self._n], self._gids[:self._n])
+            self._sigs, self._dues, self._gids = sigs, dues, gids
+        self._exact.add(key)
+        self._sigs[self._n], self._dues[self._n] = sig, due
+        self._gids[self._n] = self._groups.setdefault(ckey, len(self._groups))
+        self._n += 1
+
+    def classify(self, tasks: Iterable[Task]) -> List[Task]:
+        """
+        Drop exact repeats (of history or earlier in `tasks`) and return the
+        rest, with needs_review=True on near-duplicates. Doesn't change the index.
+        """
+        out, seen, pending = [], set(), TaskDedupeIndex(self.num_perm, self.threshold)
+        with self._lock:
+            for t in tasks:
+                e = entry(t)
+                key, ckey, sig, due = e
+                if key in self._exact or key in seen:
+                    continue
+                seen.add(key)
+                if self._is_near_dup(ckey, sig, due) or pending._is_near_dup(ckey, sig, due):
+                    t = t.model_copy(update={"needs_review": True})
+                pending._append(e)
+                out.append(t)
+        return out
+
+    def add(self, entries: Iterable[Entry]):
+        with self._lock:
+            for e in entries:
+                self._append(e)
+
+
+class _IndexStore:
+    """One row per (patient, task): concurrent writers only ever add rows."""
+
+    def __init__(self, path: str, num_perm: int = NUM_PERM):
+        self.num_perm = num_perm
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS dedupe_tasks (patient_id TEXT NOT NULL, key TEXT NOT NULL, "
+                         "ckey TEXT NOT NULL, sig BLOB NOT NULL, due INTEGER NOT NULL, "
+                         "PRIMARY KEY (patient_id, key))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS dedupe_tasks_patient ON dedupe_tasks (patient_id)")
+        self._lock = threading.Lock()
+
+    def load(self, patient_id: str, after: int = 0) -> Tuple[List[Entry], int]:
+        """Rows added for the patient since rowid `after` (by any process), and the new high mark."""
+        with self._lock:
+            rows = self._db.execute("SELECT rowid, key, ckey, sig, due FROM dedupe_tasks "
+                                    "WHERE patient_id=? AND rowid>? ORDER BY rowid",
+                                    (patient_id, after)).fetchall()
+        entries = [(key, ckey, np.frombuffer(sig, dtype=np.uint32).copy(), due)
+                   for _, key, ckey, sig, due in rows if len(sig) == 4 * self.num_perm]
+        return entries, (rows[-1][0] if rows else after)
+
+    def add(self, patient_id: str, entries: List[Entry]):
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO dedupe_tasks VALUES (?, ?, ?, ?, ?)",
+                                 [(patient_id, key, ckey, sig.astype(np.uint32).tobytes(), due)
+                                  for key, ckey, sig, due in entries])
+
+
+_store = _IndexStore(INDEX_PATH) if INDEX_PATH else None
+_indexes: "OrderedDict[str, TaskDedupeIndex]" = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def index_for(patient_id: str) -> TaskDedupeIndex:
+    """
+    The patient's dedupe index, kept in a bounded LRU. With DEDUPE_INDEX_PATH
+    every call first merges rows other workers added since the last call.
+    Without it the index only holds what this process recorded: after a
+    restart, or once the patient is evicted from the LRU, tasks persisted
+    earlier are not known and come back as new.
+    """
+    with _registry_lock:
+        idx = _indexes.get(patient_id)
+        if idx is None:
+            idx = _indexes[patient_id] = TaskDedupeIndex()
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)  # reloaded from the store, if there is one
+        else:
+            _indexes.move_to_end(patient_id)
+    if _store is not None:
+        entries, idx.rowid = _store.load(patient_id, idx.rowid)
+        idx.add(entries)
+    return idx
+
+
+def record_tasks(patient_id: str, tasks: List[Task]):
+    """Add stored tasks to the patient's index (and the shared store); call after they were persisted."""
+    entries = [entry(t) for t in tasks]
+    if _store is not None:
+        _store.add(patient_id, entries)
+    index_for(patient_id).add(entries)
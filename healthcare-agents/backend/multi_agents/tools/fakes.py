@@ -0,0 +1,381 @@
+import hashlib, json, math, os, random, re, threading, time, uuid
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+# Deterministic local stand-ins for Gemini, Firestore and GCS. clients.py hands
+# these out instead of the real clients when FAKE_BACKENDS=1, so the API and
+# every MCP server subprocess run offline (benchmarks, local development).
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+FAKE_LLM_LATENCY_MS = os.getenv("FAKE_LLM_LATENCY_MS", "400,2000")      # p50,p99
+FAKE_STORAGE_LATENCY_MS = os.getenv("FAKE_STORAGE_LATENCY_MS", "0,0")  # p50,p99
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))     # share of calls answered with a 429
+FAKE_BUCKET_DIR = os.getenv("FAKE_BUCKET_DIR", "./.fake_bucket")
+
+
+class LatencyModel:
+    """
+    Log-normal latency with the given median and 99th percentile, drawn from a
+    seeded RNG so a run is reproducible. "0,0" means no delay.
+    """
+
+    def __init__(self, p50_ms: float, p99_ms: float, seed: int = FAKE_SEED):
+        self.p50 = max(0.0, p50_ms) / 1000.0
+        # z(0.99) = 2.326; a p99 below the median collapses to a constant
+        self.sigma = math.log(p99_ms / p50_ms) / 2.326 if p50_ms > 0 and p99_ms > p50_ms else 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = FAKE_SEED) -> "LatencyModel":
+        p50, _, p99 = spec.partition(",")
+        return cls(float(p50 or 0), float(p99 or p50 or 0), seed)
+
+    def sample(self) -> float:
+        if self.p50 <= 0:
+            return 0.0
+        with self._lock:
+            z = self._rng.gauss(0.0, 1.0)
+        return self.p50 * math.exp(self.sigma * z)
+
+    def sleep(self):
+        time.sleep(self.sample())
+
+
+# ---- Gemini -----------------------------------------------------------------
+
+_COACH_PROMPT = re.compile(r"patient with (.+?) coming for (.+?)\.", re.S)
+_SNIPPET = re.compile(r"^\[(\d+)\]\n(.*?)(?=^\[\d+\]\n|\Z)", re.S | re.M)
+_TASK_LINE = re.compile(r"^Doctor:.*\b(schedule|book|bring|check|continue|take)\b", re.I)
+
+
+class FakeQuotaError(Exception):
+    """Shaped like google.api_core's ResourceExhausted: retryable by common/llm_scheduler."""
+    code = 429
+
+
+class FakeGenerativeModel:
+    """
+    generate_content()/generate_content_async() with canned, prompt-derived
+    answers; `error_rate` of the calls fail with FakeQuotaError after the delay.
+    """
+
+    def __init__(self, model_name: str, latency: Optional[LatencyModel] = None,
+                 error_rate: float = FAKE_LLM_ERROR_RATE, seed: int = FAKE_SEED):
+        self.model_name = model_name
+        self.latency = latency or LatencyModel.parse(FAKE_LLM_LATENCY_MS)
+        self.error_rate = error_rate
+        self._rng = random.Random(f"{seed}:{model_name}")
+        self.calls = self.errors = 0
+
+    def _answer(self, prompt: str) -> str:
+        m = _COACH_PROMPT.search(prompt)
+        if m:
+            condition, visit_type = (s.strip() for s in m.groups())
+            return json.dumps({
+                "checklist": [f"Bring your {condition} medication list", "Bring ID and insurance card"],
+                "cautions": [f"Follow any fasting instructions for the {visit_type}"],
+                "questions_for_doctor": [f"Is my {condition} plan still right for me?"],
+            })
+        if "numbered transcript snippet" in prompt:
+            # task extraction: doctor instructions become tasks, one entry per snippet
+            return json.dumps([
+                {"id": int(i), "tasks": [
+                    {"title": line.split(":", 1)[1].strip().rstrip("."), "due_date": None,
+                     "source": "doctor", "confidence": 0.9}
+                    for line in body.splitlines() if _TASK_LINE.match(line.strip())]}
+                for i, body in _SNIPPET.findall(prompt)])
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return f"## Summary\nSynthetic response {digest}.\n"
+
+    def _response(self, prompt) -> SimpleNamespace:
+        prompt = prompt if isinstance(prompt, str) else json.dumps(prompt, default=str)
+        self.calls += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise FakeQuotaError(f"429 quota exceeded for {self.model_name}")
+        text = self._answer(prompt)
+        usage = SimpleNamespace(prompt_token_count=max(1, len(prompt) // 4),
+                                candidates_token_count=max(1, len(text) // 4))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content(self, prompt, **_kw):
+        self.latency.sleep()
+        return self._response(prompt)
+
+    async def generate_content_async(self, prompt, **_kw):
+        import asyncio
+        await asyncio.sleep(self.latency.sample())
+        return self._response(prompt)
+
+
+class FakeLlm:
+    """
+    Stand-in for the transport under an ADK model (google.adk.models.BaseLlm
+    generate_content_async): the agent's system instruction and turns become
+    one prompt for FakeGenerativeModel, with the same latency, error rate and
+    answers as the MCP servers' fake calls. ScheduledGemini uses it when
+    FAKE_BACKENDS=1, so agents, runners and the scheduler all run for real.
+    """
+
+    def __init__(self, model: str):
+        from .clients import gemini_model
+        self.model, self._fake = model, gemini_model(model)
+
+    @staticmethod
+    def prompt(llm_request) -> str:
+        config = getattr(llm_request, "config", None)
+        parts = [str(getattr(config, "system_instruction", None) or "")]
+        for content in llm_request.contents or []:
+            parts.extend(p.text for p in (content.parts or []) if getattr(p, "text", None))
+        return "\n".join(p for p in parts if p)
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        from google.adk.models import LlmResponse
+        from google.genai import types
+        text = (await self._fake.generate_content_async(self.prompt(llm_request))).text
+
+        def response(chunk: str, partial: bool = False):
+            return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=chunk)]),
+                               partial=partial or None)
+
+        if stream:
+            # a few partial chunks, then the aggregated text, like the SSE path does
+            step = max(1, -(-len(text) // 4))
+            for i in range(0, len(text), step):
+                yield response(text[i:i + step], partial=True)
+        yield response(text)
+
+
+# ---- Firestore --------------------------------------------------------------
+
+class FakeAlreadyExists(Exception):
+    """Shaped like google.api_core's AlreadyExists (create() on an existing document)."""
+    code = 409
+
+
+class FakeFailedPrecondition(Exception):
+    """Shaped like google.api_core's FailedPrecondition (a write option didn't hold)."""
+    code = 400
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, ref: "FakeDocumentReference", data: Optional[Dict[str, Any]],
+                 update_time: Optional[int] = None):
+        self.reference, self._data = ref, data
+        self.id = ref.id
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return None if self._data is None else json.loads(json.dumps(self._data, default=str))
+
+
+class FakeDocumentReference:
+    def __init__(self, db: "FakeFirestore", path: str):
+        self._db, self.path = db, path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+    def get(self) -> FakeDocumentSnapshot:
+        self._db.latency.sleep()
+        with self._db._lock:
+            return FakeDocumentSnapshot(self, self._db._read(self.path), self._db.versions.get(self.path))
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        self._db.latency.sleep()
+        return self._db._write(self.path, data, merge)
+
+    def create(self, data: Dict[str, Any]):
+        self._db.latency.sleep()
+        with self._db._lock:
+            if self.path in self._db.docs:
+                raise FakeAlreadyExists(f"{self.path} already exists")
+            return self._db._write(self.path, data, merge=False)
+
+    def update(self, data: Dict[str, Any], option: Optional[Dict[str, Any]] = None):
+        self._db.latency.sleep()
+        with self._db._lock:
+            if self.path not in self._db.docs:
+                raise KeyError(self.path)  # NotFound
+            if option and option.get("last_update_time") != self._db.versions.get(self.path):
+                raise FakeFailedPrecondition(f"{self.path} changed since it was read")
+            return self._db._write(self.path, data, merge=True)
+
+
+class FakeCollectionReference:
+    def __init__(self, db: "FakeFirestore", path: str):
+        self._db, self.path = db, path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> Optional[FakeDocumentReference]:
+        head = self.path.rsplit("/", 1)[0] if "/" in self.path else None
+        return FakeDocumentReference(self._db, head) if head else None
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._db, f"{self.path}/{doc_id or uuid.uuid4().hex[:20]}")
+
+
+class FakeWriteBatch:
+    def __init__(self, db: "FakeFirestore"):
+        self._db, self._ops = db, []
+
+    def set(self, ref: FakeDocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._ops.append((ref.path, data, merge))
+
+    def commit(self):
+        self._db.latency.sleep()
+        with self._db._lock:
+            for path, data, merge in self._ops:
+                self._db._write(path, data, merge)
+        self._ops = []
+
+
+class FakeFirestore:
+    """In-memory subset of google.cloud.firestore.Client used by tools/firestore.py and common/jobs.py."""
+
+    def __init__(self, latency: Optional[LatencyModel] = None):
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.versions: Dict[str, int] = {}  # stands in for update_time
+        self.latency = latency or LatencyModel.parse(FAKE_STORAGE_LATENCY_MS)
+        self._lock = threading.RLock()
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            data = self.docs.get(path)
+            return None if data is None else dict(data)
+
+    def _write(self, path: str, data: Dict[str, Any], merge: bool) -> SimpleNamespace:
+        # returns a WriteResult look-alike
+        with self._lock:
+            base = self.docs.get(path, {}) if merge else {}
+            self.docs[path] = {**base, **data}
+            self.versions[path] = self.versions.get(path, 0) + 1
+            return SimpleNamespace(update_time=self.versions[path])
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def document(self, path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def write_option(self, last_update_time=None) -> Dict[str, Any]:
+        return {"last_update_time": last_update_time}
+
+    def get_all(self, refs: Iterable[FakeDocumentReference]) -> List[FakeDocumentSnapshot]:
+        self.latency.sleep()
+        return [FakeDocumentSnapshot(r, self._read(r.path)) for r in refs]
+
+
+# ---- GCS ----------------------------------------------------------------------
+
+class FakePreconditionFailed(Exception):
+    """Shaped like google.api_core's PreconditionFailed (if_generation_match lost)."""
+    code = 412
+
+
+class FakeBlob:
+    """
+    A file under the bucket root; content_type, content_encoding, cache_control
+    and metadata are kept next to it in <object>.meta.json.
+    """
+
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket, self.name = bucket, name
+        self.content_type: Optional[str] = None
+        self.content_encoding: Optional[str] = None
+        self.cache_control: Optional[str] = None
+        self.metadata: Optional[Dict[str, str]] = None
+
+    @property
+    def _path(self) -> str:
+        return os.path.join(self.bucket.root, self.name)
+
+    @property
+    def public_url(self) -> str:
+        return "file://" + os.path.abspath(self._path)
+
+    def upload_from_file(self, fileobj, content_type: Optional[str] = None, **kw):
+        self.upload_from_string(fileobj.read(), content_type=content_type, **kw)
+
+    def upload_from_string(self, data, content_type: Optional[str] = None,
+                           if_generation_match: Optional[int] = None, **_kw):
+        self.bucket.latency.sleep()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.content_type = content_type or self.content_type
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        tmp = f"{self._path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        if if_generation_match == 0:
+            # create-only: link() fails atomically if the object exists
+            try:
+                os.link(tmp, self._path)
+            except FileExistsError:
+                raise FakePreconditionFailed(f"{self.name} already exists") from None
+            finally:
+                os.remove(tmp)
+        else:
+            os.replace(tmp, self._path)
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {"content_type": self.content_type, "content_encoding": self.content_encoding,
+                "cache_control": self.cache_control, "metadata": self.metadata}
+        with open(self._path + ".meta.json", "w") as f:
+            json.dump(meta, f)
+
+    def reload(self, **_kw):
+        try:
+            with open(self._path + ".meta.json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        for k, v in meta.items():
+            setattr(self, k, v)
+
+    def download_as_bytes(self, raw_download: bool = False, **_kw) -> bytes:
+        with open(self._path, "rb") as f:
+            data = f.read()
+        # like GCS, gzip-encoded objects are decompressed unless the raw bytes are asked for
+        self.reload()
+        if self.content_encoding == "gzip" and not raw_download:
+            import gzip
+            data = gzip.decompress(data)
+        return data
+
+    def exists(self, **_kw) -> bool:
+        return os.path.exists(self._path)
+
+    def make_public(self):
+        pass
+
+
+class FakeBucket:
+    def __init__(self, root: str, latency: LatencyModel):
+        self.root, self.latency = root, latency
+        self.name = os.path.basename(root)
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    """Filesystem-backed stand-in for google.cloud.storage.Client (FAKE_BUCKET_DIR/<bucket>/<object>)."""
+
+    def __init__(self, root: str = FAKE_BUCKET_DIR, latency: Optional[LatencyModel] = None):
+        self.root = root
+        self.latency = latency or LatencyModel.parse(FAKE_STORAGE_LATENCY_MS)
+
+    def bucket(self, name: Optional[str]) -> FakeBucket:
+        return FakeBucket(os.path.join(self.root, name or "default"), self.latency)
@@ -1,39 +1,98 @@
-import os, hashlib
-from typing import List, Dict, Any
-from google.cloud import firestore
-from ..common.schemas import Task
+import asyncio, os
+from concurrent.futures import Future
+from typing import List, Dict, Any, Tuple
+from ..common.schemas import Task, dump_tasks
+from .clients import firestore_client
+from .dedupe import task_hash
+from .write_behind import FirestoreBackend, WriteOp, get_writer
+from ..common.cache import TTLCache
+from ..common.telemetry import STORAGE_SECONDS, timed
 
-PROJECT_ID = os.getenv("GCP_PROJECT")
-_db = firestore.Client(project=PROJECT_ID)
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "300"))
+METRICS_CACHE_SIZE = int(os.getenv("METRICS_CACHE_SIZE", "4096"))
+_db = firestore_client  # built lazily on first use (see clients.py)
 
-def _task_hash(t: Task) -> str:
-    key = (t.title.lower() + "|" + (t.due_date.isoformat() if t.due_date else ""))
-    return hashlib.sha256(key.encode()).hexdigest()
+_task_hash = task_hash  # document ids share the dedupe index's hashing (tools/dedupe.py)
+
+def _writer():
+    # writes are queued and committed in coalesced batches (see write_behind.py)
+    return get_writer(lambda: FirestoreBackend(_db()))
 
 def save_tasks(patient_id: str, tasks: List[Task]) -> Dict[str, Any]:
-    if not tasks: return {"saved": 0, "ids": []}
-    batch = _db.batch()
-    ids = []
-    for t in tasks:
-        if t.confidence < 0.7:  # gate low-confidence
+    return save_task_rows(patient_id, dump_tasks(tasks))
+
+def _submit_task_rows(patient_id: str, rows: List[Dict[str, Any]]) -> Tuple[List[str], List[Future]]:
+    # rows are dump_tasks() output (validated upstream), already in document shape
+    writer = _writer()
+    ids, futs = [], []
+    for row in rows:
+        if row["confidence"] < 0.7:  # gate low-confidence
             continue
-        hid = _task_hash(t)
-        doc_ref = _db.collection("patients").document(patient_id)\
-                     .collection("tasks").document(hid)
-        batch.set(doc_ref, {
-            "title": t.title, "due_date": t.due_date.isoformat() if t.due_date else None,
-            "source": t.source, "confidence": t.confidence
-        }, merge=True)
+        hid = _task_hash(row)
+        futs.append(writer.submit(WriteOp(f"patients/{patient_id}/tasks/{hid}", {
+            "title": row["title"], "due_date": row.get("due_date"),
+            "source": row["source"], "confidence": row["confidence"],
+            "needs_review": row.get("needs_review", False)
+        }, merge=True)))
         ids.append(hid)
-    batch.commit()
+    return ids, futs
+
+def save_task_rows(patient_id: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Queue the rows and return once they are committed; raises if the commit failed for good."""
+    ids, futs = _submit_task_rows(patient_id, rows or [])
+    for fut in futs:
+        fut.result()
+    return {"saved": len(ids), "ids": ids}
+
+async def asave_task_rows(patient_id: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """save_task_rows without blocking the loop, so concurrent callers share a batch commit."""
+    ids, futs = _submit_task_rows(patient_id, rows or [])
+    await asyncio.gather(*(asyncio.wrap_future(f) for f in futs))
     return {"saved": len(ids), "ids": ids}
 
+# Read-through cache for patients/{id}/profile/metrics. TTL only: the metrics are
+# written outside this service and each report_mcp process has its own copy, so an
+# update shows up within METRICS_CACHE_TTL seconds (0 turns the cache off)
+_metrics_cache = TTLCache(maxsize=METRICS_CACHE_SIZE, ttl=METRICS_CACHE_TTL, name="metrics")
+
+def _metrics_ref(patient_id: str):
+    return _db().collection("patients").document(patient_id).collection("profile").document("metrics")
+
 def get_prior_metrics(patient_id: str) -> Dict[str, Any]:
-    doc = _db.collection("patients").document(patient_id).collection("profile").document("metrics").get()
-    return doc.to_dict() if doc.exists else {}
+    cached = _metrics_cache.get(patient_id)
+    if cached is not None:
+        return cached
+    with timed(STORAGE_SECONDS, backend="firestore", op="get_metrics"):
+        doc = _metrics_ref(patient_id).get()
+    metrics = doc.to_dict() if doc.exists else {}
+    _metrics_cache.set(patient_id, metrics)
+    return metrics
+
+def get_prior_metrics_many(patient_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Metrics for many patients: cache hits plus a single get_all round-trip for the rest."""
+    out, missing = {}, []
+    for pid in dict.fromkeys(patient_ids):
+        cached = _metrics_cache.get(pid)
+        if cached is not None:
+            out[pid] = cached
+        else:
+            missing.append(pid)
+    if missing:
+        found = {}
+        with timed(STORAGE_SECONDS, backend="firestore", op="get_all_metrics"):
+            for doc in _db().get_all([_metrics_ref(pid) for pid in missing]):
+                # profile/metrics -> parent patient id
+                found[doc.reference.parent.parent.id] = doc.to_dict() if doc.exists else {}
+        for pid in missing:
+            out[pid] = found.get(pid, {})
+            _metrics_cache.set(pid, out[pid])
+    return out
 
-def save_report(patient_id: str, md: str, url: str) -> str:
-    doc_ref = _db.collection("patients").document(patient_id)\
+async def asave_report(patient_id: str, md: str, url: str) -> str:
+    # document() with no id generates one client-side, so no round-trip is needed here
+    doc_ref = _db().collection("patients").document(patient_id)\
                  .collection("reports").document()
-    doc_ref.set({"markdown": md, "pdf_url": url})
-    return doc_ref.id
+    # waits for the commit (without blocking the loop): the publish job only succeeds once the report is stored
+    await asyncio.wrap_future(_writer().submit(WriteOp(f"patients/{patient_id}/reports/{doc_ref.id}",
+                                                       {"markdown": md, "pdf_url": url})))
+    return doc_ref.id
\ No newline at end of file
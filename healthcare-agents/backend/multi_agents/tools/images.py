@@ -0,0 +1,155 @@
+import asyncio, hashlib, multiprocessing, os, tempfile, threading, uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+from ..common.limits import limit
+
+# Skin-photo intake. Uploads are spooled to disk in fixed-size chunks while
+# being hashed, decoded/EXIF-stripped/downscaled in a process pool, and stored
+# once per content hash; session state only ever holds the small ref dict.
+IMAGE_DIR = os.getenv("IMAGE_DIR") or os.path.join(tempfile.gettempdir(), "medagents-images")
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))   # longest edge after downscale
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "50000000"))  # decompression-bomb guard
+IMAGE_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHUNK_SIZE = 256 * 1024
+
+
+class ImageRejected(ValueError):
+    """Upload isn't a decodable image."""
+
+
+class ImageTooLarge(ImageRejected):
+    pass
+
+
+class ImageUnavailable(RuntimeError):
+    """The image workers keep dying; the upload itself may be fine (retry later)."""
+
+
+def _processed_path(digest: str) -> str:
+    return os.path.join(IMAGE_DIR, digest[:2], f"{digest}.jpg")
+
+
+def _normalize(src: str, dst: str, max_side: int, quality: int, max_pixels: int) -> Dict[str, Any]:
+    # runs in a worker process: decode -> apply orientation -> drop metadata -> downscale
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with Image.open(src) as img:
+            # JPEG can decode straight to a reduced size, bounding worker memory
+            img.draft("RGB", (max_side, max_side))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB")
+            img.thumbnail((max_side, max_side))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+            # a fresh RGB image carries no EXIF/GPS, so nothing identifying is written
+            img.save(tmp, "JPEG", quality=quality, optimize=True)
+            os.replace(tmp, dst)
+            return {"width": img.width, "height": img.height}
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise ImageRejected(f"not a usable image ({type(e).__name__})") from None
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the API process runs threads (MCP pool loop, writers) that fork would copy mid-state
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset(broken: ProcessPoolExecutor):
+    # a pool with a dead worker (OOM kill, decoder crash) refuses all further work: replace it
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def _normalize_in_pool(src: str, dst: str) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):  # one retry on a fresh pool
+        pool = _executor()
+        try:
+            return await loop.run_in_executor(
+                pool, _normalize, src, dst, IMAGE_MAX_SIDE, IMAGE_QUALITY, IMAGE_MAX_PIXELS)
+        except BrokenProcessPool as e:
+            _reset(pool)
+            error = e
+    raise ImageUnavailable("image workers unavailable") from error
+
+
+async def spool_upload(upload, max_bytes: int = IMAGE_MAX_BYTES):
+    """Copy an UploadFile to a temp file chunk by chunk; returns (path, sha256, size)."""
+    incoming = os.path.join(IMAGE_DIR, "incoming")
+    os.makedirs(incoming, exist_ok=True)
+    path = os.path.join(incoming, uuid.uuid4().hex)
+    h, size = hashlib.sha256(), 0
+    try:
+        with open(path, "wb") as f:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageTooLarge(f"image exceeds {max_bytes} bytes")
+                h.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        _remove(path)
+        raise
+    if size == 0:
+        _remove(path)
+        raise ImageRejected("empty upload")
+    return path, h.hexdigest(), size
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def ingest_image(upload) -> Dict[str, Any]:
+    """
+    Spool, normalize and store an uploaded image; returns a compact reference
+    ({"sha256", "path", "width", "height", "bytes", "content_type", "dedup"}).
+    Identical photos (same bytes) are processed once.
+    """
+    src, digest, size = await spool_upload(upload)
+    dst = _processed_path(digest)
+    try:
+        dims, dedup = None, os.path.exists(dst)
+        if not dedup:
+            async with limit("images"):
+                dims = await _normalize_in_pool(src, dst)
+    finally:
+        _remove(src)
+    if dims is None:
+        dims = await asyncio.to_thread(_dimensions, dst)
+    return {"sha256": digest, "path": dst, "content_type": "image/jpeg",
+            "bytes": os.path.getsize(dst), "upload_bytes": size, "dedup": dedup, **dims}
+
+
+def _dimensions(path: str) -> Dict[str, int]:
+    from PIL import Image
+    with Image.open(path) as img:  # header only
+        return {"width": img.width, "height": img.height}
+
+
+def read_image(ref: Dict[str, Any]) -> bytes:
+    """Bytes of a stored (already downscaled) image, for the skin agent."""
+    with open(ref["path"], "rb") as f:
+        return f.read()
@@ -0,0 +1,154 @@
+import math
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+# Deterministic trend engine for the reporter: metric payloads are parsed into
+# array-backed series and deltas/slopes/flags are computed here, so the model
+# only receives a short precomputed summary instead of doing arithmetic.
+
+METRICS = ["blood_sugar", "weight", "bp_systolic", "bp_diastolic", "heart_rate"]
+UNITS = {"blood_sugar": "mg/dL", "weight": "lb", "bp_systolic": "mmHg",
+         "bp_diastolic": "mmHg", "heart_rate": "bpm"}
+# (low, high) reference ranges for flags; informational only, not diagnostic
+RANGES = {"blood_sugar": (70, 130), "bp_systolic": (90, 130), "bp_diastolic": (60, 80),
+          "heart_rate": (50, 100)}
+SLOPE_WINDOW = 4  # visits used for the rolling slope
+
+_ALIASES = {"glucose": "blood_sugar", "hr": "heart_rate", "pulse": "heart_rate",
+            "systolic": "bp_systolic", "diastolic": "bp_diastolic", "bp": "blood_pressure"}
+
+
+def _num(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def parse_record(record: Dict[str, Any]) -> np.ndarray:
+    """One metrics payload -> row of floats in METRICS order (NaN when missing)."""
+    row = np.full(len(METRICS), np.nan)
+    for key, value in (record or {}).items():
+        key = _ALIASES.get(key.lower(), key.lower())
+        if key == "blood_pressure":
+            sys_, _, dia = str(value).partition("/")
+            row[METRICS.index("bp_systolic")] = _num(sys_)
+            row[METRICS.index("bp_diastolic")] = _num(dia)
+        elif key in METRICS:
+            row[METRICS.index(key)] = _num(value)
+    return row
+
+
+def history_from(prior: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]) -> List[dict]:
+    """
+    Oldest-to-newest records. prior_metrics may be a single snapshot or carry
+    earlier snapshots under "history".
+    """
+    records = []
+    if prior:
+        records.extend(prior.get("history") or [])
+        snapshot = {k: v for k, v in prior.items() if k != "history"}
+        if snapshot:
+            records.append(snapshot)
+    if current:
+        records.append(current)
+    return records
+
+
+def to_array(histories: Sequence[Sequence[dict]]) -> np.ndarray:
+    """Histories for P patients -> (P, T, M) array, left-padded with NaN to the longest."""
+    T = max((len(h) for h in histories), default=0)
+    out = np.full((len(histories), T, len(METRICS)), np.nan)
+    for p, h in enumerate(histories):
+        for t, rec in enumerate(h):
+            out[p, T - len(h) + t] = parse_record(rec)
+    return out
+
+
+def _last_valid(a: np.ndarray, skip: int = 0) -> np.ndarray:
+    # value of the (skip+1)-th most recent non-NaN entry along the time axis
+    valid = ~np.isnan(a)
+    rank = np.cumsum(valid[:, ::-1, :], axis=1)[:, ::-1, :]  # 1 = most recent valid
+    pick = valid & (rank == skip + 1)
+    return np.where(pick.any(axis=1), np.nansum(np.where(pick, a, 0.0), axis=1), np.nan)
+
+
+def _slope(a: np.ndarray, window: int) -> np.ndarray:
+    # least-squares slope per visit over the last `window` points, ignoring NaN
+    w = a[:, -window:, :]
+    x = np.arange(w.shape[1], dtype=float)[None, :, None]
+    m = ~np.isnan(w)
+    n = m.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        xm = np.where(m, x, 0).sum(axis=1) / n
+        ym = np.where(m, w, 0).sum(axis=1) / n
+        dx = np.where(m, x - xm[:, None, :], 0)
+        dy = np.where(m, w - ym[:, None, :], 0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def compute_trends(arr: np.ndarray, window: int = SLOPE_WINDOW) -> Dict[str, np.ndarray]:
+    """Vectorized trends for a (P, T, M) cohort array; every output is (P, M)."""
+    latest, previous = _last_valid(arr), _last_valid(arr, skip=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = latest - previous
+        pct = delta / np.abs(previous) * 100.0
+    lo = np.array([RANGES.get(k, (-np.inf, np.inf))[0] for k in METRICS])
+    hi = np.array([RANGES.get(k, (-np.inf, np.inf))[1] for k in METRICS])
+    return {"latest": latest, "previous": previous, "delta": delta, "pct": pct,
+            "slope": _slope(arr, window), "above": latest > hi, "below": latest < lo}
+
+
+def _fmt(v: float) -> str:
+    return f"{v:.0f}" if abs(v) >= 10 else f"{v:.1f}"
+
+
+def summarize(trends: Dict[str, np.ndarray], p: int = 0) -> Dict[str, Dict[str, Any]]:
+    """Patient p's trends as plain python values, skipping metrics with no data."""
+    out = {}
+    for j, name in enumerate(METRICS):
+        latest = trends["latest"][p, j]
+        if np.isnan(latest):
+            continue
+        entry = {"latest": float(latest), "unit": UNITS[name]}
+        for key in ("previous", "delta", "pct", "slope"):
+            v = trends[key][p, j]
+            if not np.isnan(v):
+                entry[key] = round(float(v), 2)
+        if trends["above"][p, j]:
+            entry["flag"] = "above reference range"
+        elif trends["below"][p, j]:
+            entry["flag"] = "below reference range"
+        out[name] = entry
+    return out
+
+
+def summary_text(summary: Dict[str, Dict[str, Any]]) -> str:
+    """Compact, prompt-ready lines, e.g. 'blood_sugar: 145 mg/dL (prev 160, -15, -9.4%) [above reference range]'."""
+    if not summary:
+        return "No metrics available."
+    lines = []
+    for name, e in summary.items():
+        parts = []
+        if "previous" in e:
+            parts.append(f"prev {_fmt(e['previous'])}, {e['delta']:+.1f}")
+            if "pct" in e:
+                parts.append(f"{e['pct']:+.1f}%")
+        if "slope" in e and e.get("slope") != e.get("delta"):
+            parts.append(f"slope {e['slope']:+.1f}/visit")
+        line = f"{name}: {_fmt(e['latest'])} {e['unit']}"
+        if parts:
+            line += " (" + ", ".join(parts) + ")"
+        if "flag" in e:
+            line += f" [{e['flag']}]"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def metrics_summary(prior: Optional[dict], current: Optional[dict]) -> str:
+    """One patient's prior/current payloads -> compact summary for the reporter prompt."""
+    arr = to_array([history_from(prior, current)])
+    if arr.shape[1] == 0:
+        return summary_text({})
+    return summary_text(summarize(compute_trends(arr)))
@@ -1,18 +1,148 @@
-import os, io
-from typing import Optional
-from google.cloud import storage
+import gzip, hashlib, multiprocessing, os, queue, threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
 import markdown as md
+from .clients import storage_client
+from ..common.telemetry import STORAGE_SECONDS, timed
 
+# Report rendering and publishing. Markdown converters are pooled (a Markdown
+# instance isn't thread-safe, but reset() makes it reusable), objects are named
+# by the hash of their content so identical reports are uploaded once, and
+# bodies go up gzip-compressed. HTML -> PDF (REPORT_FORMAT=pdf) runs in a
+# process pool.
 BUCKET = os.getenv("BUCKET")
-_storage = storage.Client()
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "html")  # html | pdf (needs weasyprint)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(2, os.cpu_count() or 1))))
+CONVERTER_POOL_SIZE = int(os.getenv("RENDER_CONVERTERS", "8"))
+KNOWN_OBJECTS = 4096  # object names this process has seen uploaded; skips the exists() round-trip
+EXTENSIONS = ["tables", "fenced_code"]
+# Reports carry PHI, so by default no cache (browser, proxy or CDN) keeps a copy.
+# Content-addressed objects never change: a deployment serving non-PHI reports can
+# opt in to REPORT_CACHE_CONTROL="public, max-age=31536000, immutable".
+CACHE_CONTROL = os.getenv("REPORT_CACHE_CONTROL", "private, no-store")
+
+
+class _ConverterPool:
+    """Reusable Markdown converters; each is used by one thread at a time."""
+
+    def __init__(self, size: int):
+        self._free: "queue.LifoQueue[md.Markdown]" = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def borrow(self) -> Iterator[md.Markdown]:
+        try:
+            conv = self._free.get_nowait()
+        except queue.Empty:
+            conv = md.Markdown(extensions=EXTENSIONS)  # pool empty: make one, keep it if there's room
+        try:
+            yield conv.reset()
+        finally:
+            try:
+                self._free.put_nowait(conv)
+            except queue.Full:
+                pass
+
+
+_converters = _ConverterPool(CONVERTER_POOL_SIZE)
+
+
+def render_html(markdown_text: str) -> bytes:
+    with _converters.borrow() as conv:
+        return conv.convert(markdown_text).encode("utf-8")
+
+
+def _html_to_pdf(html: bytes) -> bytes:
+    # runs in a worker process; weasyprint is only needed with REPORT_FORMAT=pdf
+    from weasyprint import HTML
+    return HTML(string=html.decode("utf-8")).write_pdf()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the MCP server runs threads (writers, exporter) that fork would copy mid-state
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def html_to_pdf(html: bytes) -> bytes:
+    return _executor().submit(_html_to_pdf, html).result()
+
+
+_known: "OrderedDict[str, str]" = OrderedDict()  # object name -> public URL
+_known_lock = threading.Lock()
+
+
+def _remember(name: str, url: str):
+    with _known_lock:
+        _known[name] = url
+        _known.move_to_end(name)
+        while len(_known) > KNOWN_OBJECTS:
+            _known.popitem(last=False)
+
+
+def _upload(blob, body: bytes, content_type: str, only_if_new: bool) -> bool:
+    """gzip + upload; False if only_if_new and another publisher got there first."""
+    blob.content_encoding = "gzip"  # clients and browsers get it decompressed transparently
+    blob.cache_control = CACHE_CONTROL if only_if_new else "private, no-cache"
+    data = gzip.compress(body, mtime=0)  # mtime=0: same content, same bytes
+    kw = {"if_generation_match": 0} if only_if_new else {}
+    try:
+        with timed(STORAGE_SECONDS, backend="gcs", op="upload"):
+            blob.upload_from_string(data, content_type=content_type, **kw)
+    except Exception as e:
+        if getattr(e, "code", None) == 412:  # PreconditionFailed: the object exists already
+            return False
+        raise
+    return True
+
+
+def publish_rendered(patient_id: str, markdown_text: str) -> Dict[str, Any]:
+    """
+    Render a report and store it at reports/{patient_id}/{sha256}.{html|pdf}.
+    Identical content maps to the same object and is uploaded once; concurrent
+    publishes of different reports never overwrite each other. Returns
+    {"url", "object", "sha256", "bytes", "dedup"}.
+    """
+    html = render_html(markdown_text)
+    digest = hashlib.sha256(html).hexdigest()
+    ext = "pdf" if REPORT_FORMAT == "pdf" else "html"
+    name = f"reports/{patient_id}/{digest}.{ext}"
+    info = {"object": name, "sha256": digest}
+    with _known_lock:
+        url = _known.get(name)
+    if url is not None:
+        return {**info, "url": url, "bytes": None, "dedup": True}
+
+    blob = storage_client().bucket(BUCKET).blob(name)
+    with timed(STORAGE_SECONDS, backend="gcs", op="exists"):
+        exists = blob.exists()
+    body, uploaded = None, False
+    if not exists:
+        # the hash is over the HTML, so a known report skips PDF rendering too
+        body = html_to_pdf(html) if ext == "pdf" else html
+        content_type = "application/pdf" if ext == "pdf" else "text/html; charset=utf-8"
+        uploaded = _upload(blob, body, content_type, only_if_new=True)
+    # also when the object was there already: its publisher may have died before this step
+    # (idempotent, and skipped once the object is in _known)
+    with timed(STORAGE_SECONDS, backend="gcs", op="make_public"):
+        blob.make_public()  # for demo; use signed URLs in prod
+    _remember(name, blob.public_url)
+    return {**info, "url": blob.public_url, "bytes": len(body) if body else None, "dedup": not uploaded}
+
 
 def render_pdf_from_markdown(markdown_text: str, object_name: str) -> str:
-    # Simple HTML export (swap with real PDF renderer in prod)
-    html = md.markdown(markdown_text, extensions=["tables", "fenced_code"])
-    html_bytes = html.encode("utf-8")
-
-    bucket = _storage.bucket(BUCKET)
-    blob = bucket.blob(object_name)
-    blob.upload_from_file(io.BytesIO(html_bytes), content_type="text/html")
-    blob.make_public()  # for demo; use signed URLs in prod
+    """Render to a fixed object name (overwritten each time); prefer publish_rendered()."""
+    blob = storage_client().bucket(BUCKET).blob(object_name)
+    _upload(blob, render_html(markdown_text), "text/html; charset=utf-8", only_if_new=False)
+    with timed(STORAGE_SECONDS, backend="gcs", op="make_public"):
+        blob.make_public()  # for demo; use signed URLs in prod
     return blob.public_url
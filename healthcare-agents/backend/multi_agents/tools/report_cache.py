@@ -0,0 +1,66 @@
+import hashlib, json, os
+from typing import Any, Dict, Optional
+from ..common.cache import TTLCache
+
+# Reports are memoized on a fingerprint of everything the reporter sees, so a
+# dashboard refresh of an unchanged session returns the stored markdown/URL
+# instead of another Pro-model call.
+CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", str(24 * 3600)))
+CACHE_PATH = os.getenv("REPORT_CACHE_PATH")  # e.g. ./report_cache.db, shared by workers
+
+# reporter inputs that decide the report's content
+FINGERPRINT_FIELDS = ("task_delta", "coach_json", "current_metrics", "prior_metrics")
+
+_report_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL, path=CACHE_PATH, name="reports")
+
+
+def _canonical(value: Any) -> Any:
+    # JSON strings are compared by content, not formatting
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return value
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def report_fingerprint(patient_id: str, inputs: Dict[str, Any], version: str = "") -> str:
+    """
+    Stable hash of (patient, task set, coach_json, current and prior metrics,
+    reporter version). Task order and JSON formatting don't matter.
+    """
+    parts = {"patient_id": patient_id, "version": version}
+    for field in FINGERPRINT_FIELDS:
+        value = _canonical(inputs.get(field))
+        if field == "task_delta":
+            value = sorted(_dump(t) for t in value or [])  # a set of tasks
+        parts[field] = value or None
+    return hashlib.sha256(_dump(parts).encode()).hexdigest()
+
+
+def get_report(fingerprint: str) -> Optional[Dict[str, Any]]:
+    """{"report_markdown", "report_url"?, "report_id"?} for an unchanged session, else None."""
+    entry = _report_cache.get(fingerprint)
+    if not entry or not entry.get("report_markdown"):
+        return None
+    return entry
+
+
+def put_report(fingerprint: str, markdown: str, url: Optional[str] = None, report_id: Optional[str] = None):
+    entry = {"report_markdown": markdown}
+    if url:
+        entry.update(report_url=url, report_id=report_id)
+    _report_cache.set(fingerprint, entry)
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _report_cache.stats()
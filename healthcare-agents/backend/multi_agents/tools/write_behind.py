@@ -0,0 +1,214 @@
+import abc, atexit, logging, os, random, threading, time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from ..common.llm_scheduler import retryable
+from ..common.telemetry import STORAGE_SECONDS, timed
+
+log = logging.getLogger(__name__)
+
+MAX_BATCH = int(os.getenv("FIRESTORE_MAX_BATCH", "500"))  # Firestore's per-commit op limit
+# writers wait for their commit, so this is added to their latency (at most)
+FLUSH_INTERVAL = float(os.getenv("FIRESTORE_FLUSH_INTERVAL", "0.05"))
+MAX_RETRIES = int(os.getenv("FIRESTORE_MAX_RETRIES", "5"))
+
+
+def transient(e: BaseException) -> bool:
+    """Worth retrying: unavailable/overloaded/timeouts, plus 409 (Firestore aborts contended commits)."""
+    return retryable(e) or getattr(e, "code", None) == 409
+
+
+@dataclass
+class WriteOp:
+    path: str                # full document path, e.g. "patients/p1/tasks/<hash>"
+    data: Dict[str, Any]
+    merge: bool = False
+
+
+class WriteBackend(abc.ABC):
+    """Commits one batch of ops atomically."""
+
+    @abc.abstractmethod
+    def commit(self, ops: List[WriteOp]) -> None:
+        """Write all of `ops` or none of them; raise on failure (the queue retries transient() errors)."""
+
+
+class FirestoreBackend(WriteBackend):
+    def __init__(self, db):
+        self._db = db
+
+    def commit(self, ops: List[WriteOp]) -> None:
+        batch = self._db.batch()
+        for op in ops:
+            batch.set(self._db.document(op.path), op.data, merge=op.merge)
+        with timed(STORAGE_SECONDS, backend="firestore", op="batch_commit"):
+            batch.commit()
+
+
+class InMemoryBackend(WriteBackend):
+    """In-process stand-in for Firestore (tests, local runs)."""
+
+    def __init__(self):
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.commits: List[int] = []  # ops per commit
+        self._lock = threading.Lock()
+
+    def commit(self, ops: List[WriteOp]) -> None:
+        with self._lock:
+            for op in ops:
+                base = self.docs.get(op.path, {}) if op.merge else {}
+                self.docs[op.path] = {**base, **op.data}
+            self.commits.append(len(ops))
+
+
+class WriteBehindQueue:
+    """
+    Background writer that coalesces document writes from many requests and
+    patients into batches of up to max_batch ops. Flushes on size or interval,
+    retries transient commit failures with jittered backoff, and drains on
+    flush()/close(). A batch rejected for good (an invalid or oversized
+    document) is committed again one op at a time, so only the bad op fails.
+    submit() returns a Future that settles when the op is committed, or fails
+    with the error; callers that acknowledge a write wait on it.
+    """
+
+    def __init__(self, backend: WriteBackend, max_batch: int = MAX_BATCH,
+                 flush_interval: float = FLUSH_INTERVAL, max_retries: int = MAX_RETRIES):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        # path -> (op, futures waiting on it); dict order keeps first-write order
+        self._pending: Dict[str, tuple] = {}
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"submitted": 0, "coalesced": 0, "commits": 0, "retries": 0, "splits": 0, "failed": 0}
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def submit(self, op: WriteOp) -> Future:
+        fut: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            self.stats["submitted"] += 1
+            prev = self._pending.get(op.path)
+            if prev is None:
+                self._pending[op.path] = (op, [fut])
+            else:
+                # coalesce: a merge layers on top of what's queued, a plain set replaces it
+                old, futs = prev
+                if op.merge:
+                    op = WriteOp(op.path, {**old.data, **op.data}, merge=old.merge)
+                futs.append(fut)
+                self._pending[op.path] = (op, futs)
+                self.stats["coalesced"] += 1
+            self._ensure_thread()
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+        return fut
+
+    def _take(self) -> List[tuple]:
+        items = []
+        for path in list(self._pending)[:self.max_batch]:
+            items.append(self._pending.pop(path))
+        self._inflight += len(items)
+        return items
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    if self._closed:
+                        return
+                    self._cond.wait(self.flush_interval)
+                    continue
+                if len(self._pending) < self.max_batch and not self._closed:
+                    # give concurrent requests a moment to add to this batch
+                    self._cond.wait(self.flush_interval)
+                items = self._take()
+            self._commit(items)
+            with self._cond:
+                self._inflight -= len(items)
+                self._cond.notify_all()
+
+    def _commit(self, items: List[tuple]):
+        error = self._attempt([op for op, _ in items])
+        if error is not None and len(items) > 1 and not transient(error):
+            # the batch is atomic: one bad op fails it, so commit each op alone to find out which
+            self.stats["splits"] += 1
+            for item in items:
+                self._settle([item], self._attempt([item[0]]))
+            return
+        self._settle(items, error)
+
+    def _attempt(self, ops: List[WriteOp]) -> Optional[Exception]:
+        """Commit `ops`, retrying transient errors; returns the error it gave up on."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.backend.commit(ops)
+                self.stats["commits"] += 1
+                return None
+            except Exception as e:
+                if attempt == self.max_retries or not transient(e):
+                    log.error("write-behind commit of %d ops failed: %s", len(ops), e)
+                    return e
+                self.stats["retries"] += 1
+                time.sleep(min(5.0, 0.1 * 2 ** attempt) * (0.5 + random.random()))
+
+    def _settle(self, items: List[tuple], error: Optional[Exception]):
+        if error is not None:
+            self.stats["failed"] += len(items)
+        for _, futs in items:
+            for f in futs:
+                if error is None:
+                    f.set_result(None)
+                else:
+                    f.set_exception(error)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is committed (or failed)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else self.flush_interval)
+        return True
+
+    def close(self, timeout: Optional[float] = 30):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush(timeout)
+
+
+_writer: Optional[WriteBehindQueue] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer(backend_factory) -> WriteBehindQueue:
+    """Process-wide writer; `backend_factory` is only called the first time."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteBehindQueue(backend_factory())
+            atexit.register(_writer.close)
+        return _writer
+
+
+def set_backend(backend: WriteBackend) -> WriteBehindQueue:
+    """Swap the process-wide writer onto another backend (e.g. InMemoryBackend in tests)."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = WriteBehindQueue(backend)
+        return _writer
@@ -0,0 +1,210 @@
+"""
+Offline load test.
+
+Runs the FastAPI app in-process, with its real ADK runners, agents, MCP
+servers and LLM scheduler, against the local fakes in
+multi_agents/tools/fakes.py (Gemini with a seeded latency distribution, also
+behind the agents' ScheduledGemini models; in-memory Firestore, filesystem
+bucket), drives the main endpoints at a fixed
+concurrency and prints one JSON document with throughput and p50/p95/p99 per
+scenario, so runs can be diffed between commits. No network needed.
+Run from healthcare-agents/backend:
+
+    python scripts/bench.py --requests 200 --concurrency 16 --out bench.json
+    python scripts/bench.py --scenarios coach --llm-latency-ms 800,4000
+"""
+import argparse, asyncio, json, os, platform, random, subprocess, sys, tempfile, time
+
+SCENARIOS = ("process", "ingest", "coach")
+
+CONDITIONS = ["Type 2 Diabetes", "Hypertension", "Asthma", "COPD", "Hypothyroidism",
+              "Heart Failure", "Chronic Kidney Disease", "Migraine"]
+VISIT_TYPES = ["Follow-up", "Annual physical", "Lab review", "Medication check"]
+TRANSCRIPT_LINES = [
+    "Doctor: Your blood sugar improved from {a} to {b} mg/dL.",
+    "Doctor: Please schedule a fasting blood test before the next visit.",
+    "Patient: Should I keep taking the same dose?",
+    "Doctor: Yes, continue the current medication and check your pressure daily.",
+    "Doctor: Book a follow-up appointment in {m} months.",
+    "Doctor: Bring your glucose log and the pharmacy refill form.",
+]
+
+
+def _setup_env(args, workdir: str):
+    # must happen before the app is imported: MCP clients snapshot os.environ when built
+    os.environ.update({
+        "FAKE_BACKENDS": "1",
+        "FAKE_SEED": str(args.seed),
+        "FAKE_LLM_LATENCY_MS": args.llm_latency_ms,
+        "FAKE_STORAGE_LATENCY_MS": args.storage_latency_ms,
+        "FAKE_LLM_ERROR_RATE": str(args.llm_error_rate),
+        "FAKE_BUCKET_DIR": os.path.join(workdir, "bucket"),
+        "BUCKET": "bench",
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+        # the job queue and the host-wide rate buckets are SQLite files; keep them in the run's workdir
+        "JOB_BACKEND": "sqlite",
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "LLM_RATE_DB": os.path.join(workdir, "llm_rates.db"),
+    })
+    for var in ("SESSION_SPILL_PATH", "COACH_CACHE_PATH", "DEDUPE_INDEX_PATH"):
+        os.environ.pop(var, None)  # keep runs independent of local state
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _transcript(rng: random.Random) -> str:
+    lines = rng.sample(TRANSCRIPT_LINES, k=rng.randint(2, len(TRANSCRIPT_LINES)))
+    return "\n".join(l.format(a=rng.randint(150, 220), b=rng.randint(100, 150), m=rng.randint(1, 6))
+                     for l in lines)
+
+
+def _metrics(rng: random.Random) -> dict:
+    return {"blood_sugar": rng.randint(90, 220), "weight": rng.randint(120, 260),
+            "blood_pressure": f"{rng.randint(105, 160)}/{rng.randint(65, 100)}",
+            "heart_rate": rng.randint(55, 105)}
+
+
+def build_request(scenario: str, i: int, rng: random.Random, patients: int):
+    """(path, kwargs for httpx post) for request i of a scenario."""
+    patient = f"bench-patient-{i % patients}"
+    if scenario == "process":
+        return "/api/agents/process", {"json": {
+            "transcript": _transcript(rng), "condition": rng.choice(CONDITIONS),
+            "visit_type": rng.choice(VISIT_TYPES), "current_metrics": _metrics(rng),
+            "prior_metrics": _metrics(rng), "patient_id": patient, "session_id": f"bench-{i}"}}
+    if scenario == "ingest":
+        return "/api/ingest/transcript", {"data": {
+            "snippet": _transcript(rng), "session_id": f"bench-ingest-{i % patients}", "patient_id": patient}}
+    if scenario == "coach":
+        return "/api/coach", {"data": {
+            "condition": rng.choice(CONDITIONS), "visit_type": rng.choice(VISIT_TYPES),
+            "session_id": f"bench-coach-{i}", "patient_id": patient}}
+    raise ValueError(f"unknown scenario {scenario!r}")
+
+
+def _pct(sorted_ms, p: float) -> float:
+    # nearest-rank percentile
+    if not sorted_ms:
+        return 0.0
+    k = max(0, min(len(sorted_ms) - 1, int(round(p / 100.0 * len(sorted_ms) + 0.5)) - 1))
+    return round(sorted_ms[k], 2)
+
+
+def summarize(latencies_ms, wall_s: float) -> dict:
+    s = sorted(latencies_ms)
+    return {
+        "throughput_rps": round(len(s) / wall_s, 2) if wall_s > 0 else 0.0,
+        "latency_ms": {"mean": round(sum(s) / len(s), 2) if s else 0.0, "p50": _pct(s, 50),
+                       "p95": _pct(s, 95), "p99": _pct(s, 99), "max": round(s[-1], 2) if s else 0.0},
+    }
+
+
+async def run_scenario(client, scenario: str, n: int, concurrency: int, warmup: int,
+                       seed: int, patients: int) -> dict:
+    rng = random.Random(f"{seed}:{scenario}")
+    for i in range(warmup):
+        path, kw = build_request(scenario, -1 - i, rng, patients)
+        await client.post(path, **kw)
+
+    requests = iter([build_request(scenario, i, rng, patients) for i in range(n)])
+    latencies, errors, stages = [], {}, {}
+
+    async def worker():
+        for path, kw in requests:
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post(path, **kw)
+                ok = resp.status_code == 200
+                key = str(resp.status_code)
+            except Exception as e:
+                ok, resp, key = False, None, type(e).__name__
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if not ok:
+                errors[key] = errors.get(key, 0) + 1
+            elif scenario == "process":
+                # per-stage breakdown reported by the pipeline itself
+                for stage, sec in (resp.json().get("timings") or {}).items():
+                    stages.setdefault(stage, []).append(sec * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - t0
+    out = {"requests": n, "concurrency": concurrency, "errors": errors, "wall_s": round(wall, 3),
+           **summarize(latencies, wall)}
+    if stages:
+        out["stages_ms"] = {k: summarize(v, wall)["latency_ms"] for k, v in stages.items()}
+    return out
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench(args) -> dict:
+    import httpx
+    import main
+    from multi_agents.mcp.client import close_all
+
+    t0 = time.perf_counter()
+    await main.warm_up_backends()  # ASGITransport doesn't run startup hooks
+    startup = time.perf_counter() - t0
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {"requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup,
+                   "patients": args.patients, "seed": args.seed, "llm_latency_ms": args.llm_latency_ms,
+                   "llm_error_rate": args.llm_error_rate, "storage_latency_ms": args.storage_latency_ms},
+        "startup_s": round(startup, 3),
+        "scenarios": {},
+    }
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in args.scenarios:
+                report["scenarios"][scenario] = await run_scenario(
+                    client, scenario, args.requests, args.concurrency, args.warmup, args.seed, args.patients)
+    finally:
+        close_all()
+    return report
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--scenarios", default=",".join(SCENARIOS),
+                   type=lambda s: [x for x in s.split(",") if x], help="comma-separated: " + ",".join(SCENARIOS))
+    p.add_argument("--requests", type=int, default=100, help="measured requests per scenario")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--warmup", type=int, default=5, help="unmeasured requests per scenario")
+    p.add_argument("--patients", type=int, default=20, help="distinct patient ids to spread load over")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--llm-latency-ms", default="400,2000", help="fake Gemini p50,p99")
+    p.add_argument("--llm-error-rate", type=float, default=0.0, help="share of fake Gemini calls failing with 429")
+    p.add_argument("--storage-latency-ms", default="5,40", help="fake Firestore/GCS p50,p99")
+    p.add_argument("--out", help="also write the JSON report here")
+    args = p.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        p.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="medagents-bench-") as workdir:
+        _setup_env(args, workdir)
+        report = asyncio.run(bench(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    failed = sum(sum(s["errors"].values()) for s in report["scenarios"].values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Import-time budget check.
+
+Imports each entry point in a fresh interpreter with `-X importtime` and fails
+if it exceeds its budget or pulls in a module it should only load lazily.
+Run from healthcare-agents/backend:
+
+    python scripts/check_import_time.py
+"""
+import os, re, subprocess, sys
+
+# module -> (budget in ms, modules that must not be imported eagerly)
+BUDGETS = {
+    "main": (int(os.getenv("IMPORT_BUDGET_MAIN_MS", "15000")),
+             ["google.cloud.firestore", "markdown"]),
+    "multi_agents.mcp.intake_mcp": (int(os.getenv("IMPORT_BUDGET_MCP_MS", "1500")),
+                                    ["google.adk", "google.cloud.firestore", "vertexai"]),
+    "multi_agents.mcp.report_mcp": (int(os.getenv("IMPORT_BUDGET_MCP_MS", "1500")),
+                                    ["google.adk", "google.cloud.firestore", "google.cloud.storage", "vertexai"]),
+    "multi_agents.mcp.coach_mcp": (int(os.getenv("IMPORT_BUDGET_MCP_MS", "1500")),
+                                   ["google.adk", "vertexai"]),
+}
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((int(m.group(2)), len(m.group(3)), m.group(4)))
+    total_us = sum(us for us, depth, _ in rows if depth == 1)
+    return total_us / 1000, {name for _, _, name in rows}, rows
+
+
+def main() -> int:
+    failed = False
+    for module, (budget_ms, forbidden) in BUDGETS.items():
+        try:
+            total_ms, loaded, rows = measure(module)
+        except RuntimeError as e:
+            print(f"FAIL {module}: {e}")
+            failed = True
+            continue
+        eager = [f for f in forbidden if any(n == f or n.startswith(f + ".") for n in loaded)]
+        ok = total_ms <= budget_ms and not eager
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {module}: {total_ms:.0f} ms (budget {budget_ms} ms)")
+        for name in eager:
+            print(f"     eagerly imports {name}")
+        if total_ms > budget_ms:
+            top = sorted((r for r in rows if r[1] == 1), reverse=True)[:5]
+            for us, _, name in top:
+                print(f"     {us / 1000:8.0f} ms  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+import os, sys
+
+# tests import the backend as `multi_agents.*`, like main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
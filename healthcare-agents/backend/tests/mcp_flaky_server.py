@@ -0,0 +1,34 @@
+# Minimal stdio MCP server for tests/test_mcp_pool.py.
+import asyncio, os, sys
+from mcp.server.fastmcp import FastMCP
+
+MARKER = sys.argv[1]  # exists once the server has crashed once
+mcp = FastMCP("flaky")
+
+
+@mcp.tool()
+async def echo(text: str) -> str:
+    return text
+
+
+@mcp.tool()
+async def crash_once(text: str) -> str:
+    if not os.path.exists(MARKER):
+        open(MARKER, "w").close()
+        os._exit(1)  # the process dies mid-call
+    return text
+
+
+@mcp.tool()
+async def hang(seconds: float) -> str:
+    await asyncio.sleep(seconds)
+    return "late"
+
+
+@mcp.tool()
+async def fail(text: str) -> str:
+    raise ValueError(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(mcp.run_stdio_async())
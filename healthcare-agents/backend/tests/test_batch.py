@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from multi_agents import batch
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    calls = {"process": [], "prior": []}
+
+    async def run_process(runners, patient_id, session_id, data):
+        calls["process"].append(data)
+        if data.get("fail"):
+            raise RuntimeError("stage blew up")
+        return {"patient": patient_id, "prior": data.get("prior_metrics")}
+
+    async def prior_many(patient_ids):
+        calls["prior"].append(list(patient_ids))
+        return {pid: {"weight": 100 + int(pid[1:])} for pid in patient_ids}
+
+    monkeypatch.setattr(batch, "run_process", run_process)
+    monkeypatch.setattr(batch, "afetch_prior_metrics_many", prior_many)
+    return calls
+
+
+def _run(items, **kw):
+    return asyncio.run(asyncio.wait_for(batch.run_batch(items, runners=object(), **kw), 5))
+
+
+def test_rows_come_back_for_every_item_in_order(pipeline):
+    rows = _run([{"patient_id": f"p{i}"} for i in range(10)], concurrency=3)
+    assert [r["index"] for r in rows] == list(range(10))
+    assert all(r["ok"] for r in rows)
+
+
+def test_malformed_items_fail_their_row_without_hanging(pipeline):
+    rows = _run([{"patient_id": "p1"}, "not a payload", None, {"patient_id": "p2", "fail": True}],
+                concurrency=2)
+    assert [r["ok"] for r in rows] == [True, False, False, False]
+    assert rows[1]["error"].startswith("TypeError") and rows[1]["patient_id"] is None
+    assert rows[3]["error"] == "RuntimeError: stage blew up" and rows[3]["patient_id"] == "p2"
+
+
+def test_prior_metrics_are_fetched_once_per_chunk(pipeline, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_PREFETCH", 4)
+    items = [{"patient_id": f"p{i % 3}"} for i in range(6)] + [{"patient_id": "p9", "prior_metrics": {"x": 1}}]
+    rows = _run(items, concurrency=2)
+    # 7 items in chunks of 4; duplicates and payloads that brought their own are not fetched
+    assert pipeline["prior"] == [["p0", "p1", "p2"], ["p1", "p2"]]
+    assert rows[1]["result"]["prior"] == {"weight": 101}
+    assert rows[6]["result"]["prior"] == {"x": 1}
+
+
+def test_prior_metrics_failure_falls_back_to_the_pipeline(pipeline, monkeypatch):
+    async def broken(patient_ids):
+        raise ConnectionError("firestore down")
+
+    monkeypatch.setattr(batch, "afetch_prior_metrics_many", broken)
+    rows = _run([{"patient_id": "p1"}])
+    assert rows[0]["ok"] and rows[0]["result"]["prior"] is None
+
+
+def test_consumer_leaving_early_stops_the_workers(pipeline):
+    async def main():
+        gen = batch.process_batch(({"patient_id": f"p{i}"} for i in range(1000)), runners=object(), concurrency=2)
+        first = await gen.__anext__()
+        await gen.aclose()
+        return first
+
+    assert asyncio.run(asyncio.wait_for(main(), 5))["ok"]
+    assert len(pipeline["process"]) < 1000
+
+
+@pytest.mark.parametrize("concurrency", [0, -3, "8", 2.5, True, [4]])
+def test_batch_endpoint_rejects_bad_concurrency(concurrency):
+    from fastapi.testclient import TestClient
+    import main
+    resp = TestClient(main.app).post("/api/agents/process/batch",
+                                     json={"items": [{"patient_id": "p1"}], "concurrency": concurrency})
+    assert resp.status_code == 422
+
+
+def test_batch_endpoint_caps_concurrency(pipeline, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    seen = []
+
+    async def process_batch(items, runners, concurrency):
+        seen.append(concurrency)
+        yield {"index": 0, "ok": True}
+
+    monkeypatch.setattr(main, "process_batch", process_batch)
+    resp = TestClient(main.app).post("/api/agents/process/batch",
+                                     json={"items": [{"patient_id": "p1"}], "concurrency": 10_000})
+    assert resp.status_code == 200 and seen == [batch.BATCH_MAX_CONCURRENCY]
@@ -0,0 +1,41 @@
+import os, subprocess, sys
+from multi_agents.tools import clients
+from multi_agents.tools.fakes import FakeFirestore
+
+
+def test_importing_builds_and_imports_nothing_heavy():
+    code = ("import sys; from multi_agents.tools import clients; "
+            "print(bool(clients._clients), [m for m in ('google.cloud.firestore', 'google.cloud.storage', "
+            "'vertexai') if m in sys.modules])")
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=60, cwd=backend)
+    assert out.stdout.strip().splitlines()[-1] == "False []", out.stderr
+
+
+def test_client_is_built_once_on_first_use(monkeypatch):
+    monkeypatch.setattr(clients, "_clients", {})
+    monkeypatch.setattr(clients, "FAKE_BACKENDS", True)
+    db = clients.firestore_client()
+    assert isinstance(db, FakeFirestore) and clients.firestore_client() is db
+    assert list(clients._clients) == ["firestore"]
+
+
+def test_forked_child_rebuilds_its_clients(monkeypatch):
+    monkeypatch.setattr(clients, "_clients", {})
+    monkeypatch.setattr(clients, "FAKE_BACKENDS", True)
+    parent = clients.firestore_client()
+    monkeypatch.setattr(clients, "_pid", -1)  # as seen from a forked child
+    assert clients.firestore_client() is not parent
+
+
+def test_warm_up_times_clients_and_swallows_errors(monkeypatch):
+    monkeypatch.setattr(clients, "_clients", {})
+
+    def broken():
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setitem(clients.WARMERS, "storage", broken)
+    monkeypatch.setitem(clients.WARMERS, "firestore", lambda: clients._lazy("firestore", object))
+    timings = clients.warm_up("firestore", "storage")
+    assert set(timings) == {"firestore", "storage"} and all(t >= 0 for t in timings.values())
+    assert list(clients._clients) == ["firestore"]
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from multi_agents import coach_agent
+from multi_agents.common.cache import TTLCache
+from multi_agents.common.runs import run_agent
+from multi_agents.common.sessions import make_session_service
+from multi_agents.orchestration import AgentRunners
+from multi_agents.tools import coach_cache
+
+GUIDANCE = {"checklist": ["Bring ID"], "cautions": [], "questions_for_doctor": ["Any changes?"]}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Counts coach_for_visit calls (each one is a model call in coach_mcp)."""
+    calls = []
+
+    async def acall(tool, **kw):
+        calls.append((tool, kw["condition"], kw["visit_type"]))
+        await asyncio.sleep(0.05)
+        return GUIDANCE
+
+    monkeypatch.setattr(coach_agent._mcp_coach, "acall", acall)
+    monkeypatch.setattr(coach_cache, "_coach_cache", TTLCache(maxsize=16, ttl=60, name="coach"))
+    return calls
+
+
+def test_repeated_coach_request_makes_no_second_model_call(upstream):
+    runners = AgentRunners(make_session_service())
+
+    async def main():
+        first = await run_agent(runners.coach, "p1", "s1", {"condition": "T2D", "visit_type": "follow up"})
+        # a synonym of the same pair, on another session
+        second = await run_agent(runners.coach, "p2", "s2",
+                                 {"condition": "type 2 diabetes", "visit_type": "follow-up"})
+        return first.state["coach_json"], second.state["coach_json"]
+
+    assert asyncio.run(main()) == (GUIDANCE, GUIDANCE)
+    assert upstream == [("coach_for_visit", "T2D", "follow up")]
+
+
+def test_different_pairs_are_not_shared(upstream):
+    async def main():
+        await coach_agent.acoach_json("hypertension", "checkup")
+        await coach_agent.acoach_json("asthma", "checkup")
+
+    asyncio.run(main())
+    assert len(upstream) == 2
+
+
+def test_identical_concurrent_requests_share_one_call(upstream):
+    runners = AgentRunners(make_session_service())
+
+    async def main():
+        return await asyncio.gather(*(
+            run_agent(runners.coach, f"p{i}", f"s{i}", {"condition": "asthma", "visit_type": "checkup"})
+            for i in range(8)))
+
+    results = asyncio.run(main())
+    assert all(r.state["coach_json"] == GUIDANCE for r in results)
+    assert len(upstream) == 1
+
+
+def test_coach_stage_keeps_the_span_context(upstream, caplog):
+    runners = AgentRunners(make_session_service())
+    result = asyncio.run(run_agent(runners.coach, "p1", "s1", {"condition": "asthma", "visit_type": "checkup"}))
+    assert result.state["coach_json"] == GUIDANCE
+    assert "Failed to detach context" not in caplog.text
@@ -0,0 +1,88 @@
+import asyncio, time
+from types import SimpleNamespace
+import pytest
+from multi_agents import pipeline
+from multi_agents.common.dag import Stage, run_dag
+
+
+def _value(v, delay=0.0):
+    async def fn(deps):
+        await asyncio.sleep(delay)
+        return v
+    return fn
+
+
+def _boom(deps):
+    async def fn():
+        raise ValueError("broken stage")
+    return fn()
+
+
+def test_independent_stages_run_concurrently():
+    stages = [Stage("a", _value(1, 0.1)), Stage("b", _value(2, 0.1))]
+    t0 = time.perf_counter()
+    result = asyncio.run(run_dag(stages))
+    assert result.results == {"a": 1, "b": 2} and not result.partial
+    assert time.perf_counter() - t0 < 0.18
+
+
+def test_stage_timeout_resolves_to_fallback():
+    result = asyncio.run(run_dag([Stage("slow", _value("late", 1.0), timeout=0.05, fallback="fb")]))
+    assert result.results == {"slow": "fb"}
+    assert result.errors == {"slow": "timed out after 0.05s"} and result.partial
+
+
+def test_failed_stage_resolves_to_fallback():
+    result = asyncio.run(run_dag([Stage("bad", _boom, fallback={})]))
+    assert result.results == {"bad": {}}
+    assert result.errors == {"bad": "ValueError: broken stage"}
+
+
+def test_dependents_run_on_a_failed_dependency_fallback():
+    seen = {}
+
+    async def report(deps):
+        seen.update(deps)
+        return "report"
+
+    resolved = []
+    stages = [Stage("intake", _boom, fallback=[]), Stage("coach", _value({"ok": 1})),
+              Stage("report", report, deps=("intake", "coach"))]
+    result = asyncio.run(run_dag(stages, on_result=lambda n, v, e: resolved.append((n, e))))
+    assert seen == {"intake": [], "coach": {"ok": 1}}
+    assert result.results["report"] == "report"
+    assert set(result.errors) == {"intake"}
+    assert resolved[-1] == ("report", None) and ("intake", "ValueError: broken stage") in resolved
+
+
+@pytest.mark.parametrize("stages", [
+    [Stage("a", _value(1)), Stage("a", _value(2))],
+    [Stage("a", _value(1), deps=("missing",))],
+    [Stage("a", _value(1), deps=("b",)), Stage("b", _value(2), deps=("a",))],
+])
+def test_bad_graphs_are_rejected(stages):
+    with pytest.raises(ValueError):
+        asyncio.run(run_dag(stages))
+
+
+def test_failed_stages_come_back_empty_not_made_up(monkeypatch):
+    async def run_agent(runner, user_id, session_id, inputs, **kw):
+        if runner == "intake":
+            raise ConnectionError("intake_mcp exited")
+        return SimpleNamespace(state={})  # coach produced nothing
+
+    async def run_reporter(runner, user_id, session_id, inputs):
+        return SimpleNamespace(state={})
+
+    monkeypatch.setattr(pipeline, "run_agent", run_agent)
+    monkeypatch.setattr(pipeline, "run_reporter", run_reporter)
+    monkeypatch.setattr(pipeline, "cached_report", lambda user_id, inputs: ("fp", None))
+    runners = SimpleNamespace(intake="intake", coach="coach", report="report")
+    data = {"transcript": "Doctor: book labs", "condition": "asthma", "visit_type": "checkup",
+            "prior_metrics": {}}
+    out = asyncio.run(pipeline.run_process(runners, "p1", "s1", data))
+    assert out["tasks"] == [] and out["guidance"] == {} and out["report"] is None
+    assert out["partial"]
+    assert out["errors"] == {"intake": "ConnectionError: intake_mcp exited",
+                             "coach": "RuntimeError: coach returned no guidance",
+                             "report": "RuntimeError: reporter returned no report"}
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from multi_agents.common.schemas import Task
+from multi_agents.tools import dedupe
+from multi_agents.tools.dedupe import TaskDedupeIndex, clinical_key
+
+
+def _titles(tasks):
+    return [(t.title, t.needs_review) for t in tasks]
+
+
+def _seen(index, *titles):
+    index.add(dedupe.entry(Task(title=t)) for t in titles)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # a shared SQLite store and an empty LRU, as in a fresh worker
+    s = dedupe._IndexStore(str(tmp_path / "dedupe.db"))
+    monkeypatch.setattr(dedupe, "_store", s)
+    monkeypatch.setattr(dedupe, "_indexes", dedupe.OrderedDict())
+    return s
+
+
+@pytest.mark.parametrize("old, new", [
+    ("Increase insulin dose", "Decrease insulin dose"),
+    ("Start metformin", "Stop metformin"),
+    ("Take metformin 500mg twice daily", "Take metformin 1000mg twice daily"),
+    ("Schedule follow-up in 3 months", "Schedule follow-up in 6 months"),
+    ("Check blood pressure 2 times a day", "Check blood pressure 3 times a day"),
+])
+def test_clinically_different_tasks_are_new(old, new):
+    index = TaskDedupeIndex()
+    _seen(index, old)
+    assert clinical_key(old) != clinical_key(new)
+    assert _titles(index.classify([Task(title=new)])) == [(new, False)]
+
+
+def test_clinical_key_normalizes_units_and_inflections():
+    assert clinical_key("Increase metformin to 1000 mg in 2 weeks") == "increase|1000mg 2week"
+    assert clinical_key("metformin 500 MG") == clinical_key("Metformin 500mg")
+    assert clinical_key("Stopped lisinopril") == clinical_key("stop lisinopril")
+    assert clinical_key("Schedule blood work") == "|"
+
+
+def test_near_duplicate_is_flagged_not_dropped():
+    index = TaskDedupeIndex()
+    _seen(index, "Schedule blood work")
+    kept = index.classify([Task(title="Schedule bloodwork labs")])
+    assert _titles(kept) == [("Schedule bloodwork labs", True)]
+
+
+def test_exact_repeats_are_dropped_including_within_one_batch():
+    index = TaskDedupeIndex()
+    _seen(index, "Bring glucose log")
+    kept = index.classify([Task(title="bring glucose log"), Task(title="Book eye exam"),
+                           Task(title="Book eye exam")])
+    assert _titles(kept) == [("Book eye exam", False)]
+
+
+def test_different_due_dates_are_not_near_duplicates():
+    index = TaskDedupeIndex()
+    index.add([dedupe.entry(Task(title="Schedule blood work", due_date="2024-01-10"))])
+    kept = index.classify([Task(title="Schedule bloodwork labs", due_date="2024-03-10")])
+    assert _titles(kept) == [("Schedule bloodwork labs", False)]
+
+
+def test_classify_does_not_change_the_index():
+    index = TaskDedupeIndex()
+    index.classify([Task(title="Book eye exam")])
+    assert len(index) == 0
+    assert index.classify([Task(title="Book eye exam")])
+
+
+def test_store_has_one_row_per_task_and_workers_see_each_others_rows(store, tmp_path):
+    dedupe.record_tasks("p1", [Task(title="Book eye exam")])
+    # another worker adds a row to the same file
+    other = dedupe._IndexStore(str(tmp_path / "dedupe.db"))
+    other.add("p1", [dedupe.entry(Task(title="Bring glucose log"))])
+    other.add("p1", [dedupe.entry(Task(title="Book eye exam"))])  # already there: ignored
+
+    index = dedupe.index_for("p1")
+    assert len(index) == 2
+    assert index.classify([Task(title="Bring glucose log")]) == []
+    rows = store._db.execute("SELECT COUNT(*) FROM dedupe_tasks WHERE patient_id='p1'").fetchone()[0]
+    assert rows == 2
+
+
+def test_failed_persist_leaves_tasks_unseen(store, monkeypatch):
+    from multi_agents import intake_agent
+
+    async def extract(transcript):
+        return [{"title": "Book eye exam", "source": "doctor", "confidence": 0.9}]
+
+    async def broken_persist(patient_id, tasks):
+        raise RuntimeError("firestore unavailable")
+
+    persisted = []
+
+    async def persist(patient_id, tasks):
+        persisted.append([t.title for t in tasks])
+
+    monkeypatch.setattr(intake_agent, "extract_chunked", extract)
+    monkeypatch.setattr(intake_agent, "_persist", broken_persist)
+    with pytest.raises(RuntimeError):
+        asyncio.run(intake_agent.extract_new_tasks("...", "p2"))
+    assert len(dedupe.index_for("p2")) == 0
+
+    monkeypatch.setattr(intake_agent, "_persist", persist)
+    kept = asyncio.run(intake_agent.extract_new_tasks("...", "p2"))
+    assert [t.title for t in kept] == ["Book eye exam"] and persisted == [["Book eye exam"]]
+    assert asyncio.run(intake_agent.extract_new_tasks("...", "p2")) == []
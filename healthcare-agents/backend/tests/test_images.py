@@ -0,0 +1,65 @@
+import asyncio, io
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+import pytest
+from PIL import Image
+from multi_agents.tools import images
+
+
+class _Upload:
+    def __init__(self, data: bytes):
+        self._buf = io.BytesIO(data)
+
+    async def read(self, n: int) -> bytes:
+        return self._buf.read(n)
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), "red").save(buf, "JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def pools(tmp_path, monkeypatch):
+    """Fake process pools: the first `broken` ones have lost a worker, later ones run inline."""
+    state = SimpleNamespace(broken=1, created=[])
+
+    class Pool(Executor):
+        def __init__(self, **kw):
+            self.broken = len(state.created) < state.broken
+            self.shut = False
+            state.created.append(self)
+
+        def submit(self, fn, *args):
+            fut = Future()
+            if self.broken:
+                fut.set_exception(BrokenProcessPool("a child process terminated abruptly"))
+            else:
+                fut.set_result(fn(*args))
+            return fut
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut = True
+
+    monkeypatch.setattr(images, "IMAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(images, "ProcessPoolExecutor", Pool)
+    monkeypatch.setattr(images, "_pool", None)
+    return state
+
+
+def test_broken_pool_is_replaced_and_the_upload_retried(pools):
+    ref = asyncio.run(images.ingest_image(_Upload(_jpeg())))
+    assert (ref["width"], ref["height"]) == (64, 48) and not ref["dedup"]
+    first, second = pools.created
+    assert first.shut and images._pool is second
+
+
+def test_pool_that_keeps_breaking_is_unavailable(pools):
+    pools.broken = 2
+    with pytest.raises(images.ImageUnavailable):
+        asyncio.run(images.ingest_image(_Upload(_jpeg())))
+    assert all(p.shut for p in pools.created) and images._pool is None
+    # the next upload gets a fresh pool
+    assert asyncio.run(images.ingest_image(_Upload(_jpeg())))["width"] == 64
@@ -0,0 +1,38 @@
+import pytest
+from fastapi.testclient import TestClient
+import main
+from multi_agents.common.schemas import Task
+
+
+@pytest.fixture
+def extract(monkeypatch):
+    calls = []
+
+    async def extract_new_tasks(text, patient_id):
+        calls.append(text)
+        if len(calls) == 1:
+            raise ConnectionError("intake_mcp exited")
+        return [Task(title="Book A1C lab", source="doctor", confidence=0.9)]
+
+    monkeypatch.setattr(main, "extract_new_tasks", extract_new_tasks)
+    return calls
+
+
+def test_failed_extraction_is_reported_and_the_socket_stays_open(extract):
+    client = TestClient(main.app)
+    with client.websocket_connect("/api/ingest/stream?session_id=s1&patient_id=p1") as ws:
+        ws.send_text('{"text": "Doctor: get labs.", "flush": true}')
+        assert ws.receive_json() == {"type": "error", "session_id": "s1",
+                                     "error": "ConnectionError: intake_mcp exited", "chars": 17}
+        ws.send_text('{"text": "Doctor: book an A1C lab.", "flush": true}')
+        msg = ws.receive_json()
+        assert msg["type"] == "tasks" and msg["tasks"][0]["title"] == "Book A1C lab"
+    assert len(extract) == 2
+
+
+def test_failed_final_flush_is_logged_not_raised(extract, caplog):
+    client = TestClient(main.app)
+    with client.websocket_connect("/api/ingest/stream?session_id=s2&patient_id=p1") as ws:
+        ws.send_text("Doctor: book labs")  # no sentence end yet: buffered until the client leaves
+    assert extract == ["Doctor: book labs"]
+    assert "final flush failed" in caplog.text
@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from multi_agents.common.codec import dumps
+from multi_agents.mcp import intake_mcp
+
+
+@pytest.fixture
+def answer(monkeypatch):
+    reply = {}
+
+    class Model:
+        async def generate_content_async(self, prompt):
+            return SimpleNamespace(text=reply["text"], usage_metadata=None)
+
+    async def schedule(model, call, priority=None):
+        return await call()
+
+    monkeypatch.setattr(intake_mcp, "gemini_model", lambda name: Model())
+    monkeypatch.setattr(intake_mcp, "schedule", schedule)
+    return reply
+
+
+def _task(title):
+    return {"title": title, "source": "doctor", "confidence": 0.9}
+
+
+def test_snippet_ids_are_coerced_and_bad_ones_skipped(answer):
+    answer["text"] = dumps([
+        {"id": "1", "tasks": [_task("Book A1C lab")]},      # string id
+        {"id": 0.0, "tasks": [_task("Refill metformin")]},  # float id
+        {"id": "two", "tasks": [_task("Ignored")]},
+        {"id": None, "tasks": [_task("Ignored too")]},
+        {"tasks": [_task("No id")]},
+    ])
+    out = asyncio.run(intake_mcp._extract_many(["a", "b", "c"], "interactive"))
+    assert [[t["title"] for t in tasks] for tasks in out] == [["Refill metformin"], ["Book A1C lab"], []]
+
+
+def test_unparseable_answer_is_a_value_error(answer):
+    answer["text"] = "Sure! Here are the tasks:"
+    with pytest.raises(ValueError):
+        asyncio.run(intake_mcp._extract_many(["a"], "interactive"))
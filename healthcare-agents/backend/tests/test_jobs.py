@@ -0,0 +1,196 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from multi_agents.common import jobs
+from multi_agents.common.jobs import (DONE, FAILED, QUEUED, RUNNING, JobQueue, JobWorkers, MemoryJobQueue,
+                                      PubSubJobQueue, SQLiteJobQueue)
+from multi_agents.tools.fakes import FakeFirestore, LatencyModel
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request, tmp_path):
+    return MemoryJobQueue() if request.param == "memory" else SQLiteJobQueue(str(tmp_path / "jobs.db"))
+
+
+def test_queue_interface_is_abstract():
+    class Partial(JobQueue):
+        def get(self, job_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_enqueue_with_key_is_idempotent(queue):
+    a = queue.enqueue("publish_report", {"n": 1}, key="p1/abc")
+    b = queue.enqueue("publish_report", {"n": 2}, key="p1/abc")
+    c = queue.enqueue("publish_report", {"n": 3})
+    assert a["job_id"] == b["job_id"] != c["job_id"]
+    assert queue.stats()[QUEUED] == 2
+
+
+def test_claim_leases_a_job_to_one_worker(queue):
+    queue.enqueue("k", {"n": 1}, key="x")
+    job = queue.claim(lease=60)
+    assert job["status"] == RUNNING and job["attempts"] == 1 and job["payload"] == {"n": 1}
+    assert queue.claim(lease=60) is None
+    queue.complete(job, {"ok": True})
+    assert queue.get(job["job_id"])["status"] == DONE
+    assert queue.get(job["job_id"])["result"] == {"ok": True}
+
+
+def test_expired_lease_is_claimed_again(queue):
+    queue.enqueue("k", {}, key="x")
+    first = queue.claim(lease=-1)  # the worker died: its lease is already over
+    again = queue.claim(lease=60)
+    assert again["job_id"] == first["job_id"] and again["attempts"] == 2
+
+
+def test_failed_attempt_retries_then_gives_up(queue):
+    queue.enqueue("k", {}, key="x")
+    job = queue.claim()
+    queue.fail(job, "boom", retry_in=0)
+    job = queue.claim()
+    assert job["attempts"] == 2
+    queue.fail(job, "boom again", retry_in=None)
+    status = queue.get(job["job_id"])
+    assert status["status"] == FAILED and status["error"] == "boom again"
+    # re-enqueueing a dead job gives it another go
+    assert queue.enqueue("k", {}, key="x")["status"] == QUEUED
+
+
+def test_expired_lease_holder_cannot_settle_the_job(queue):
+    queue.enqueue("k", {}, key="x")
+    stale = queue.claim(lease=-1)
+    current = queue.claim(lease=60)
+    assert not queue.complete(stale, {"url": "stale"})
+    assert not queue.fail(stale, "late failure", retry_in=None)
+    assert queue.get(current["job_id"])["status"] == RUNNING
+    assert queue.complete(current, {"url": "fresh"})
+    assert queue.get(current["job_id"])["result"] == {"url": "fresh"}
+    assert not queue.complete(current, {"url": "twice"})  # settled: nothing to hold any more
+
+
+def test_notify_from_another_thread_wakes_the_workers():
+    queue = MemoryJobQueue()
+    workers = JobWorkers(queue, concurrency=0)
+
+    async def main():
+        workers.start()
+        await asyncio.to_thread(workers.notify)  # like enqueue() from queue_publish's thread
+        await asyncio.wait_for(workers._wakeup.wait(), 1)
+
+    asyncio.run(main())
+
+
+def test_retry_waits_for_its_backoff(queue):
+    queue.enqueue("k", {}, key="x")
+    queue.fail(queue.claim(), "boom", retry_in=60)
+    assert queue.claim() is None
+
+
+def test_sqlite_status_is_visible_from_another_process_queue(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    api, worker = SQLiteJobQueue(path), SQLiteJobQueue(path)
+    job_id = api.enqueue("k", {"n": 1}, key="x")["job_id"]
+    worker.complete(worker.claim(), {"url": "u"})
+    assert api.get(job_id)["status"] == DONE and api.get(job_id)["result"] == {"url": "u"}
+
+
+def test_workers_run_handlers_and_record_failures(tmp_path, monkeypatch):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+
+    async def ok(payload):
+        return {"echo": payload["n"]}
+
+    async def broken(payload):
+        raise RuntimeError("nope")
+
+    monkeypatch.setitem(jobs.HANDLERS, "ok", ok)
+    monkeypatch.setitem(jobs.HANDLERS, "broken", broken)
+    good = queue.enqueue("ok", {"n": 7})["job_id"]
+    bad = queue.enqueue("broken", {})["job_id"]
+    workers = JobWorkers(queue, concurrency=1, max_attempts=1)
+
+    async def main():
+        for _ in range(2):
+            await workers.run_one(queue.claim())
+
+    asyncio.run(main())
+    assert queue.get(good)["result"] == {"echo": 7}
+    assert queue.get(bad)["status"] == FAILED and "nope" in queue.get(bad)["error"]
+
+
+class _Subscriber:
+    def __init__(self):
+        self.deadlines, self.acked = [], []
+
+    def modify_ack_deadline(self, request):
+        self.deadlines.append(request["ack_deadline_seconds"])
+
+    def acknowledge(self, request):
+        self.acked.extend(request["ack_ids"])
+
+
+class _Publisher:
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, topic, body):
+        self.messages.append(body)
+        return SimpleNamespace(result=lambda: None)
+
+
+def _pubsub_queue() -> PubSubJobQueue:
+    # skips __init__: the Pub/Sub client library isn't needed to check the queue logic
+    q = PubSubJobQueue.__new__(PubSubJobQueue)
+    q.topic, q.subscription = "topic", "sub"
+    q._publisher, q._subscriber = _Publisher(), _Subscriber()
+    q._db = FakeFirestore(latency=LatencyModel(0, 0))
+    q._acks = {}
+    return q
+
+
+def test_pubsub_enqueue_publishes_once_per_key():
+    q = _pubsub_queue()
+    a = q.enqueue("k", {"n": 1}, key="x")
+    b = q.enqueue("k", {"n": 1}, key="x")
+    assert a["job_id"] == b["job_id"] and len(q._publisher.messages) == 1
+
+
+def test_pubsub_revives_a_failed_job_once():
+    q = _pubsub_queue()
+    job_id = q.enqueue("k", {}, key="x")["job_id"]
+    q._doc(job_id).set({"status": FAILED}, merge=True)
+    assert q.enqueue("k", {}, key="x")["status"] == QUEUED
+    assert len(q._publisher.messages) == 2
+
+    q._doc(job_id).set({"status": FAILED}, merge=True)
+    write_option = q._db.write_option
+
+    def revived_meanwhile(**kw):
+        # another replica revives the job between our read and our conditional write
+        q._doc(job_id).set({"status": QUEUED}, merge=True)
+        return write_option(**kw)
+
+    q._db.write_option = revived_meanwhile
+    assert q.enqueue("k", {}, key="x")["status"] == QUEUED
+    assert len(q._publisher.messages) == 2
+
+
+@pytest.mark.parametrize("retry_in, deadline", [(0, 10), (0.3, 10), (45, 45), (10_000, 600)])
+def test_pubsub_retry_deadline_is_clamped(retry_in, deadline):
+    q = _pubsub_queue()
+    job = {"job_id": "j"}
+    q._acks["j"] = ("ack-1", q._doc("j").set({"status": RUNNING}).update_time)
+    assert q.fail(job, "boom", retry_in=retry_in)
+    assert q._subscriber.deadlines == [deadline] and not q._subscriber.acked
+
+
+def test_pubsub_redelivered_job_is_not_settled_by_the_old_worker():
+    q = _pubsub_queue()
+    q._acks["j"] = ("ack-1", q._doc("j").set({"status": RUNNING, "attempts": 1}).update_time)
+    q._doc("j").set({"status": RUNNING, "attempts": 2}, merge=True)  # redelivered, claimed elsewhere
+    assert not q.complete({"job_id": "j"}, {"url": "stale"})
+    assert q.get("j")["status"] == RUNNING and q.get("j")["result"] is None
+    assert not q._subscriber.acked
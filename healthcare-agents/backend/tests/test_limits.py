@@ -0,0 +1,18 @@
+import asyncio
+from fastapi.testclient import TestClient
+import main
+from multi_agents.common import limits
+
+
+def test_in_use_counts_held_slots():
+    async def main_():
+        async with limits.limit("mcp"), limits.limit("mcp"):
+            held = limits.in_use()["mcp"]
+        return held, limits.in_use()["mcp"]
+
+    assert asyncio.run(main_()) == (2, 0)
+
+
+def test_limits_stats_endpoint():
+    out = TestClient(main.app).get("/api/limits/stats").json()
+    assert out["gemini"] == {"limit": limits.LIMITS["gemini"], "in_use": 0}
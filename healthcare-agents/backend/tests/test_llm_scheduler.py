@@ -0,0 +1,90 @@
+import multiprocessing, sqlite3, time
+import pytest
+from multi_agents.common import llm_scheduler
+from multi_agents.common.llm_scheduler import SQLiteTokenBucket, TokenBucket
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "llm_rates.db")
+
+
+def test_processes_share_one_bucket(db_path):
+    clock = _Clock()
+    a = SQLiteTokenBucket("pro", rate=2, burst=4, path=db_path, clock=clock)
+    b = SQLiteTokenBucket("pro", rate=2, burst=4, path=db_path, clock=clock)
+    taken = [bucket.try_take() for bucket in (a, b, a, b, a, b)]
+    assert taken == [True, True, True, True, False, False]
+    assert a.delay() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert b.try_take() and not a.try_take()
+
+
+def test_families_have_separate_buckets(db_path):
+    clock = _Clock()
+    pro = SQLiteTokenBucket("pro", rate=1, burst=1, path=db_path, clock=clock)
+    flash = SQLiteTokenBucket("flash", rate=1, burst=1, path=db_path, clock=clock)
+    assert pro.try_take() and flash.try_take()
+    assert not pro.try_take()
+
+
+def _drain(path, out):
+    # take until the shared bucket is empty; a take that lost the file lock is retried
+    bucket = SQLiteTokenBucket("flash", rate=0.001, burst=20, path=path)
+    taken, deadline = 0, time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if bucket.try_take():
+            taken += 1
+        elif bucket.delay() > 1:
+            break
+        else:
+            time.sleep(bucket.delay())
+    out.put(taken)
+
+
+def test_burst_is_not_multiplied_by_process_count(db_path):
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_drain, args=(db_path, out)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+    assert sum(out.get(timeout=5) for _ in procs) == 20
+
+
+def test_locked_bucket_does_not_block(db_path):
+    bucket = SQLiteTokenBucket("flash", rate=10, burst=20, path=db_path)
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")  # another process is mid-take
+    try:
+        t0 = time.perf_counter()
+        assert not bucket.try_take()
+        assert 0 < bucket.delay() <= llm_scheduler.LLM_RATE_DB_BACKOFF
+        assert time.perf_counter() - t0 < 0.1
+    finally:
+        other.execute("ROLLBACK")
+    assert bucket.try_take() and bucket.delay() == 0
+
+
+def test_per_process_bucket_without_rate_db(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "LLM_RATE_DB", "")
+    assert type(llm_scheduler.make_bucket("flash")) is TokenBucket
+
+
+def test_shared_bucket_with_rate_db(db_path, monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "LLM_RATE_DB", db_path)
+    assert type(llm_scheduler.make_bucket("flash")) is SQLiteTokenBucket
+
+
+def test_rate_split_divides_the_quota():
+    assert llm_scheduler._parse_rates("flash=10:20,pro=2:2", split=4) == {"flash": (2.5, 5.0), "pro": (0.5, 1.0)}
+    assert llm_scheduler._parse_rates("flash=10") == {"flash": (10.0, 10.0)}
@@ -0,0 +1,59 @@
+import asyncio, os, sys
+import pytest
+from mcp.client.stdio import StdioServerParameters
+from multi_agents.mcp.client import MCPSessionPool, MCPToolClient, MCPToolError, _decode
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_flaky_server.py")
+
+
+@pytest.fixture
+def params(tmp_path):
+    return StdioServerParameters(command=sys.executable, args=[SERVER, str(tmp_path / "crashed")])
+
+
+def _run(params, fn, **kw):
+    async def main():
+        pool = MCPSessionPool(params, **{"size": 1, **kw})
+        try:
+            return await fn(pool)
+        finally:
+            await pool.close()
+    return asyncio.run(asyncio.wait_for(main(), 60))
+
+
+def test_crashed_server_is_restarted_and_the_call_retried(params):
+    async def calls(pool):
+        assert _decode(await pool.call_tool("echo", {"text": "warm"})) == "warm"
+        out = _decode(await pool.call_tool("crash_once", {"text": "survived"}))
+        return out, pool.restarts, _decode(await pool.call_tool("echo", {"text": "again"}))
+
+    assert _run(params, calls) == ("survived", 1, "again")
+
+
+def test_hung_call_times_out_and_its_server_is_replaced(params):
+    async def calls(pool):
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.call_tool("hang", {"seconds": 30}, timeout=0.5)
+        return pool.restarts, _decode(await pool.call_tool("echo", {"text": "fresh"}))
+
+    assert _run(params, calls) == (1, "fresh")
+
+
+def test_tool_error_is_not_retried(params):
+    async def calls(pool):
+        with pytest.raises(MCPToolError, match="bad input"):
+            _decode(await pool.call_tool("fail", {"text": "bad input"}))
+        return pool.restarts
+
+    assert _run(params, calls) == 0
+
+
+def test_blocking_call_is_refused_on_a_running_loop():
+    client = MCPToolClient([sys.executable, SERVER, "unused"])
+
+    async def main():
+        client.call("echo", text="x")
+
+    with pytest.raises(RuntimeError, match="would block the running event loop"):
+        asyncio.run(main())
+    assert client._pool is None  # refused before any server was spawned
@@ -0,0 +1,50 @@
+import pytest
+from multi_agents.common.cache import TTLCache
+from multi_agents.tools import firestore
+from multi_agents.tools.fakes import FakeFirestore, LatencyModel
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeFirestore(latency=LatencyModel(0, 0))
+    monkeypatch.setattr(firestore, "_db", lambda: db)
+    return db
+
+
+def _use_cache(monkeypatch, ttl):
+    monkeypatch.setattr(firestore, "_metrics_cache", TTLCache(maxsize=16, ttl=ttl, name="metrics"))
+
+
+def _write(db, patient_id, **metrics):
+    db.document(f"patients/{patient_id}/profile/metrics").set(metrics)
+
+
+def test_metrics_are_cached_until_the_ttl(db, monkeypatch):
+    _use_cache(monkeypatch, ttl=300)
+    _write(db, "p1", a1c=7.1)
+    assert firestore.get_prior_metrics("p1") == {"a1c": 7.1}
+    _write(db, "p1", a1c=6.4)  # written elsewhere: this process only sees it after the TTL
+    assert firestore.get_prior_metrics("p1") == {"a1c": 7.1}
+    firestore._metrics_cache.set("p1", firestore._metrics_cache.get("p1"), ttl=0)  # expire it
+    assert firestore.get_prior_metrics("p1") == {"a1c": 6.4}
+
+
+def test_zero_ttl_reads_through_every_time(db, monkeypatch):
+    _use_cache(monkeypatch, ttl=0)
+    _write(db, "p1", a1c=7.1)
+    assert firestore.get_prior_metrics("p1") == {"a1c": 7.1}
+    _write(db, "p1", a1c=6.4)
+    assert firestore.get_prior_metrics("p1") == {"a1c": 6.4}
+
+
+def test_bulk_fetch_uses_cache_and_one_round_trip(db, monkeypatch):
+    _use_cache(monkeypatch, ttl=300)
+    _write(db, "p1", a1c=7.1)
+    _write(db, "p2", ldl=120)
+    assert firestore.get_prior_metrics("p1") == {"a1c": 7.1}
+    calls = []
+    get_all = db.get_all
+    monkeypatch.setattr(db, "get_all", lambda refs: calls.append(list(refs)) or get_all(calls[-1]))
+    out = firestore.get_prior_metrics_many(["p1", "p2", "p3", "p2"])
+    assert out == {"p1": {"a1c": 7.1}, "p2": {"ldl": 120}, "p3": {}}
+    assert [len(refs) for refs in calls] == [2]
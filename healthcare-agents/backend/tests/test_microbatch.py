@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+from multi_agents.common.microbatch import MicroBatcher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_submits_share_one_batch():
+    calls = []
+
+    async def run_batch(items):
+        calls.append(list(items))
+        return [i * 2 for i in items]
+
+    async def main():
+        b = MicroBatcher("t", run_batch, max_size=8, max_wait=0.01)
+        return await asyncio.gather(*(b.submit(i) for i in range(5))), b
+
+    results, b = run(main())
+    assert results == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+    assert b.stats == {"items": 5, "batches": 1, "fallbacks": 0}
+
+
+def test_full_window_flushes_without_waiting():
+    calls = []
+
+    async def run_batch(items):
+        calls.append(len(items))
+        return list(items)
+
+    async def main():
+        b = MicroBatcher("t", run_batch, max_size=2, max_wait=60)
+        return await asyncio.wait_for(asyncio.gather(*(b.submit(i) for i in range(4))), 5)
+
+    assert run(main()) == [0, 1, 2, 3]
+    assert calls == [2, 2]
+
+
+def test_slot_exception_fails_only_that_caller():
+    async def run_batch(items):
+        return [ValueError(i) if i == 1 else i for i in items]
+
+    async def main():
+        b = MicroBatcher("t", run_batch, max_size=8, max_wait=0.01)
+        return await asyncio.gather(*(b.submit(i) for i in range(3)), return_exceptions=True)
+
+    ok0, err, ok2 = run(main())
+    assert (ok0, ok2) == (0, 2)
+    assert isinstance(err, ValueError)
+
+
+def test_failed_batch_falls_back_to_one_call_per_item():
+    calls = []
+
+    async def run_batch(items):
+        calls.append(list(items))
+        if len(items) > 1:
+            raise RuntimeError("batch request rejected")
+        if items[0] == "bad":
+            raise ValueError("bad item")
+        return [items[0].upper()]
+
+    async def main():
+        b = MicroBatcher("t", run_batch, max_size=8, max_wait=0.01)
+        out = await asyncio.gather(*(b.submit(x) for x in ("a", "bad", "c")), return_exceptions=True)
+        return out, b
+
+    (a, bad, c), b = run(main())
+    assert (a, c) == ("A", "C")
+    assert isinstance(bad, ValueError)
+    assert calls[0] == ["a", "bad", "c"] and sorted(map(tuple, calls[1:])) == [("a",), ("bad",), ("c",)]
+    assert b.stats["fallbacks"] == 1
+
+
+def test_wrong_result_count_is_an_error():
+    async def short(items):
+        return []
+
+    with pytest.raises(ValueError):
+        run(MicroBatcher("t", short, max_size=1, max_wait=0).submit("x"))
+
+
+def test_cancelled_caller_does_not_cancel_batch():
+    seen = []
+
+    async def run_batch(items):
+        await asyncio.sleep(0.05)
+        seen.extend(items)
+        return list(items)
+
+    async def main():
+        b = MicroBatcher("t", run_batch, max_size=8, max_wait=0.01)
+        gone = asyncio.ensure_future(b.submit("gone"))
+        kept = asyncio.ensure_future(b.submit("kept"))
+        await asyncio.sleep(0.02)
+        gone.cancel()
+        return await kept
+
+    assert run(main()) == "kept"
+    assert seen == ["gone", "kept"]
+
+
+def test_retryable_batch_error_reaches_every_caller_without_a_fallback():
+    calls = []
+
+    async def run_batch(items):
+        calls.append(list(items))
+        raise asyncio.TimeoutError("model call timed out")
+
+    async def main():
+        b = MicroBatcher("t", run_batch, max_size=8, max_wait=0.01)
+        return await asyncio.gather(*(b.submit(i) for i in range(3)), return_exceptions=True), b
+
+    errors, b = run(main())
+    assert all(isinstance(e, asyncio.TimeoutError) for e in errors)
+    assert calls == [[0, 1, 2]] and b.stats["fallbacks"] == 0
+
+
+def test_quota_error_from_a_tool_server_is_not_split():
+    from multi_agents.mcp.client import MCPToolError
+    calls = []
+
+    async def run_batch(items):
+        calls.append(list(items))
+        raise MCPToolError("Error executing tool extract_tasks_batch: 429 Quota exceeded")
+
+    async def main():
+        b = MicroBatcher("t", run_batch, max_size=8, max_wait=0.01)
+        return await asyncio.gather(*(b.submit(i) for i in range(3)), return_exceptions=True)
+
+    assert all(getattr(e, "code", None) == 429 for e in run(main()))
+    assert len(calls) == 1
@@ -0,0 +1,66 @@
+import pytest
+from multi_agents.tools import pdf_render
+from multi_agents.tools.fakes import FakeBlob, FakeStorageClient, LatencyModel
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    client = FakeStorageClient(str(tmp_path), latency=LatencyModel(0, 0))
+    monkeypatch.setattr(pdf_render, "storage_client", lambda: client)
+    monkeypatch.setattr(pdf_render, "REPORT_FORMAT", "html")
+    monkeypatch.setattr(pdf_render, "_known", pdf_render.OrderedDict())
+    public = []
+    monkeypatch.setattr(FakeBlob, "make_public", lambda blob: public.append(blob.name))
+    return client.bucket(pdf_render.BUCKET), public
+
+
+def _meta(bucket, name):
+    blob = bucket.blob(name)
+    blob.reload()
+    return blob
+
+
+def test_reports_are_not_publicly_cacheable_by_default(bucket):
+    b, _ = bucket
+    out = pdf_render.publish_rendered("p1", "# Report")
+    assert not out["dedup"]
+    assert _meta(b, out["object"]).cache_control == "private, no-store"
+
+
+def test_public_cache_is_opt_in(bucket, monkeypatch):
+    b, _ = bucket
+    monkeypatch.setattr(pdf_render, "CACHE_CONTROL", "public, max-age=31536000, immutable")
+    out = pdf_render.publish_rendered("p1", "# Report")
+    assert _meta(b, out["object"]).cache_control == "public, max-age=31536000, immutable"
+
+
+def test_existing_object_is_made_public_too(bucket, monkeypatch):
+    b, public = bucket
+    first = pdf_render.publish_rendered("p1", "# Report")
+    monkeypatch.setattr(pdf_render, "_known", pdf_render.OrderedDict())  # another process
+    again = pdf_render.publish_rendered("p1", "# Report")
+    assert again["dedup"] and again["url"] == first["url"]
+    assert public == [first["object"], first["object"]]
+
+
+def test_loser_of_an_upload_race_makes_it_public(bucket, monkeypatch):
+    b, public = bucket
+    # the other publisher's upload lands between our exists() and our upload
+    monkeypatch.setattr(FakeBlob, "exists", lambda blob, **kw: False)
+    real_upload = FakeBlob.upload_from_string
+
+    def racing_upload(blob, data, **kw):
+        real_upload(FakeBlob(blob.bucket, blob.name), data, content_type=kw.get("content_type"))
+        return real_upload(blob, data, **kw)
+
+    monkeypatch.setattr(FakeBlob, "upload_from_string", racing_upload)
+    out = pdf_render.publish_rendered("p1", "# Report")
+    assert out["dedup"]
+    assert public == [out["object"]]
+
+
+def test_known_objects_skip_storage(bucket):
+    _, public = bucket
+    pdf_render.publish_rendered("p1", "# Report")
+    assert pdf_render.publish_rendered("p1", "# Report")["dedup"]
+    assert len(public) == 1
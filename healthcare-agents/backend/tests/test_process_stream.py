@@ -0,0 +1,77 @@
+import asyncio, json
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+import main
+from multi_agents import pipeline
+
+PAYLOAD = {"transcript": "Doctor: book labs.", "condition": "asthma", "visit_type": "checkup",
+           "prior_metrics": {}, "patient_id": "p1", "session_id": "s1"}
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Fake agents; `delays` sets how long intake and coach take."""
+    delays = {"intake": 0.0, "coach": 0.0}
+    failing = set()
+
+    async def run_agent(runner, user_id, session_id, inputs, **kw):
+        await asyncio.sleep(delays[runner])
+        if runner in failing:
+            raise ConnectionError(f"{runner}_mcp exited")
+        if runner == "intake":
+            return SimpleNamespace(state={"task_delta": [{"title": "Book labs"}]})
+        return SimpleNamespace(state={"coach_json": {"checklist": ["Bring inhaler"]}})
+
+    async def stream_reporter(runner, user_id, session_id, inputs, on_text):
+        for chunk in ("## Summary\n", "All good."):
+            await on_text(chunk)
+        return SimpleNamespace(state={"report_markdown": "## Summary\nAll good."})
+
+    async def remember_report(user_id, fingerprint, markdown):
+        return "job-1"
+
+    monkeypatch.setattr(pipeline, "run_agent", run_agent)
+    monkeypatch.setattr(pipeline, "stream_reporter", stream_reporter)
+    monkeypatch.setattr(pipeline, "cached_report", lambda user_id, inputs: ("fp", None))
+    monkeypatch.setattr(pipeline, "remember_report", remember_report)
+    monkeypatch.setattr(main, "runners", SimpleNamespace(intake="intake", coach="coach", report="report"))
+    return SimpleNamespace(delays=delays, failing=failing)
+
+
+def _events(resp):
+    # "event: x\ndata: {...}\n\n" frames -> [(x, payload)]
+    out = []
+    for frame in resp.text.strip().split("\n\n"):
+        head, data = frame.split("\n", 1)
+        out.append((head.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return out
+
+
+def test_events_arrive_in_pipeline_order(stages):
+    stages.delays["coach"] = 0.1
+    resp = TestClient(main.app).post("/api/agents/process/stream", json=PAYLOAD)
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _events(resp)
+    assert [e for e, _ in events] == ["tasks", "guidance", "report_delta", "report_delta", "report", "done"]
+    payloads = dict(events[:2])
+    assert payloads["tasks"] == {"tasks": [{"title": "Book labs"}]}
+    assert payloads["guidance"] == {"guidance": {"checklist": ["Bring inhaler"]}}
+    assert "".join(p["text"] for e, p in events if e == "report_delta") == "## Summary\nAll good."
+    assert events[-2][1] == {"report": "## Summary\nAll good."}
+    assert events[-1][1]["partial"] is False and set(events[-1][1]["timings"]) == {"intake", "coach", "report"}
+
+
+def test_whichever_stage_finishes_first_is_sent_first(stages):
+    stages.delays["intake"] = 0.1
+    events = [e for e, _ in _events(TestClient(main.app).post("/api/agents/process/stream", json=PAYLOAD))]
+    assert events[:2] == ["guidance", "tasks"] and events[-1] == "done"
+
+
+def test_failed_stage_is_sent_empty_with_its_error(stages):
+    stages.failing.add("coach")
+    events = _events(TestClient(main.app).post("/api/agents/process/stream", json=PAYLOAD))
+    guidance = dict(events)["guidance"]
+    assert guidance == {"guidance": {}, "error": "ConnectionError: coach_mcp exited"}
+    assert [e for e, _ in events][-2:] == ["report", "done"]
+    assert events[-1][1]["partial"] is True and set(events[-1][1]["errors"]) == {"coach"}
@@ -0,0 +1,77 @@
+import asyncio, json, os, threading
+import pytest
+from multi_agents.tools.report_cache import get_report, put_report, report_fingerprint
+
+TASKS = [{"title": "Book eye exam", "due_date": None}, {"title": "Bring glucose log", "due_date": "2024-02-01"}]
+INPUTS = {"task_delta": TASKS, "coach_json": {"checklist": ["a"], "cautions": [], "questions_for_doctor": []},
+          "current_metrics": {"weight": 180}, "prior_metrics": {"weight": 190}}
+
+
+def test_fingerprint_ignores_task_order_and_json_formatting():
+    reordered = {**INPUTS, "task_delta": list(reversed(TASKS)),
+                 "coach_json": json.dumps(INPUTS["coach_json"], indent=2)}
+    assert report_fingerprint("p1", INPUTS, "v1") == report_fingerprint("p1", reordered, "v1")
+
+
+def test_fingerprint_ignores_fields_the_reporter_does_not_see():
+    extra = {**INPUTS, "metrics_summary": "derived", "patient_id": "p1"}
+    assert report_fingerprint("p1", INPUTS, "v1") == report_fingerprint("p1", extra, "v1")
+
+
+@pytest.mark.parametrize("change", [
+    {"current_metrics": {"weight": 181}},
+    {"prior_metrics": {"weight": 200}},
+    {"task_delta": TASKS[:1]},
+    {"coach_json": None},
+])
+def test_fingerprint_changes_with_inputs(change):
+    assert report_fingerprint("p1", INPUTS, "v1") != report_fingerprint("p1", {**INPUTS, **change}, "v1")
+
+
+def test_fingerprint_changes_with_patient_and_reporter_version():
+    base = report_fingerprint("p1", INPUTS, "v1")
+    assert base != report_fingerprint("p2", INPUTS, "v1")
+    assert base != report_fingerprint("p1", INPUTS, "v2")
+
+
+def test_empty_values_are_equivalent():
+    assert report_fingerprint("p1", {}, "v1") == report_fingerprint("p1", {"task_delta": [], "coach_json": None}, "v1")
+
+
+def test_put_and_get_report():
+    fp = report_fingerprint("p-cache", INPUTS, "test")
+    assert get_report(fp) is None
+    put_report(fp, "## Summary")
+    assert get_report(fp) == {"report_markdown": "## Summary"}
+    put_report(fp, "## Summary", url="https://example/r.html", report_id="r1")
+    assert get_report(fp)["report_url"] == "https://example/r.html"
+
+
+@pytest.mark.skipif(os.getenv("REPORT_AUTO_PUBLISH") == "1", reason="auto-publish enabled in this environment")
+def test_remember_report_does_not_publish_by_default(monkeypatch):
+    from multi_agents import report_agent
+    queued = []
+    monkeypatch.setattr(report_agent, "queue_publish", lambda *a: queued.append(a))
+    fp = report_fingerprint("p-default", INPUTS, "test")
+    assert asyncio.run(report_agent.remember_report("p-default", fp, "## Report")) is None
+    assert queued == [] and get_report(fp)["report_markdown"] == "## Report"
+
+
+def test_remember_report_enqueues_off_the_event_loop(monkeypatch):
+    from multi_agents import report_agent
+    threads = []
+
+    def enqueue(kind, payload, key=None):
+        threads.append(threading.get_ident())
+        return {"job_id": "j1", "status": "queued"}
+
+    monkeypatch.setattr(report_agent, "AUTO_PUBLISH", True)
+    monkeypatch.setattr(report_agent, "enqueue", enqueue)
+
+    async def main():
+        job = await report_agent.remember_report("p-auto", report_fingerprint("p-auto", INPUTS, "t"), "## R")
+        return job, threading.get_ident()
+
+    job, loop_thread = asyncio.run(main())
+    assert job == "j1"
+    assert threads and threads[0] != loop_thread
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from google.adk.models import LlmResponse
+from google.genai import types
+from multi_agents import report_agent
+from multi_agents.common.scheduled_gemini import ScheduledGemini
+from multi_agents.common.sessions import make_session_service
+from multi_agents.orchestration import AgentRunners
+from multi_agents.tools.fakes import FakeLlm
+from multi_agents.tools.metrics import metrics_summary
+
+PRIOR = {"weight": 182.4, "blood_sugar": 141,
+         "history": [{"weight": 190.25, "blood_sugar": 163, "visit_note": "HISTORY-MARKER"},
+                     {"weight": 186.75, "blood_sugar": 152}]}
+CURRENT = {"weight": 180.1, "blood_sugar": 128, "device_serial": "RAW-CURRENT-MARKER"}
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    seen = []
+
+    def transport(self):
+        async def call(llm_request, stream=False):
+            seen.append(FakeLlm.prompt(llm_request))
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="## Summary\nok")]))
+        return call
+
+    monkeypatch.setattr(ScheduledGemini, "_transport", transport)
+    return seen
+
+
+def _inputs():
+    return {"task_delta": [{"title": "Book A1C lab", "source": "doctor", "confidence": 0.9}],
+            "coach_json": None, "patient_id": "p1",
+            "metrics_summary": metrics_summary(PRIOR, CURRENT),
+            "current_metrics": CURRENT, "prior_metrics": PRIOR}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_reporter_prompt_has_the_summary_once_and_no_raw_metrics(prompts, streaming):
+    runners = AgentRunners(make_session_service())
+    inputs = _inputs()
+
+    async def main():
+        if streaming:
+            async def on_text(_chunk):
+                pass
+            return await report_agent.stream_reporter(runners.report, "p1", f"s{streaming}", inputs, on_text)
+        return await report_agent.run_reporter(runners.report, "p1", f"s{streaming}", inputs)
+
+    result = asyncio.run(main())
+    [prompt] = prompts
+    assert prompt.count(inputs["metrics_summary"]) == 1
+    assert "Book A1C lab" in prompt
+    for raw in ("HISTORY-MARKER", "RAW-CURRENT-MARKER", "history", "190.25", "prior_metrics"):
+        assert raw not in prompt
+    # the raw payloads are still in the session, for the report fingerprint
+    assert result.state["prior_metrics"] == PRIOR and result.state["current_metrics"] == CURRENT
+    assert result.state["report_markdown"].startswith("## Summary")
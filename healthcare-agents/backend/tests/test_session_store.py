@@ -0,0 +1,124 @@
+import asyncio, time
+import pytest
+from google.adk.events import Event, EventActions
+from multi_agents.common import session_store
+from multi_agents.common.session_store import (SessionConflict, SessionStore, SharedSessionService,
+                                               SQLiteSessionStore)
+
+APP = "medagents"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def _service(path, **kw):
+    return SharedSessionService(SQLiteSessionStore(path), **kw)
+
+
+def _append(svc, session, **delta):
+    svc.append_event(session, Event(author="user", actions=EventActions(state_delta=delta)))
+
+
+def test_store_interface_is_abstract():
+    class Partial(SessionStore):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_workers_merge_state_instead_of_overwriting(db_path):
+    a, b = _service(db_path), _service(db_path)
+    a.create_session(app_name=APP, user_id="p1", session_id="s1")
+    sa = a.get_session(app_name=APP, user_id="p1", session_id="s1")
+    sb = b.get_session(app_name=APP, user_id="p1", session_id="s1")
+    _append(a, sa, tasks=1)
+    _append(b, sb, coach=2)  # sb is stale: rebased onto a's write
+    state = a.get_session(app_name=APP, user_id="p1", session_id="s1").state
+    assert state == {"tasks": 1, "coach": 2}
+    assert sb.state == {"tasks": 1, "coach": 2}
+
+
+def test_update_state_with_stale_version_conflicts(db_path):
+    svc = _service(db_path)
+    svc.create_session(app_name=APP, user_id="p1", session_id="s1")
+    _, version = svc.get_session_version(app_name=APP, user_id="p1", session_id="s1")
+    assert svc.update_state(app_name=APP, user_id="p1", session_id="s1", delta={"x": 1},
+                            expected_version=version) == version + 1
+    with pytest.raises(SessionConflict):
+        svc.update_state(app_name=APP, user_id="p1", session_id="s1", delta={"x": 2},
+                         expected_version=version)
+
+
+class _FlakyStore(SQLiteSessionStore):
+    """Loses the first `fail` compare-and-swaps, as if another worker won."""
+
+    def __init__(self, path, fail):
+        super().__init__(path)
+        self.fail = fail
+
+    def cas(self, key, body, expected_version):
+        if self.fail:
+            self.fail -= 1
+            return False
+        return super().cas(key, body, expected_version)
+
+
+def test_conflicts_on_the_event_loop_retry_without_sleeping(db_path, monkeypatch):
+    svc = SharedSessionService(_FlakyStore(db_path, fail=3))
+    svc.create_session(app_name=APP, user_id="p1", session_id="s1")
+
+    def no_sleep(_):
+        raise AssertionError("blocking sleep on the event loop")
+
+    monkeypatch.setattr(session_store.time, "sleep", no_sleep)
+
+    async def write():
+        session = svc.get_session(app_name=APP, user_id="p1", session_id="s1")
+        _append(svc, session, k="v")
+
+    asyncio.run(write())
+    assert svc.get_session(app_name=APP, user_id="p1", session_id="s1").state == {"k": "v"}
+    assert svc.stats()["conflicts"] == 3
+
+
+def test_conflicts_off_the_loop_back_off(db_path, monkeypatch):
+    svc = SharedSessionService(_FlakyStore(db_path, fail=2))
+    svc.create_session(app_name=APP, user_id="p1", session_id="s1")
+    sleeps = []
+    monkeypatch.setattr(session_store.time, "sleep", sleeps.append)
+    svc.update_state(app_name=APP, user_id="p1", session_id="s1", delta={"k": 1})
+    assert len(sleeps) == 2
+
+
+def test_too_many_conflicts_give_up(db_path):
+    svc = SharedSessionService(_FlakyStore(db_path, fail=100), retries=2)
+    svc.create_session(app_name=APP, user_id="p1", session_id="s1")
+    with pytest.raises(SessionConflict):
+        asyncio.run(asyncio.to_thread(svc.update_state, app_name=APP, user_id="p1", session_id="s1",
+                                      delta={"k": 1}))
+
+
+def test_expired_sessions_are_purged_on_write_not_by_stats(db_path, monkeypatch):
+    svc = _service(db_path, ttl=60)
+    svc.create_session(app_name=APP, user_id="p1", session_id="old")
+    svc.store._db().execute("UPDATE sessions SET updated=? WHERE session_id='old'", (time.time() - 3600,))
+
+    assert svc.stats()["sessions"] == 1  # reading stats deletes nothing
+    monkeypatch.setattr(svc, "_next_expire", 0.0)
+    svc.create_session(app_name=APP, user_id="p1", session_id="new")
+    stats = svc.stats()
+    assert stats["sessions"] == 1 and stats["expired"] == 1
+
+
+def test_purges_are_throttled(db_path):
+    svc = _service(db_path, ttl=60)
+    calls = []
+    real = svc.store.expire
+    svc.store.expire = lambda cutoff: calls.append(cutoff) or real(cutoff)
+    for i in range(5):
+        svc.create_session(app_name=APP, user_id="p1", session_id=f"s{i}")
+    assert len(calls) == 1
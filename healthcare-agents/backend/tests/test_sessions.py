@@ -0,0 +1,45 @@
+import time
+from multi_agents.common.sessions import BoundedSessionService
+
+APP = "medagents"
+
+
+def _spilled(svc):
+    return svc._spill._conn.execute("SELECT COUNT(*) FROM spilled").fetchone()[0]
+
+
+def _service(tmp_path, **kw):
+    return BoundedSessionService(max_sessions=1, ttl=60, spill_path=str(tmp_path / "spill.db"), **kw)
+
+
+def test_evicted_sessions_spill_and_come_back(tmp_path):
+    svc = _service(tmp_path, expire_every=0)
+    svc.create_session(app_name=APP, user_id="p1", session_id="a", state={"k": 1})
+    svc.create_session(app_name=APP, user_id="p1", session_id="b")
+    assert _spilled(svc) == 1
+    assert svc.get_session(app_name=APP, user_id="p1", session_id="a").state == {"k": 1}
+
+
+def test_sweep_expires_spilled_sessions_without_stats(tmp_path):
+    svc = _service(tmp_path, expire_every=0)
+    svc.create_session(app_name=APP, user_id="p1", session_id="a")
+    svc.create_session(app_name=APP, user_id="p1", session_id="b")
+    svc._spill._conn.execute("UPDATE spilled SET touched=?", (time.time() - 3600,))
+    svc.stats()
+    assert _spilled(svc) == 1  # reading stats changes nothing
+    assert svc.sweep() == 1
+    assert _spilled(svc) == 0 and svc.stats()["evicted_ttl"] == 1
+
+
+def test_background_sweeper_runs_on_its_own(tmp_path):
+    svc = _service(tmp_path, expire_every=0.01)
+    try:
+        svc.create_session(app_name=APP, user_id="p1", session_id="a")
+        svc.create_session(app_name=APP, user_id="p1", session_id="b")
+        svc._spill._conn.execute("UPDATE spilled SET touched=?", (time.time() - 3600,))
+        deadline = time.time() + 2
+        while _spilled(svc) and time.time() < deadline:
+            time.sleep(0.01)
+        assert _spilled(svc) == 0
+    finally:
+        svc.close()
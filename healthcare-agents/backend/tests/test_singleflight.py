@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from multi_agents.common.singleflight import SingleFlight, canonical_key
+
+
+def _counting(result="ok", delay=0.05, error=None):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return fn, calls
+
+
+def test_concurrent_identical_calls_go_upstream_once():
+    group = SingleFlight()
+    fn, calls = _counting()
+
+    async def main():
+        return await asyncio.gather(*(group.do("k", fn) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["ok"] * 10
+    assert len(calls) == 1 and group.stats == {"calls": 10, "shared": 9}
+
+
+def test_different_keys_and_later_calls_are_not_shared():
+    group = SingleFlight()
+    fn, calls = _counting()
+
+    async def main():
+        await asyncio.gather(group.do("a", fn), group.do("b", fn))
+        await group.do("a", fn)  # the first flight has landed: a new call
+
+    asyncio.run(main())
+    assert len(calls) == 3
+
+
+def test_errors_reach_every_waiter():
+    group = SingleFlight()
+    fn, calls = _counting(error=ValueError("bad"))
+
+    async def main():
+        return await asyncio.gather(*(group.do("k", fn) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(calls) == 1 and all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelled_leader_does_not_cancel_the_flight():
+    group = SingleFlight()
+    fn, calls = _counting(delay=0.1)
+
+    async def main():
+        leader = asyncio.ensure_future(group.do("k", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(group.do("k", fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "ok"
+    assert len(calls) == 1
+
+
+def test_canonical_key_ignores_kwarg_order():
+    assert canonical_key("t", a=1, b=2) == canonical_key("t", b=2, a=1)
+    assert canonical_key("t", a=1) != canonical_key("u", a=1)
@@ -0,0 +1,31 @@
+import asyncio, logging
+from multi_agents import intake_agent
+from multi_agents.common.runs import run_agent
+from multi_agents.common.schemas import Task
+from multi_agents.common.sessions import make_session_service
+from multi_agents.orchestration import AgentRunners
+
+
+def test_loop_extracts_each_snippet_once_without_escalating(monkeypatch, caplog):
+    calls = []
+
+    async def extract_new_tasks(transcript, patient_id):
+        calls.append(transcript)
+        return [Task(title="Book A1C lab", source="doctor", confidence=0.9)]
+
+    monkeypatch.setattr(intake_agent, "extract_new_tasks", extract_new_tasks)
+    runners = AgentRunners(make_session_service())
+
+    async def main():
+        turn = {"transcript_snippet": "Doctor: book an A1C lab.", "patient_id": "p1"}
+        first = await run_agent(runners.intake, "p1", "s1", turn)
+        again = await run_agent(runners.intake, "p1", "s1", turn)  # retried turn
+        return first, again
+
+    with caplog.at_level(logging.WARNING):
+        first, again = asyncio.run(main())
+    assert calls == ["Doctor: book an A1C lab."]
+    assert len(first.events) == 1 and not first.events[0].actions.escalate
+    assert first.state["task_delta"][0]["title"] == "Book A1C lab"
+    assert again.events == []
+    assert "Failed to detach context" not in caplog.text
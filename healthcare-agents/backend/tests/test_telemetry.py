@@ -0,0 +1,79 @@
+import json, os, time
+import pytest
+from multi_agents.common import telemetry
+
+HITS = telemetry.counter("test_telemetry_hits_total", "Test counter.", ["route"])
+LATENCY = telemetry.histogram("test_telemetry_seconds", "Test histogram.", ["route"], buckets=(0.1, 1))
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_DIR", str(tmp_path))
+    for m in (HITS, LATENCY):
+        monkeypatch.setattr(m, "_values", {})
+    return tmp_path
+
+
+def _samples(text: str) -> dict:
+    return dict(line.rsplit(" ", 1) for line in text.splitlines()
+                if line.startswith("test_telemetry_"))
+
+
+def _other_process(metrics_dir, name: str, snapshot: dict, age: float = 0):
+    path = os.path.join(metrics_dir, name)
+    with open(path, "w") as f:
+        json.dump(snapshot, f)
+    if age:
+        os.utime(path, (time.time() - age, time.time() - age))
+
+
+def test_render_is_prometheus_text(metrics_dir):
+    HITS.inc(route="/a")
+    HITS.inc(2, route='/b"q')
+    for v in (0.05, 0.5, 5):
+        LATENCY.observe(v, route="/a")
+    text = telemetry.render(include_other_processes=False)
+    assert "# TYPE test_telemetry_hits_total counter" in text
+    assert "# TYPE test_telemetry_seconds histogram" in text
+    samples = _samples(text)
+    assert samples['test_telemetry_hits_total{route="/a"}'] == "1.0"
+    assert samples['test_telemetry_hits_total{route="/b\\"q"}'] == "2.0"
+    # buckets are cumulative
+    assert [samples[f'test_telemetry_seconds_bucket{{route="/a",le="{le}"}}'] for le in ("0.1", "1.0", "+Inf")] \
+        == ["1.0", "2.0", "3.0"]
+    assert samples['test_telemetry_seconds_count{route="/a"}'] == "3.0"
+    assert float(samples['test_telemetry_seconds_sum{route="/a"}']) == pytest.approx(5.55)
+
+
+def test_other_processes_snapshots_are_merged(metrics_dir):
+    HITS.inc(route="/a")
+    LATENCY.observe(0.05, route="/a")
+    _other_process(metrics_dir, "111.json", {
+        "test_telemetry_hits_total": [[["/a"], 4.0], [["/c"], 1.0]],
+        "test_telemetry_seconds": [[["/a"], [[0, 1, 0], 0.5, 1]]],
+        "some_metric_nobody_registered": [[[], 1.0]],
+    })
+    samples = _samples(telemetry.render())
+    assert samples['test_telemetry_hits_total{route="/a"}'] == "5.0"
+    assert samples['test_telemetry_hits_total{route="/c"}'] == "1.0"
+    assert samples['test_telemetry_seconds_count{route="/a"}'] == "2.0"
+    assert samples['test_telemetry_seconds_bucket{route="/a",le="1.0"}'] == "2.0"
+
+
+def test_stale_and_mismatched_snapshots_are_ignored(metrics_dir):
+    HITS.inc(route="/a")
+    _other_process(metrics_dir, "222.json", {"test_telemetry_hits_total": [[["/a"], 100.0]]}, age=3600)
+    # another bucket layout (an older build): can't be merged
+    _other_process(metrics_dir, "333.json", {"test_telemetry_seconds": [[["/z"], [[1, 1], 0.2, 2]]]})
+    _other_process(metrics_dir, "444.json.tmp", {"test_telemetry_hits_total": [[["/a"], 100.0]]})
+    samples = _samples(telemetry.render())
+    assert samples['test_telemetry_hits_total{route="/a"}'] == "1.0"
+    assert not any("/z" in k for k in samples)
+    assert not os.path.exists(os.path.join(metrics_dir, "222.json"))  # dead process: cleaned up
+
+
+def test_own_snapshot_is_not_counted_twice(metrics_dir):
+    HITS.inc(route="/a")
+    telemetry.dump_snapshot()
+    assert os.path.exists(os.path.join(metrics_dir, f"{os.getpid()}.json"))
+    assert _samples(telemetry.render())['test_telemetry_hits_total{route="/a"}'] == "1.0"
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from multi_agents import intake_agent
+from multi_agents.common.transcript import split_transcript
+from multi_agents.tools import dedupe
+
+TURNS = [
+    "Doctor: Your blood sugar came down from 190 to 150 since the last visit.",
+    "Patient: That's good news. I've been walking every morning.",
+    "Doctor: Keep that up. Please schedule a fasting blood test before the next visit.",
+    "Patient: Should I keep taking the same dose of metformin?",
+    "Doctor: Yes, continue 500mg twice a day and check your pressure daily.",
+    "Doctor: Book a follow-up appointment in three months.",
+]
+TEXT = "\n".join(TURNS)
+
+
+def test_short_and_empty_transcripts_are_one_or_no_chunk():
+    assert split_transcript("Doctor: hi.", max_chars=100) == ["Doctor: hi."]
+    assert split_transcript("  \n ", max_chars=100) == []
+
+
+def test_chunks_respect_the_size_and_break_between_sentences():
+    chunks = split_transcript(TEXT, max_chars=160, overlap=0)
+    assert len(chunks) > 1
+    assert all(len(c) <= 160 for c in chunks)
+    # no sentence is cut: every chunk ends where a sentence ends
+    assert all(c.rstrip().endswith((".", "?", "!")) for c in chunks)
+    assert " ".join(chunks) == " ".join(TEXT.split())
+
+
+def _carried(prev: str, cur: str) -> str:
+    # longest tail of `prev` that `cur` starts with
+    return next((prev[i:] for i in range(len(prev)) if cur.startswith(prev[i:])), "")
+
+
+def test_each_chunk_starts_with_the_tail_of_the_previous_one():
+    chunks = split_transcript(TEXT, max_chars=160, overlap=80)
+    for prev, cur in zip(chunks, chunks[1:]):
+        carried = _carried(prev, cur)
+        assert 0 < len(carried) <= 80 and carried.rstrip().endswith((".", "?", "!"))
+    assert all(any(t in " ".join(c.split()) for c in chunks) for t in TURNS if len(t) < 70)
+
+
+def test_overlong_sentence_is_split_on_whitespace():
+    words = " ".join(f"word{i}" for i in range(100))
+    chunks = split_transcript(words, max_chars=50, overlap=0)
+    assert all(len(c) <= 50 for c in chunks)
+    assert " ".join(chunks).split() == words.split()
+
+
+def test_task_in_the_overlap_is_extracted_once(monkeypatch):
+    chunks = split_transcript(TEXT, max_chars=160, overlap=80)
+    seam = "Please schedule a fasting blood test before the next visit."
+    assert [i for i, c in enumerate(chunks) if seam in c] == [1, 2]  # carried over as overlap
+
+    async def extract(chunk):
+        # both chunks around the seam find the task, the second one more confidently
+        out = []
+        if seam in chunk:
+            out.append({"title": "Schedule fasting blood test", "confidence": 0.8 + 0.05 * chunks.index(chunk)})
+        if "follow-up" in chunk:
+            out.append({"title": "Book follow-up appointment", "confidence": 0.9})
+        return out
+
+    persisted = []
+
+    async def persist(patient_id, tasks):
+        persisted.extend(tasks)
+
+    monkeypatch.setattr(intake_agent, "split_transcript", lambda t: chunks)
+    monkeypatch.setattr(intake_agent, "_extract", extract)
+    monkeypatch.setattr(intake_agent, "_persist", persist)
+    monkeypatch.setattr(dedupe, "_indexes", dedupe.OrderedDict())
+    monkeypatch.setattr(dedupe, "_store", None)
+    kept = asyncio.run(intake_agent.extract_new_tasks(TEXT, "p-seam"))
+    titles = [t.title for t in kept]
+    assert sorted(titles) == ["Book follow-up appointment", "Schedule fasting blood test"]
+    assert {t.title: t.confidence for t in kept}["Schedule fasting blood test"] == pytest.approx(0.9)
+    assert persisted == kept
@@ -0,0 +1,148 @@
+import asyncio, json, threading
+import pytest
+from multi_agents.common.schemas import Task, dump_tasks
+from multi_agents.tools import firestore, write_behind
+from multi_agents.tools.fakes import FakeFirestore, LatencyModel
+from multi_agents.tools.write_behind import InMemoryBackend, WriteBackend, WriteBehindQueue, WriteOp
+
+
+class _Broken(WriteBackend):
+    def __init__(self):
+        self.calls = 0
+
+    def commit(self, ops):
+        self.calls += 1
+        raise ConnectionError("firestore unavailable")
+
+
+class _Rejects(InMemoryBackend):
+    """Rejects (for good) any commit containing a document marked bad, like an oversized one."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def commit(self, ops):
+        self.calls += 1
+        if any(op.data.get("bad") for op in ops):
+            err = ValueError("document too large")
+            err.code = 400
+            raise err
+        super().commit(ops)
+
+
+class _Gated(InMemoryBackend):
+    """Holds every commit until the test opens the gate."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def commit(self, ops):
+        self.gate.wait(5)
+        super().commit(ops)
+
+
+def _use(monkeypatch, backend, **kw) -> WriteBehindQueue:
+    # the process-wide writer behind tools/firestore.py, restored after the test
+    queue = WriteBehindQueue(backend, **kw)
+    monkeypatch.setattr(write_behind, "_writer", queue)
+    return queue
+
+
+def _rows(*titles):
+    return dump_tasks([Task(title=t, source="transcript", confidence=0.9) for t in titles])
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        WriteBackend()
+
+
+def test_concurrent_writes_are_coalesced():
+    backend = InMemoryBackend()
+    queue = WriteBehindQueue(backend, flush_interval=0.05)
+    futs = [queue.submit(WriteOp(f"patients/p/tasks/{i}", {"n": i})) for i in range(10)]
+    futs.append(queue.submit(WriteOp("patients/p/tasks/0", {"late": True}, merge=True)))
+    for f in futs:
+        f.result(timeout=5)
+    assert backend.commits == [10]
+    assert backend.docs["patients/p/tasks/0"] == {"n": 0, "late": True}
+    queue.close()
+
+
+def test_retries_used_up_fail_the_future():
+    backend = _Broken()
+    queue = WriteBehindQueue(backend, flush_interval=0.01, max_retries=1)
+    fut = queue.submit(WriteOp("patients/p/tasks/a", {}))
+    with pytest.raises(ConnectionError):
+        fut.result(timeout=10)
+    assert backend.calls == 2 and queue.stats["failed"] == 1
+    queue.close()
+
+
+def test_permanent_failure_is_not_retried_and_fails_only_the_bad_op():
+    backend = _Rejects()
+    queue = WriteBehindQueue(backend, flush_interval=0.05, max_retries=3)
+    futs = {p: queue.submit(WriteOp(f"patients/p/tasks/{p}", {"bad": p == "b"})) for p in "abc"}
+    assert futs["a"].result(timeout=5) is None and futs["c"].result(timeout=5) is None
+    with pytest.raises(ValueError):
+        futs["b"].result(timeout=5)
+    assert sorted(backend.docs) == ["patients/p/tasks/a", "patients/p/tasks/c"]
+    # one batch attempt, then one commit per op, no retries
+    assert backend.calls == 4 and backend.commits == [1, 1]
+    assert queue.stats["retries"] == 0 and queue.stats["splits"] == 1 and queue.stats["failed"] == 1
+    queue.close()
+
+
+def test_save_task_rows_returns_after_the_commit(monkeypatch):
+    gated = _Gated()
+    _use(monkeypatch, gated)
+    done = []
+    t = threading.Thread(target=lambda: done.append(firestore.save_task_rows("p1", _rows("Book MRI"))))
+    t.start()
+    t.join(0.3)
+    assert not done  # still queued: not acknowledged yet
+    gated.gate.set()
+    t.join(5)
+    assert done[0]["saved"] == 1
+    assert list(gated.docs) == [f"patients/p1/tasks/{done[0]['ids'][0]}"]
+
+
+def test_save_task_rows_raises_when_the_write_is_lost(monkeypatch):
+    _use(monkeypatch, _Broken(), flush_interval=0.01, max_retries=0)
+    with pytest.raises(ConnectionError):
+        firestore.save_task_rows("p1", _rows("Book MRI"))
+
+
+def test_async_saves_share_one_commit(monkeypatch):
+    backend = InMemoryBackend()
+    _use(monkeypatch, backend)
+
+    async def main():
+        return await asyncio.gather(*(firestore.asave_task_rows(f"p{i}", _rows(f"Task {i}"))
+                                      for i in range(5)))
+
+    results = asyncio.run(main())
+    assert [r["saved"] for r in results] == [1] * 5
+    assert backend.commits == [5]
+
+
+def test_publish_report_waits_for_the_commit_without_blocking(monkeypatch):
+    from multi_agents.mcp import report_mcp
+    gated = _Gated()
+    _use(monkeypatch, gated)
+    monkeypatch.setattr(firestore, "_db", lambda: FakeFirestore(latency=LatencyModel(0, 0)))
+    monkeypatch.setattr(report_mcp, "publish_rendered",
+                        lambda pid, md: {"url": "https://x/r.html", "sha256": "abc", "dedup": False})
+
+    async def main():
+        publish = asyncio.ensure_future(report_mcp.publish_report("p1", "# Report"))
+        await asyncio.sleep(0.2)
+        assert not publish.done()  # waiting on the commit, while the loop keeps running
+        gated.gate.set()
+        return json.loads(await asyncio.wait_for(publish, 5))
+
+    out = asyncio.run(main())
+    assert list(gated.docs) == [f"patients/p1/reports/{out['report_id']}"]
+    assert out["url"] == "https://x/r.html"